@@ -1,20 +1,11 @@
 import streamlit as st
-import pandas as pd
 import os
+import time
 import auth
+import catalog
 
-from simulation.auto_mode import auto_mode_ui
-from simulation.manual_mode import manual_mode_ui
-from deinterleaving.dbscan_ui import dbscan_ui
-
-import streamlit as st
-import pandas as pd
-import os
-import auth
-
-from simulation.auto_mode import auto_mode_ui
-from simulation.manual_mode import manual_mode_ui
-from deinterleaving.dbscan_ui import dbscan_ui
+# Page modules (sklearn, matplotlib, hdbscan, pandas) are imported lazily
+# inside dashboard() so the locked/login screens never pay for them.
 
 # -------------------------------------------------
 # APP CONFIG
@@ -116,7 +107,7 @@ def user_auth_ui():
             valid, user_data = auth.verify_user(email, pwd)
             if valid:
                 st.session_state.user_logged_in = True
-                st.session_state.user_info = user_data.to_dict()
+                st.session_state.user_info = dict(user_data)
                 st.toast(f"Welcome, {user_data['full_name']}!", icon="👋")
                 st.rerun()
             else:
@@ -138,7 +129,7 @@ def user_auth_ui():
                      # Auto Log in
                      valid, user_data = auth.verify_user(reg_email, reg_pass)
                      st.session_state.user_logged_in = True
-                     st.session_state.user_info = user_data.to_dict()
+                     st.session_state.user_info = dict(user_data)
                      st.rerun()
                 else:
                     st.error(f"❌ {msg}")
@@ -160,6 +151,12 @@ def dashboard():
     os.makedirs(user_out_dir, exist_ok=True)
     st.session_state.user_output_dir = user_out_dir
 
+    # Compaction / retention of this folder runs in the background, once per login
+    if not st.session_state.get("storage_requested"):
+        from storage import get_compactor
+        get_compactor().request(user_out_dir)
+        st.session_state.storage_requested = True
+
     # Sidebar Info
     st.sidebar.markdown(f"**👤 {user['full_name']}**")
     st.sidebar.caption(f"{user['email']}")
@@ -170,7 +167,12 @@ def dashboard():
     else:
         nav_options = ["Auto Mode", "Manual Mode", "De-Interleaving", "My Files", "Logout"]
 
-    page = st.sidebar.radio("Go To", nav_options)
+    # Other pages can request navigation (e.g. "Open in De-Interleaver");
+    # it must be applied before the radio widget is created.
+    if st.session_state.get("nav_request") in nav_options:
+        st.session_state.nav_page = st.session_state.pop("nav_request")
+
+    page = st.sidebar.radio("Go To", nav_options, key="nav_page")
 
     # -----------------------------
     # PAGES
@@ -181,29 +183,126 @@ def dashboard():
         users_df = auth.get_all_users()
         display_cols = ["username", "full_name", "email", "role"]
         st.dataframe(users_df[display_cols])
+        ingest_admin_ui(users_df["username"])
 
     elif page == "Auto Mode":
+        from simulation.auto_mode import auto_mode_ui
         auto_mode_ui()
         
     elif page == "Manual Mode":
+        from simulation.manual_mode import manual_mode_ui
         manual_mode_ui()
 
     elif page == "De-Interleaving":
+        from deinterleaving.dbscan_ui import dbscan_ui
         dbscan_ui()
     
     elif page == "My Files":
-        st.title("📂 My Data History")
-        st.write(f"Location: `{user_out_dir}`")
-        files = os.listdir(user_out_dir)
-        if files:
-            files_df = pd.DataFrame(files, columns=["Filename"])
-            st.dataframe(files_df)
-        else:
-            st.info("No generated files yet.")
+        my_files_ui(user_out_dir)
 
     elif page == "Logout":
         logout_ui()
 
+# -------------------------------------------------
+# INGEST SERVER (ADMIN)
+# -------------------------------------------------
+def ingest_admin_ui(usernames):
+    # Stop / clear-all affect every user's stream, so only admins get them
+    from ingest.server import get_server, stream_id
+
+    st.write("### Ingest Server")
+    srv = get_server()
+    s = srv.stats()
+    if not s["running"]:
+        st.caption("Not running (any user can start it from De-Interleaving → Ingest (Live)).")
+        return
+    st.caption(
+        f"📡 {s['ports']['host']} TCP {s['ports']['tcp']}"
+        + (f", UDP {s['ports']['udp']}" if s["ports"]["udp"] else "")
+        + f" · {s['pulses']} PDWs · {s['errors']} bad packets"
+    )
+    owners = {stream_id(u): u for u in usernames}
+    streams = sorted(set(s["stream_pulses"]) | set(s["stream_buffered"]))
+    if streams:
+        st.dataframe([
+            {"stream": sid, "user": owners.get(sid, "(unknown)"),
+             "received": s["stream_pulses"].get(sid, 0), "buffered": s["stream_buffered"].get(sid, 0)}
+            for sid in streams
+        ], hide_index=True)
+    c1, c2 = st.columns(2)
+    if c1.button("Clear All Streams"):
+        srv.clear()
+        st.rerun()
+    if c2.button("Stop Ingest Server"):
+        srv.stop()
+        st.rerun()
+
+# -------------------------------------------------
+# MY FILES (CATALOG)
+# -------------------------------------------------
+def my_files_ui(user_out_dir):
+    st.title("📂 My Data History")
+    st.write(f"Location: `{user_out_dir}`")
+    _storage_panel(user_out_dir)
+
+    # Reads the catalog index + one directory scan; no dataset is opened
+    files_df = catalog.catalog_frame(user_out_dir)
+    if files_df.empty:
+        st.info("No generated files yet.")
+        return
+
+    c1, c2 = st.columns([2, 1])
+    name_filter = c1.text_input("Filter by name")
+    sources = sorted(files_df["source"].dropna().unique())
+    src_filter = c2.multiselect("Source", sources, default=sources)
+
+    view = files_df[files_df["source"].isin(src_filter)]
+    if name_filter:
+        view = view[view["file"].str.contains(name_filter, case=False, regex=False)]
+
+    st.caption(f"{len(view)} of {len(files_df)} datasets")
+    st.dataframe(view, hide_index=True)
+
+    openable = [f for f in view["file"] if f.endswith((".csv", ".pdw", ".pdwz"))]
+    if openable:
+        c1, c2 = st.columns([2, 1])
+        chosen = c1.selectbox("Dataset", openable, label_visibility="collapsed")
+        if c2.button("🧠 Open in De-Interleaver"):
+            from deinterleaving.dbscan_ui import open_in_deinterleaver
+            open_in_deinterleaver(f"{user_out_dir}/{chosen}")
+            st.session_state.nav_request = "De-Interleaving"
+            st.rerun()
+
+def _storage_panel(user_out_dir):
+    import storage
+
+    compactor = storage.get_compactor()
+    status = compactor.status(user_out_dir)
+    policy = [f"idle datasets compacted after {storage.COMPACT_AFTER_S / 3600:g} h"]
+    if storage.RETENTION_DAYS:
+        policy.append(f"kept {storage.RETENTION_DAYS:g} days")
+    if storage.QUOTA_MB:
+        policy.append(f"quota {storage.QUOTA_MB:g} MB")
+
+    c1, c2 = st.columns([3, 1])
+    last = status["last"]
+    if last and "usage_bytes" in last:
+        removed = len(last["expired"]) + len(last["evicted"])
+        c1.caption(
+            f"Storage: {last['dataset_bytes'] / 1e6:.1f} MB of datasets, "
+            f"{last['usage_bytes'] / 1e6:.1f} MB with scratch ({', '.join(policy)}). "
+            f"Last pass {time.strftime('%H:%M:%S', time.localtime(last['finished_at']))}: "
+            f"{len(last['compacted'])} files → {len(last['archives'])} archives, "
+            f"{removed} removed, {last['orphans']} scratch cleaned, {last['freed_bytes'] / 1e6:.1f} MB freed"
+        )
+    else:
+        c1.caption(f"Storage policy: {', '.join(policy)}.")
+    if last and last.get("errors"):
+        c1.caption("⚠️ " + "; ".join(last["errors"]))
+    if c2.button("🧹 Compact Now", disabled=status["pending"]):
+        compactor.request(user_out_dir)
+        st.toast("Compaction queued (runs in the background)")
+
 # -------------------------------------------------
 # LOGOUT UI
 # -------------------------------------------------
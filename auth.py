@@ -1,110 +1,185 @@
-import streamlit as st
-import pandas as pd
+import csv
 import hashlib
 import os
+import threading
 import uuid
 
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
 USER_DB = "users.csv"
+FIELDS = ["username", "password", "salt", "full_name", "email", "role"]
+
+# -------------------------------------------------
+# USER STORE
+# -------------------------------------------------
+# users.csv stays the source of truth, but lookups go through an in-memory
+# index (username -> row, email -> row) that is rebuilt only when the file's
+# mtime/size changes. Writes take a process lock plus an OS file lock and
+# replace the file atomically, so concurrent sessions (or server processes)
+# never see a half-written DB or lose a registration.
+_lock = threading.RLock()
+_index = {"key": None, "rows": [], "by_username": {}, "by_email": {}}
+
+
+def _file_key():
+    try:
+        st = os.stat(USER_DB)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _build_index(rows):
+    by_username, by_email = {}, {}
+    for i, row in enumerate(rows):
+        # First occurrence wins, matching the old top-to-bottom scan
+        by_username.setdefault(row["username"], i)
+        by_email.setdefault(row["email"], i)
+    _index.update(rows=rows, by_username=by_username, by_email=by_email)
+
+
+def _load_index():
+    """Return the current index, re-reading users.csv only if it changed."""
+    key = _file_key()
+    with _lock:
+        if key is not None and key == _index["key"]:
+            return _index
+        rows = []
+        if key is not None:
+            with open(USER_DB, newline="") as f:
+                rows = [{k: (row.get(k) or "") for k in FIELDS} for row in csv.DictReader(f)]
+        _build_index(rows)
+        _index["key"] = key
+        return _index
+
+
+class _FileLock:
+    """Exclusive lock on a sidecar file, held across read-modify-write."""
+
+    def __init__(self, path):
+        self.path = path + ".lock"
+
+    def __enter__(self):
+        _lock.acquire()
+        self.fh = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self.fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.fh, fcntl.LOCK_UN)
+        self.fh.close()
+        _lock.release()
+
+
+def _write_rows(rows):
+    """Atomically replace users.csv and refresh the index."""
+    tmp = f"{USER_DB}.{os.getpid()}.tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, USER_DB)
+    _build_index(rows)
+    _index["key"] = _file_key()
+
+
+def _hash(salt, password):
+    return hashlib.sha256((str(salt) + password).encode()).hexdigest()
+
 
 # -------------------------------------------------
 # INITIALIZE DB
 # -------------------------------------------------
+def _admin_row():
+    salt = uuid.uuid4().hex
+    # CREDENTIALS: Dharashakti@123 / 123456789
+    return {
+        "username": "Dharashakti@123",
+        "password": _hash(salt, "123456789"),
+        "salt": salt,
+        "full_name": "System Administrator",
+        "email": "admin@dharashakti.com",
+        "role": "admin"
+    }
+
+
 def init_db():
-    if not os.path.exists(USER_DB):
-        df = pd.DataFrame(columns=["username", "password", "salt", "full_name", "email", "role"])
-        # Create Specific Admin
-        salt = uuid.uuid4().hex
-        # CREDENTIALS: Dharashakti@123 / 123456789
-        hashed_pw = hashlib.sha256((salt + "123456789").encode()).hexdigest()
-        
-        new_admin = pd.DataFrame([{
-            "username": "Dharashakti@123",
-            "password": hashed_pw,
-            "salt": salt,
-            "full_name": "System Administrator",
-            "email": "admin@dharashakti.com",
-            "role": "admin"
-        }])
-        df = pd.concat([df, new_admin], ignore_index=True)
-        df.to_csv(USER_DB, index=False)
-    else:
-        # Quick check to ensure our specific admin exists in existing DB
-        df = pd.read_csv(USER_DB)
-        if "Dharashakti@123" not in df["username"].values:
-            salt = uuid.uuid4().hex
-            hashed_pw = hashlib.sha256((salt + "123456789").encode()).hexdigest()
-            new_admin = pd.DataFrame([{
-                "username": "Dharashakti@123",
-                "password": hashed_pw,
-                "salt": salt,
-                "full_name": "System Administrator",
-                "email": "admin@dharashakti.com",
-                "role": "admin"
-            }])
-            df = pd.concat([df, new_admin], ignore_index=True)
-            df.to_csv(USER_DB, index=False)
+    # Fast path: DB exists and our specific admin is in the (cached) index
+    if "Dharashakti@123" in _load_index()["by_username"]:
+        return
+
+    with _FileLock(USER_DB):
+        idx = _load_index()
+        if "Dharashakti@123" not in idx["by_username"]:
+            _write_rows(idx["rows"] + [_admin_row()])
 
 # -------------------------------------------------
 # AUTH FUNCTIONS
 # -------------------------------------------------
+def find_user(identifier):
+    """Indexed lookup by username OR email; returns a row dict or None."""
+    init_db()
+    idx = _load_index()
+
+    # Check if identifier matches username OR email (earliest row wins)
+    hits = [i for i in (idx["by_username"].get(identifier), idx["by_email"].get(identifier)) if i is not None]
+    if not hits:
+        return None
+    return dict(idx["rows"][min(hits)])
+
+
 def verify_user(identifier, password):
     """
     Verify user by Username OR Email.
     identifier: can be username or email
     """
-    init_db()
-    df = pd.read_csv(USER_DB)
-    
-    # Check if identifier matches username OR email
-    user_row = df[ (df["username"] == identifier) | (df["email"] == identifier) ]
-    
-    if user_row.empty:
+    row = find_user(identifier)
+    if row is None:
         return False, None
-    
-    row = user_row.iloc[0]
-    salt = row["salt"]
-    stored_hash = row["password"]
-    
+
     # Hash input with salt
-    input_hash = hashlib.sha256((str(salt) + password).encode()).hexdigest()
-    
-    if input_hash == stored_hash:
+    if _hash(row["salt"], password) == row["password"]:
         return True, row
     return False, None
 
 def register_user(full_name, email, password, role="user"):
     """
-    Register new user. Username will be auto-set to Email for simplicity, 
+    Register new user. Username will be auto-set to Email for simplicity,
     or we can generate one. Let's make Username = Email.
     """
     init_db()
-    df = pd.read_csv(USER_DB)
-    
-    # Check if email exists
-    if email in df["email"].values:
-        return False, "Email already registered."
-    
+
     salt = uuid.uuid4().hex
-    hashed_pw = hashlib.sha256((salt + password).encode()).hexdigest()
-    
-    new_user = pd.DataFrame([{
+    new_user = {
         "username": email, # Use Email as Username
-        "password": hashed_pw,
+        "password": _hash(salt, password),
         "salt": salt,
         "full_name": full_name,
         "email": email,
         "role": role
-    }])
-    
-    df = pd.concat([df, new_user], ignore_index=True)
-    df.to_csv(USER_DB, index=False)
-    
+    }
+
+    # Check-and-insert under the lock so two sessions can't both register
+    with _FileLock(USER_DB):
+        idx = _load_index()
+        if email in idx["by_email"]:
+            return False, "Email already registered."
+        _write_rows(idx["rows"] + [new_user])
+
     # Create user workspace
     user_dir = f"outputs/{email}" # Workspace based on email
     os.makedirs(user_dir, exist_ok=True)
-    
+
     return True, "Registration successful."
 
 def get_all_users():
+    import pandas as pd
     init_db()
-    return pd.read_csv(USER_DB)
+    return pd.DataFrame(_load_index()["rows"], columns=FIELDS)
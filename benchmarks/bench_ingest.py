@@ -0,0 +1,99 @@
+"""
+Ingest throughput: how many PDWs per second the asyncio ingest server
+accepts over loopback and lands in its PDW buffer.
+
+Run from the repo root:
+    python -m benchmarks.bench_ingest
+    python -m benchmarks.bench_ingest --pulses 2000000 --batch 1024 --min-rate 300000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from ingest.server import IngestServer
+from ingest.sender import send, simulated_frame
+
+
+def make_pulses(n):
+    """Simulated PDWs, tiled up to n rows (TOA kept increasing)."""
+    base = simulated_frame(20, 4, 500, seed=42)
+    reps = int(np.ceil(n / len(base)))
+    span = base["toa_us"].max() + 1.0
+    df = pd.concat([base.assign(toa_us=base["toa_us"] + r * span) for r in range(reps)], ignore_index=True)
+    return df.iloc[:n]
+
+
+def run(pulses, batch, senders, udp_port=None):
+    df = make_pulses(pulses)
+    frames = [df.iloc[p] for p in np.array_split(np.arange(pulses), senders)]
+    udp = bool(udp_port)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        srv = IngestServer(tmp)
+        ports = srv.start(tcp_port=0, udp_port=udp_port or 0)
+        port = ports["udp"] if udp else ports["tcp"]
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=send, args=(f, ports["host"], port, batch, udp)) for f in frames]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        t_sent = time.perf_counter()
+
+        # Done when everything sent is in; UDP may drop, so also stop once
+        # nothing new has arrived for a while
+        seen, t_last = -1, time.perf_counter()
+        while True:
+            got = srv.stats()["pulses"]
+            if got != seen:
+                seen, t_last = got, time.perf_counter()
+            if got >= pulses or time.perf_counter() - t_last > 0.5:
+                break
+            time.sleep(0.005)
+        srv.flush()
+        t_done = t_last if seen < pulses else time.perf_counter()
+        s = srv.stats()
+        srv.stop()
+
+    return {
+        "sent_s": t_sent - t0,
+        "total_s": t_done - t0,
+        "received": s["pulses"],
+        "packets": s["packets"],
+        "buffered": s["buffered"],
+        "pulses_per_s": s["pulses"] / (t_done - t0),
+        "mb_per_s": s["bytes"] / 1e6 / (t_done - t0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pulses", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=4096, help="PDWs per packet")
+    parser.add_argument("--senders", type=int, default=2, help="concurrent sender connections")
+    parser.add_argument("--udp-port", type=int, default=0, help="send over UDP to this port instead of TCP")
+    parser.add_argument("--min-rate", type=float, default=200_000, help="fail below this many pulses/s")
+    args = parser.parse_args(argv)
+
+    r = run(args.pulses, args.batch, args.senders, args.udp_port)
+    print(
+        f"{'UDP' if args.udp_port else 'TCP'} batch={args.batch} senders={args.senders}: "
+        f"{r['received']}/{args.pulses} PDWs in {r['packets']} packets, {r['total_s']:.3f}s "
+        f"-> {r['pulses_per_s']:.0f} pulses/s ({r['mb_per_s']:.1f} MB/s), buffered {r['buffered']}"
+    )
+    ok = r["pulses_per_s"] >= args.min_rate
+    print("OK" if ok else f"FAIL: below {args.min_rate:.0f} pulses/s")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Replay harness: streams a recorded session through the de-interleaver as if
+it were live and measures end-to-end latency per window.
+
+The recording is cut into TOA windows (2 s, like the simulator). Window k
+"arrives" when its last pulse would have been received at the replay speed
+(real time = 1x); it is then scaled and clustered with parameters tuned once
+on the first window. Per window we record processing time, end-to-end
+latency (arrival -> labels ready) and backlog (windows already arrived but
+not yet started). From the measured processing times the maximum
+sustainable speed is derived: the fastest replay at which 99% of windows are
+labelled before the next window arrives.
+
+Run from the repo root:
+    python -m benchmarks.bench_replay outputs/<user>/pdw_interleaved.csv
+    python -m benchmarks.bench_replay outputs/<user>/manual_interleaved.pdw --speed 20
+    python -m benchmarks.bench_replay --simulate 10 --windows 10 --speed 50 --algorithms K-Means Pipeline
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+logging.getLogger("pdw.perf").setLevel(logging.WARNING)
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import numpy as np
+
+import catalog
+from benchmarks.bench_deinterleaving import FEATURES, make_scenario
+from deinterleaving.clustering import (
+    available_algorithms, scale_features, run_clustering, autotune_hdbscan, autotune_dbscan
+)
+from deinterleaving.metrics import score_labels
+from deinterleaving.pipeline import PIPELINE, DEFAULTS as PIPELINE_DEFAULTS, deinterleave_frame
+from deinterleaving.recordings import open_recording
+
+WINDOW_S = 2.0
+SUSTAINED_PCT = 99  # percentile of windows that must finish before the next arrives
+
+
+# -------------------------------------------------
+# SOURCE
+# -------------------------------------------------
+def load_recording(path):
+    """
+    Recording (.csv, .pdw or .pdwz) as a TOA-ordered DataFrame, plus its
+    emitter count per window. With ground truth that is None: replay()
+    counts `true_emitter` on the first window itself. Otherwise it is the
+    catalog's per-window count; whole-file counts (Auto mode redraws its
+    emitters every window) and detected clusters of de-interleaved exports
+    are never used.
+    """
+    df = open_recording(path).frame()
+    meta = catalog.load_catalog(os.path.dirname(path) or ".").get(os.path.basename(path), {})
+    n_emitters = None
+    if "true_emitter" not in df.columns and meta.get("source") != "deinterleaved":
+        n_emitters = meta.get("window_emitters")
+    return df.sort_values("toa_us", kind="stable").reset_index(drop=True), n_emitters
+
+
+def split_windows(toa_us, window_s=WINDOW_S):
+    """Row boundaries of consecutive TOA windows (toa_us must be sorted)."""
+    if len(toa_us) == 0:
+        return np.zeros(1, dtype=np.int64)
+    t0 = toa_us[0]
+    n = int((toa_us[-1] - t0) // (window_s * 1e6)) + 1
+    edges = t0 + np.arange(n + 1) * window_s * 1e6
+    bounds = np.searchsorted(toa_us, edges, side="left")
+    bounds[-1] = len(toa_us)
+    return bounds
+
+
+# -------------------------------------------------
+# ALGORITHMS
+# -------------------------------------------------
+def tune(df, algorithm, n_emitters):
+    """Parameters for the whole replay, tuned on the first window."""
+    if algorithm == PIPELINE:
+        return dict(PIPELINE_DEFAULTS)
+    if n_emitters is None:
+        raise ValueError(f"{algorithm} needs a known emitter count (pass --emitters)")
+    X = scale_features(df, FEATURES)
+    if algorithm == "HDBSCAN":
+        return autotune_hdbscan(X, n_emitters)[0]
+    if algorithm == "DBSCAN":
+        return autotune_dbscan(X, n_emitters)[0]
+    return {"n_clusters": n_emitters}
+
+
+def process(df, algorithm, params):
+    if algorithm == PIPELINE:
+        return deinterleave_frame(df, params)
+    n_clusters = params.get("n_clusters")
+    if n_clusters and len(df) < n_clusters:
+        return np.full(len(df), -1)
+    return run_clustering(scale_features(df, FEATURES), algorithm, params)
+
+
+# -------------------------------------------------
+# REPLAY
+# -------------------------------------------------
+def schedule(proc_s, window_s, speed):
+    """
+    Single-consumer queue model: window k arrives at (k+1) * window_s / speed
+    and is processed after window k-1. Returns (latency_s, backlog) arrays.
+    """
+    period = window_s / speed
+    arrival = (np.arange(len(proc_s)) + 1) * period
+    latency = np.empty(len(proc_s))
+    backlog = np.empty(len(proc_s), dtype=np.int64)
+    free = 0.0
+    for k, p in enumerate(proc_s):
+        start = max(arrival[k], free)
+        free = start + p
+        latency[k] = free - arrival[k]
+        backlog[k] = np.searchsorted(arrival, start, side="right") - k - 1
+    return latency, backlog
+
+
+def max_sustainable_speed(proc_s, window_s, pct=SUSTAINED_PCT):
+    """Largest speed at which `pct`% of windows are done before the next one arrives."""
+    proc_s = np.asarray(proc_s, dtype=np.float64)
+    if len(proc_s) == 0 or proc_s.max() <= 0:
+        return float("inf")
+
+    def ok(speed):
+        latency, _ = schedule(proc_s, window_s, speed)
+        return np.percentile(latency, pct) <= window_s / speed
+
+    lo, hi = 1e-3, window_s / proc_s.min()  # beyond hi even the fastest window overruns
+    if not ok(lo):
+        return 0.0
+    for _ in range(50):  # bisection in log space
+        mid = np.sqrt(lo * hi)
+        lo, hi = (mid, hi) if ok(mid) else (lo, mid)
+    return lo
+
+
+def replay(df, algorithm, speed, window_s=WINDOW_S, n_emitters=None):
+    """
+    Stream df through one algorithm at `speed` x real time (0 = no pacing,
+    latency then comes from the queue model at 1x). Returns a result dict.
+    """
+    toa = df["toa_us"].to_numpy()
+    bounds = split_windows(toa, window_s)
+    windows = [(bounds[k], bounds[k + 1]) for k in range(len(bounds) - 1)]
+    has_truth = "true_emitter" in df.columns
+    if not windows:
+        raise ValueError("recording is empty")
+
+    first = df.iloc[windows[0][0]:windows[0][1]]
+    if n_emitters is None and has_truth:
+        n_emitters = int(first["true_emitter"].nunique())
+    t_tune = time.perf_counter()
+    params = tune(first, algorithm, n_emitters)
+    tune_s = time.perf_counter() - t_tune
+
+    proc_s, latency, backlog, aris = [], [], [], []
+    period = window_s / speed if speed > 0 else 0.0
+    t_start = time.perf_counter()
+    for k, (a, b) in enumerate(windows):
+        arrival = (k + 1) * period
+        now = time.perf_counter() - t_start
+        if now < arrival:
+            time.sleep(arrival - now)
+            now = arrival
+        if speed > 0:
+            arrived = min(int(now / period + 1e-9), len(windows))
+            backlog.append(max(arrived - k - 1, 0))
+
+        win = df.iloc[a:b]
+        t0 = time.perf_counter()
+        labels = process(win, algorithm, params) if len(win) else np.empty(0)
+        t1 = time.perf_counter()
+        proc_s.append(t1 - t0)
+        if speed > 0:
+            latency.append(t1 - t_start - arrival)
+        if has_truth and len(win):
+            aris.append(score_labels(win["true_emitter"].to_numpy(), labels)["ari"])
+
+    proc_s = np.asarray(proc_s)
+    if speed > 0:
+        latency, backlog = np.asarray(latency), np.asarray(backlog)
+    else:
+        latency, backlog = schedule(proc_s, window_s, 1.0)
+
+    pct = lambda a, q: float(np.percentile(a, q)) if len(a) else 0.0
+    return {
+        "algorithm": algorithm,
+        "windows": len(windows),
+        "pulses": len(df),
+        "tune_s": tune_s,
+        "proc_p50_ms": pct(proc_s, 50) * 1e3,
+        "proc_max_ms": float(proc_s.max()) * 1e3 if len(proc_s) else 0.0,
+        "latency_p50_ms": pct(latency, 50) * 1e3,
+        "latency_p95_ms": pct(latency, 95) * 1e3,
+        "latency_p99_ms": pct(latency, 99) * 1e3,
+        "latency_max_ms": float(latency.max()) * 1e3 if len(latency) else 0.0,
+        "backlog_max": int(backlog.max()) if len(backlog) else 0,
+        "backlog_end": int(backlog[-1]) if len(backlog) else 0,
+        "max_speed": max_sustainable_speed(proc_s, window_s),
+        "ari": float(np.mean(aris)) if aris else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", nargs="?", help="recorded session (.csv or .pdw)")
+    parser.add_argument("--simulate", type=int, metavar="EMITTERS", help="replay a simulated session instead")
+    parser.add_argument("--windows", type=int, default=10, help="windows to simulate")
+    parser.add_argument("--pulses", type=int, default=200, help="pulses per emitter per simulated window")
+    parser.add_argument("--speed", type=float, default=10.0, help="x real time (0 = unpaced, model 1x)")
+    parser.add_argument("--window-s", type=float, default=WINDOW_S)
+    parser.add_argument("--emitters", type=int, help="known emitter count per window "
+                        "(default: first window's ground truth, else the catalog's per-window count)")
+    parser.add_argument("--algorithms", nargs="+", default=available_algorithms() + [PIPELINE])
+    args = parser.parse_args(argv)
+
+    if args.recording:
+        df, n_emitters = load_recording(args.recording)
+        source = args.recording
+    elif args.simulate:
+        df, n_emitters = make_scenario(args.simulate, args.pulses, args.windows), args.simulate
+        source = f"simulated ({args.simulate} emitters, {args.windows} windows)"
+    else:
+        parser.error("give a recording or --simulate")
+    n_emitters = args.emitters or n_emitters
+
+    print(f"Replaying {source}: {len(df)} PDWs, {args.window_s:g}s windows, "
+          f"{'unpaced' if args.speed <= 0 else f'{args.speed:g}x'}")
+    for algo in args.algorithms:
+        try:
+            r = replay(df, algo, args.speed, args.window_s, n_emitters)
+        except ValueError as e:
+            print(f"  {algo:<20} skipped: {e}")
+            continue
+        ari = f"  ARI={r['ari']:.3f}" if r["ari"] is not None else ""
+        print(
+            f"  {algo:<20} {r['windows']:>4} windows  proc p50={r['proc_p50_ms']:.1f}ms max={r['proc_max_ms']:.1f}ms  "
+            f"latency p50={r['latency_p50_ms']:.1f} p95={r['latency_p95_ms']:.1f} p99={r['latency_p99_ms']:.1f} "
+            f"max={r['latency_max_ms']:.1f}ms  backlog max={r['backlog_max']} end={r['backlog_end']}  "
+            f"max speed={r['max_speed']:.1f}x{ari}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Cold-start budget for the locked / login screens.
+
+Each measurement runs in a fresh interpreter so import caches are cold:
+it renders app.py headlessly (Streamlit AppTest) on the admin gatekeeper
+screen, then reruns it, and checks that no page-only heavy dependency was
+imported along the way.
+
+Run from the repo root:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --budget-ms 1500 --rerun-budget-ms 150
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that only the dashboard pages need
+HEAVY_MODULES = ["sklearn", "matplotlib", "hdbscan", "deinterleaving.dbscan_ui",
+                 "simulation.auto_mode", "simulation.manual_mode"]
+
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t_st = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=60)
+at.run()
+t_first = time.perf_counter()
+at.run()
+t_rerun = time.perf_counter()
+print(json.dumps({
+    "streamlit_import_ms": (t_st - t0) * 1e3,
+    "first_paint_ms": (t_first - t_st) * 1e3,
+    "rerun_ms": (t_rerun - t_first) * 1e3,
+    "exception": [str(e.value) for e in at.exception],
+    "loaded": [m for m in HEAVY if m in sys.modules],
+}))
+"""
+
+
+def probe():
+    code = f"HEAVY = {HEAVY_MODULES!r}\n" + _PROBE
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1500.0,
+                        help="max first paint of the locked screen (excl. importing streamlit)")
+    parser.add_argument("--rerun-budget-ms", type=float, default=150.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    runs = [probe() for _ in range(args.repeat)]
+    first = min(r["first_paint_ms"] for r in runs)
+    rerun = min(r["rerun_ms"] for r in runs)
+    loaded = sorted(set(m for r in runs for m in r["loaded"]))
+    errors = [e for r in runs for e in r["exception"]]
+
+    print(f"streamlit import : {min(r['streamlit_import_ms'] for r in runs):8.1f} ms")
+    print(f"first paint      : {first:8.1f} ms  (budget {args.budget_ms:.0f})")
+    print(f"rerun            : {rerun:8.1f} ms  (budget {args.rerun_budget_ms:.0f})")
+    print(f"heavy modules    : {', '.join(loaded) or 'none'}")
+
+    failed = errors or loaded or first > args.budget_ms or rerun > args.rerun_budget_ms
+    if errors:
+        print("app raised:", *errors, sep="\n  ")
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Page-level rerun latency: drives the Auto Mode, Manual Mode and
+De-Interleaving pages headlessly (Streamlit AppTest) with seeded PDW
+buffers of growing size and times each rerun, along with the size of what
+the session keeps in st.session_state.
+
+Per page and buffer size:
+    auto / manual    rerun     (idle rerun: no window generated)
+                     generate  (one more 2 s window on top of the buffer:
+                                buffer append, CSV + .pdw append)
+    deinterleaving   rerun     (data loaded, no results yet)
+                     results   (first render of a run's results: summary,
+                                PRI analysis, figure, export)
+                     cached    (rerun with those results cached)
+
+Rerun budgets are relative to the machine: each run first times a fixed
+calibration workload (pandas/numpy/CSV work of the kind the pages do) in
+the same process, and a rerun's budget is a multiple of that calibration
+time (measured ratio x headroom). Session-state budgets are in MB. A run
+fails when a rerun's ratio or the session state exceeds its budget, or
+when a measured scenario has no recorded budget. Relative budgets carry
+over between machines only roughly (core count and disk speed matter
+too), so re-record them (--record) when the check moves to a very
+different machine.
+Everything runs in a temporary working directory, so the users file and
+outputs/ of the checkout are left alone.
+
+Run from the repo root:
+    python -m benchmarks.bench_ui_rerun --record
+    python -m benchmarks.bench_ui_rerun
+    python -m benchmarks.bench_ui_rerun --sizes 1000 100000 --pages auto deinterleaving
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+logging.getLogger("pdw.perf").setLevel(logging.WARNING)
+warnings.filterwarnings("ignore")
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from simulation.auto_mode import simulate_window, WINDOW_US
+from simulation.pdw_buffer import PDWBuffer
+
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "ui_rerun.json")
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+PAGES = {"auto": "Auto Mode", "manual": "Manual Mode", "deinterleaving": "De-Interleaving"}
+WINDOW_PULSES = (20, 1000)  # emitters x pulses per emitter of each seeded window
+USER = {"username": "bench_ui", "full_name": "UI Bench", "email": "bench@ui", "role": "user"}
+TIMEOUT_S = 600
+CALIBRATION_ROWS = 50_000
+
+
+# -------------------------------------------------
+# SEEDING
+# -------------------------------------------------
+def seeded_buffer(n, out_dir, seed=42):
+    """PDWBuffer of n pulses, appended window by window as the pages do."""
+    np.random.seed(seed)
+    emitters, pulses = WINDOW_PULSES
+    base = simulate_window(0.0, emitters, pulses, 60, 25, 15, 8000.0, 12000.0, 2000.0, 6000.0,
+                           1.0, 50.0, -80.0, -30.0, 0.0, 360.0)
+    buf = PDWBuffer(out_dir)
+    done, w = 0, 0
+    while done < n:
+        win = base.iloc[:n - done].assign(toa_us=base["toa_us"].to_numpy()[:n - done] + w * WINDOW_US)
+        buf.append(win)
+        done += len(win)
+        w += 1
+    return buf, w * WINDOW_US
+
+
+def state_bytes(obj, seen=None):
+    """Approximate bytes held by a session-state value (memory maps count 0)."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, PDWBuffer):
+        return int(obj.stats()["resident_mb"] * 1e6)
+    if isinstance(obj, np.memmap):
+        return 0
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum()) if isinstance(obj, pd.DataFrame) else int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(state_bytes(k, seen) + state_bytes(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sum(state_bytes(v, seen) for v in obj)
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if hasattr(obj, "__dict__"):
+        return state_bytes(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+
+def session_mb(at):
+    return sum(state_bytes(at.session_state[k]) for k in at.session_state) / 1e6
+
+
+# -------------------------------------------------
+# PAGE DRIVERS
+# -------------------------------------------------
+def timed_run(at, click=None):
+    """Seconds for one rerun (optionally clicking the button labelled `click`)."""
+    if click:
+        next(b for b in at.button if b.label == click).click()
+    t0 = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+    return elapsed
+
+
+def open_page(page, seed):
+    """Logged-in AppTest on `page` with `seed` applied to session_state, first render done."""
+    at = AppTest.from_file(os.path.join(REPO_ROOT, "app.py"), default_timeout=TIMEOUT_S)
+    # Seeding outside a script run warns once per key; Streamlit resets its
+    # log levels on each AppTest config load, so quiet it here
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    at.session_state["admin_unlocked"] = True
+    at.session_state["user_logged_in"] = True
+    at.session_state["user_info"] = dict(USER)
+    at.session_state["nav_page"] = page
+    for key, value in seed.items():
+        at.session_state[key] = value
+    at.run()
+    return at
+
+
+def measure_simulation(page, n, repeat):
+    prefix = "" if page == "auto" else "manual_"
+    buf, t_end = seeded_buffer(n, os.path.join("outputs", USER["username"]))
+    at = open_page(PAGES[page], {f"{prefix}pdw_buffer": buf, f"{prefix}global_time_us": t_end})
+    rerun = [timed_run(at) for _ in range(repeat)]
+    generate = [timed_run(at, click="▶ Start / Generate") for _ in range(repeat)]
+    return {"rerun": rerun, "generate": generate}, session_mb(at)
+
+
+def measure_deinterleaving(n, repeat):
+    from deinterleaving.clustering import normalize_labels
+    buf, _ = seeded_buffer(n, os.path.join("outputs", USER["username"]))
+    df = buf.to_frame()
+    state = {"df": df, "data_version": 1, "results": None, "summary": None,
+             "features": ["freq_MHz", "pri_us"], "filename": "Seeded", "source_key": "bench"}
+    # Recorded-file source: no live buffer needed and no auto-tune submitted
+    at = open_page(PAGES["deinterleaving"], {"dbscan_state": state, "last_active_mode": "File"})
+    rerun = [timed_run(at) for _ in range(repeat)]
+
+    # Ground truth as the "clustering result": only the page's own work is timed
+    ids, sizes, noise = normalize_labels(df["true_emitter"].to_numpy() - 1, df["toa_us"].to_numpy())
+    results, cached = [], []
+    for _ in range(repeat):
+        state = at.session_state["dbscan_state"]
+        state.update(results=ids, algo_used="K-Means", summary={
+            "total": len(ids), "num_clusters": len(sizes), "noise_points": noise,
+            "cluster_sizes": sizes.tolist(), "known_emitters": None,
+        })
+        state["results_version"] = state.get("results_version", 0) + 1
+        results.append(timed_run(at))
+        cached.append(timed_run(at))
+    return {"rerun": rerun, "results": results, "cached": cached}, session_mb(at)
+
+
+def calibrate_ms(repeat=5):
+    """Median ms of a fixed pandas/numpy/CSV workload (the budgets' unit)."""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.random((CALIBRATION_ROWS, 6)), columns=list("abcdef"))
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        df.sort_values("a").round(3).to_csv(os.devnull, index=False)
+        np.unique(np.floor(df["b"].to_numpy() * 1000), return_counts=True)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times)) * 1e3
+
+
+def run_suite(pages, sizes, repeat):
+    """{"page/scenario/size": {"ms": median rerun ms, "state_mb": MB}}."""
+    results = {}
+    for page in pages:
+        for n in sizes:
+            if page == "deinterleaving":
+                timings, mb = measure_deinterleaving(n, repeat)
+            else:
+                timings, mb = measure_simulation(page, n, repeat)
+            for scenario, times in timings.items():
+                key = f"{page}/{scenario}/{n}"
+                results[key] = {"ms": float(np.median(times)) * 1e3, "state_mb": mb}
+                print(f"  {key:<34} {results[key]['ms']:9.1f} ms   state {mb:8.1f} MB", flush=True)
+    return results
+
+
+# -------------------------------------------------
+# BUDGETS
+# -------------------------------------------------
+def record_budgets(results, calib_ms, headroom, path=BUDGET_PATH):
+    budgets = {key: {"ratio": r["ms"] / calib_ms * headroom, "state_mb": r["state_mb"] * headroom + 1.0}
+               for key, r in results.items()}
+    if os.path.exists(path):
+        with open(path) as f:
+            # Budgets of scenarios not measured this time are kept
+            budgets = {**json.load(f).get("budgets", {}), **budgets}
+    budgets = {"calibration_ms": calib_ms, "budgets": budgets}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(budgets, f, indent=2, sort_keys=True)
+    print(f"Budgets ({headroom:g}x measured) saved to {path}")
+
+
+def check_budgets(results, calib_ms, path=BUDGET_PATH):
+    """Print measured vs recorded budgets; return the number of overruns (a missing budget counts)."""
+    if not os.path.exists(path):
+        print(f"No recorded budgets at {path}; run with --record first.")
+        return len(results)
+    with open(path) as f:
+        recorded = json.load(f)
+    budgets = recorded.get("budgets", {})
+    overruns = 0
+    print(f"\nAgainst recorded budgets (calibration {calib_ms:.1f} ms here, "
+          f"{recorded.get('calibration_ms', float('nan')):.1f} ms when recorded):")
+    for key, r in results.items():
+        b = budgets.get(key)
+        if b is None:
+            print(f"  {key:<34} MISSING: no recorded budget (run with --record)")
+            overruns += 1
+            continue
+        ratio = r["ms"] / calib_ms
+        over = [f"{ratio:.2f} > {b['ratio']:.2f}x calibration"] if ratio > b["ratio"] else []
+        over += [f"{r['state_mb']:.1f} > {b['state_mb']:.1f} MB"] if r["state_mb"] > b["state_mb"] else []
+        overruns += bool(over)
+        print(f"  {key:<34} {'OVER: ' + ', '.join(over) if over else 'ok'}")
+    return overruns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="+", default=list(PAGES), choices=list(PAGES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES, help="seeded pulses")
+    parser.add_argument("--repeat", type=int, default=3, help="reruns per scenario (median is kept)")
+    parser.add_argument("--record", action="store_true", help="save measured x headroom as the budgets")
+    parser.add_argument("--headroom", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    calib_ms = calibrate_ms()
+    print(f"Calibration workload: {calib_ms:.1f} ms", flush=True)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            results = run_suite(args.pages, args.sizes, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    if args.record:
+        record_budgets(results, calib_ms, args.headroom)
+        return 0
+    overruns = check_budgets(results, calib_ms)
+    print("FAIL" if overruns else "OK")
+    return 1 if overruns else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import pdw_format
+
+# -------------------------------------------------
+# PER-USER DATASET CATALOG
+# -------------------------------------------------
+# Every dataset saved through save_csv() / save_pdw() / save_archive() gets
+# a sidecar `.<name>.meta.json` (rows, TOA span, emitter counts, source
+# mode, config, checksum, size) and an entry in the user's `.catalog.json`
+# index. Listing a workspace reads
+# only the index plus one directory scan, so it stays instant with
+# thousands of files. Sidecars are the source of truth: a missing or stale
+# index entry is restored from its sidecar, and files saved by other means
+# are listed as "unindexed" without being opened.
+#
+# The simulation pages grow their recordings one window at a time with
+# append_csv() / append_pdw(): only the new rows are written, and the
+# metadata is merged with the previous entry instead of recomputed. The
+# SHA-256 of the whole file is carried forward by a hasher kept per path
+# (the file is re-read once only if the hasher is missing, e.g. after a
+# restart). A file that changed outside the catalog, or has other
+# columns, is started afresh.
+#
+# Emitter counts are kept apart by meaning: `true_emitters` (distinct
+# ground-truth IDs in the file), `window_emitters` (ground truth within the
+# first simulator window, the only count valid as a known k) and
+# `clusters` (emitters detected by the de-interleaving run that exported
+# the file, never ground truth).
+
+CATALOG_FILE = ".catalog.json"
+_lock = threading.Lock()
+WINDOW_US = 2e6  # simulator window (simulation.auto_mode.WINDOW_US)
+_hashers = {}  # path -> (size, mtime_ns, sha256 object) of appended files
+
+
+def sidecar_path(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f".{name}.meta.json")
+
+
+class _HashingWriter:
+    """Text file wrapper that checksums exactly what is written."""
+
+    def __init__(self, fh, sha=None):
+        self.fh = fh
+        self.sha = sha or hashlib.sha256()
+
+    def write(self, s):
+        self.sha.update(s.encode("utf-8"))
+        return self.fh.write(s)
+
+
+def _json_safe(obj):
+    return json.loads(json.dumps(obj, default=lambda o: o.item() if hasattr(o, "item") else str(o)))
+
+
+def describe(df, source, config=None):
+    """Dataset metadata derivable from the frame itself."""
+    meta = {"rows": int(len(df)), "source": source, "config": _json_safe(config or {})}
+    if "toa_us" in df.columns and len(df):
+        meta["toa_start_us"] = float(df["toa_us"].min())
+        meta["toa_end_us"] = float(df["toa_us"].max())
+        meta["toa_span_s"] = (meta["toa_end_us"] - meta["toa_start_us"]) / 1e6
+    if "Emitter_ID" in df.columns:
+        # Detected by a de-interleaving run: never ground truth
+        meta["clusters"] = int(df.loc[df["Emitter_ID"] > 0, "Emitter_ID"].nunique())
+    if "true_emitter" in df.columns and len(df):
+        truth = df["true_emitter"].to_numpy()
+        meta["true_emitters"] = int(pd.unique(truth).size)
+        meta["emitter_id_min"] = int(truth.min())
+        meta["emitter_id_max"] = int(truth.max())
+        if "toa_us" in df.columns:
+            meta["window_emitters"] = window_emitters(df["toa_us"].to_numpy(), truth)
+    return meta
+
+
+def window_emitters(toa_us, truth):
+    """
+    Ground-truth emitters in the first simulator window. Auto mode redraws its
+    emitters every window, so the whole-file count is windows x emitters;
+    this is the count a de-interleaver should look for (files and ingest
+    streams alike).
+    """
+    end = (np.floor(toa_us.min() / WINDOW_US) + 1) * WINDOW_US
+    return int(pd.unique(truth[toa_us < end]).size)
+
+
+def save_csv(df, path, source, config=None):
+    """Write df as CSV plus its sidecar metadata and catalog entry."""
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = _HashingWriter(fh)
+        df.to_csv(writer, index=False)
+    return _record(df, path, source, config, writer.sha.hexdigest())
+
+
+def save_pdw(df, path, source, config=None):
+    """Write df as a fixed-point `.pdw` file plus its sidecar and catalog entry."""
+    data = pdw_format.to_bytes(df)
+    with open(path, "wb") as fh:
+        fh.write(data)
+    return _record(df, path, source, config, hashlib.sha256(data).hexdigest())
+
+
+def save_archive(df, path, source, config=None, **extra):
+    """Write df as a compressed columnar `.pdwz` archive plus its sidecar and catalog entry."""
+    pdw_format.write_archive(df, path)
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(block)
+    return _record(df, path, source, config, sha.hexdigest(), **extra)
+
+
+def _appendable(path, columns):
+    """(previous metadata, running hasher) if path can be appended to, else None."""
+    meta = _read_json(sidecar_path(path))
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not meta or meta.get("columns") != columns or \
+            (meta.get("size_bytes"), meta.get("mtime_ns")) != (st.st_size, st.st_mtime_ns):
+        return None
+    cached = _hashers.get(path)
+    if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+        return meta, cached[2].copy()
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(block)
+    return meta, sha
+
+
+def _merge(prev, meta):
+    """Metadata of prev's rows followed by meta's rows."""
+    merged = dict(meta)
+    merged["rows"] = prev["rows"] + meta["rows"]
+    if "toa_start_us" in prev and "toa_start_us" in meta:
+        merged["toa_start_us"] = min(prev["toa_start_us"], meta["toa_start_us"])
+        merged["toa_end_us"] = max(prev["toa_end_us"], meta["toa_end_us"])
+        merged["toa_span_s"] = (merged["toa_end_us"] - merged["toa_start_us"]) / 1e6
+    elif "toa_start_us" in prev:
+        for k in ("toa_start_us", "toa_end_us", "toa_span_s"):
+            merged[k] = prev[k]
+    if "emitter_id_min" in prev and "emitter_id_min" in meta:
+        # Auto mode draws fresh emitter IDs each window (above every earlier
+        # one); Manual mode reuses 1..n
+        if meta["emitter_id_min"] > prev["emitter_id_max"]:
+            merged["true_emitters"] = prev["true_emitters"] + meta["true_emitters"]
+        else:
+            merged["true_emitters"] = max(prev["true_emitters"], meta["true_emitters"])
+        merged["emitter_id_min"] = min(prev["emitter_id_min"], meta["emitter_id_min"])
+        merged["emitter_id_max"] = max(prev["emitter_id_max"], meta["emitter_id_max"])
+    # The first window is prev's
+    if "window_emitters" in prev:
+        merged["window_emitters"] = prev["window_emitters"]
+    return merged
+
+
+def append_csv(df, path, source, config=None):
+    """Append df's rows to a catalogued CSV (writing it afresh if it cannot be appended to)."""
+    prev = _appendable(path, [str(c) for c in df.columns])
+    with open(path, "a" if prev else "w", newline="", encoding="utf-8") as fh:
+        writer = _HashingWriter(fh, prev[1] if prev else None)
+        df.to_csv(writer, index=False, header=prev is None)
+    return _record(df, path, source, config, writer.sha, prev=prev and prev[0])
+
+
+def append_pdw(df, path, source, config=None):
+    """Append df's records to a catalogued `.pdw` file (writing it afresh if it cannot be appended to)."""
+    prev = _appendable(path, [str(c) for c in df.columns])
+    if prev and pdw_format.read_header(path) != pdw_format.emitter_column(df.columns):
+        prev = None
+    data = pdw_format.encode(df).tobytes()
+    if not prev:
+        data = pdw_format.file_header(pdw_format.emitter_column(df.columns)) + data
+    sha = prev[1] if prev else hashlib.sha256()
+    sha.update(data)
+    with open(path, "ab" if prev else "wb") as fh:
+        fh.write(data)
+    return _record(df, path, source, config, sha, prev=prev and prev[0])
+
+
+def delete_dataset(path):
+    """Remove a dataset with its sidecar and catalog entry."""
+    for p in (path, sidecar_path(path)):
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+    remove_entry(os.path.dirname(path), os.path.basename(path))
+
+
+def _record(df, path, source, config, sha256, prev=None, **extra):
+    st = os.stat(path)
+    meta = describe(df, source, config)
+    if prev:
+        meta = _merge(prev, meta)
+    if not isinstance(sha256, str):  # running hasher of an appendable file
+        _hashers[path] = (st.st_size, st.st_mtime_ns, sha256.copy())
+        sha256 = sha256.hexdigest()
+    meta.update(extra)
+    meta.update({
+        "file": os.path.basename(path),
+        "columns": [str(c) for c in df.columns],
+        "sha256": sha256,
+        "size_bytes": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "saved_at": time.time(),
+    })
+    _write_json(sidecar_path(path), meta)
+    update_entry(os.path.dirname(path), meta)
+    return meta
+
+
+# -------------------------------------------------
+# INDEX
+# -------------------------------------------------
+def _write_json(path, obj):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def update_entry(folder, meta):
+    with _lock:
+        index = _read_json(os.path.join(folder, CATALOG_FILE)) or {}
+        index[meta["file"]] = meta
+        _write_json(os.path.join(folder, CATALOG_FILE), index)
+
+
+def remove_entry(folder, name):
+    with _lock:
+        index = _read_json(os.path.join(folder, CATALOG_FILE)) or {}
+        if index.pop(name, None) is not None:
+            _write_json(os.path.join(folder, CATALOG_FILE), index)
+
+
+def load_catalog(folder):
+    """
+    Catalog entries for every visible file in `folder` (dict name -> meta),
+    reconciled against one directory scan.
+    """
+    if not os.path.isdir(folder):
+        return {}
+
+    index = _read_json(os.path.join(folder, CATALOG_FILE)) or {}
+    changed = False
+    current = {}
+
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            st = entry.stat()
+            meta = index.get(entry.name)
+            if meta is None or meta.get("size_bytes") != st.st_size or meta.get("mtime_ns") != st.st_mtime_ns:
+                side = _read_json(sidecar_path(entry.path))
+                if side and side.get("size_bytes") == st.st_size and side.get("mtime_ns") == st.st_mtime_ns:
+                    meta = side
+                else:
+                    meta = {"file": entry.name, "source": "unindexed",
+                            "size_bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+                changed = True
+            current[entry.name] = meta
+
+    if changed or len(current) != len(index):
+        with _lock:
+            _write_json(os.path.join(folder, CATALOG_FILE), current)
+    return current
+
+
+def catalog_frame(folder):
+    """Catalog as a DataFrame for display/filtering (newest first)."""
+    entries = list(load_catalog(folder).values())
+    cols = ["file", "source", "rows", "true_emitters", "clusters", "toa_span_s", "size_bytes", "saved_at", "sha256"]
+    df = pd.DataFrame(entries, columns=cols)
+    if df.empty:
+        return df
+    df["size_MB"] = (df["size_bytes"] / 1e6).round(3)
+    df["saved"] = pd.to_datetime(df["saved_at"], unit="s").dt.strftime("%Y-%m-%d %H:%M:%S")
+    df = df.sort_values("saved_at", ascending=False, na_position="last")
+    return df.drop(columns=["size_bytes", "saved_at"]).reset_index(drop=True)
@@ -0,0 +1,283 @@
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+import numpy as np
+import sklearn
+from sklearn.cluster import DBSCAN
+
+import perf
+from deinterleaving.jobs import MAX_WORKERS
+
+try:
+    import fcntl
+except ImportError:  # Windows: workers may then calibrate concurrently
+    fcntl = None
+
+try:
+    from sklearn.cluster import HDBSCAN as SklearnHDBSCAN
+except ImportError:
+    SklearnHDBSCAN = None
+try:
+    import hdbscan as hdbscan_pkg
+except ImportError:
+    hdbscan_pkg = None
+
+HAS_HDBSCAN = SklearnHDBSCAN is not None or hdbscan_pkg is not None
+
+# -------------------------------------------------
+# ADAPTIVE CLUSTERING BACKEND DISPATCH
+# -------------------------------------------------
+# DBSCAN and HDBSCAN can run on several backends: sklearn or the `hdbscan`
+# package, a kd-tree, ball-tree or brute-force neighbour search (or Boruvka
+# / Prim for `hdbscan`), several threads, and float32 where the backend
+# keeps it. None of them is fastest everywhere. A short micro-benchmark
+# times every candidate on synthetic blobs (plus noise) at a few sizes and
+# dimensionalities. A candidate slower than CANDIDATE_BUDGET_S is not
+# tried at larger sizes, and the whole run stops growing sizes after
+# CALIBRATION_BUDGET_S. The timings are cached on disk, keyed by machine
+# (cores, Python / sklearn / hdbscan versions), so each job worker
+# calibrates at most once per machine. choose() then picks the fastest
+# candidate for the nearest calibrated size and dimensionality. Above the
+# largest calibrated size brute force is never chosen: it is O(n^2), and
+# sklearn's HDBSCAN then builds the dense n x n distance matrix. Workers
+# calibrate one at a time (OS file lock), so timings are not taken while
+# competing for the CPU, and later workers reuse the first one's result.
+# Recalibrate with `python -m deinterleaving.backends --calibrate`.
+
+CACHE_PATH = os.environ.get("PDW_BACKEND_CACHE", os.path.join("outputs", ".backend_calibration.json"))
+CALIBRATION_SIZES = (500, 2_000, 8_000)
+CALIBRATION_DIMS = (2, 4)
+CANDIDATE_BUDGET_S = 0.5
+CALIBRATION_BUDGET_S = 8.0  # per algorithm; larger sizes are skipped beyond it
+CALIBRATION_VERSION = 1
+
+_lock = threading.Lock()
+_table = None
+
+
+def job_cores():
+    """Cores one clustering job may use without oversubscribing the job pool."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return max(1, cores // MAX_WORKERS)
+
+
+def fingerprint():
+    return {
+        "version": CALIBRATION_VERSION,
+        "cores": job_cores(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "sklearn": sklearn.__version__,
+        "hdbscan": getattr(hdbscan_pkg, "__version__", "installed") if hdbscan_pkg else None,
+    }
+
+
+# -------------------------------------------------
+# CANDIDATES
+# -------------------------------------------------
+def candidates(algorithm, cores=None):
+    """Backend configurations to time for `algorithm` ("DBSCAN" / "HDBSCAN")."""
+    cores = cores or job_cores()
+    threads = sorted({1, cores})
+    out = []
+    if algorithm == "DBSCAN":
+        for tree in ("kd_tree", "ball_tree", "brute"):
+            for n_jobs in threads:
+                out.append({"lib": "sklearn", "algorithm": tree, "n_jobs": n_jobs, "dtype": "float64"})
+        # Only brute force keeps float32 (the trees convert to float64)
+        out += [{"lib": "sklearn", "algorithm": "brute", "n_jobs": n_jobs, "dtype": "float32"} for n_jobs in threads]
+    elif algorithm == "HDBSCAN":
+        if SklearnHDBSCAN is not None:
+            for tree in ("kd_tree", "ball_tree", "brute"):
+                for n_jobs in threads:
+                    out.append({"lib": "sklearn", "algorithm": tree, "n_jobs": n_jobs, "dtype": "float64"})
+        if hdbscan_pkg is not None:
+            for alg in ("boruvka_kdtree", "boruvka_balltree", "prims_kdtree"):
+                out.append({"lib": "hdbscan", "algorithm": alg, "n_jobs": cores, "dtype": "float64"})
+    return out
+
+
+def candidate_id(c):
+    return f"{c['lib']}/{c['algorithm']}/jobs={c['n_jobs']}/{c['dtype']}"
+
+
+def _default(algorithm):
+    """Backend used before (or without) calibration: the previous behaviour."""
+    lib = "sklearn" if algorithm == "DBSCAN" or SklearnHDBSCAN is not None else "hdbscan"
+    return {"lib": lib, "algorithm": "best" if lib == "hdbscan" else "auto", "n_jobs": 1, "dtype": "float64"}
+
+
+# -------------------------------------------------
+# RUNNING
+# -------------------------------------------------
+def fit_predict(algorithm, X, params, backend=None):
+    """Raw labels from DBSCAN / HDBSCAN on the chosen (or given) backend."""
+    X = np.asarray(X)
+    backend = backend or choose(algorithm, len(X), X.shape[1] if X.ndim == 2 else 1)
+    X = X.astype(backend["dtype"], copy=False)
+
+    if algorithm == "DBSCAN":
+        est = DBSCAN(eps=params["eps"], min_samples=params["min_samples"],
+                     algorithm=backend["algorithm"], n_jobs=backend["n_jobs"])
+    elif backend["lib"] == "sklearn":
+        est = SklearnHDBSCAN(min_cluster_size=params["min_cluster_size"], min_samples=params["min_samples"],
+                             algorithm=backend["algorithm"], n_jobs=backend["n_jobs"])
+    else:
+        est = hdbscan_pkg.HDBSCAN(min_cluster_size=params["min_cluster_size"], min_samples=params["min_samples"],
+                                  algorithm=backend["algorithm"], core_dist_n_jobs=backend["n_jobs"])
+    return est.fit_predict(X)
+
+
+# -------------------------------------------------
+# CALIBRATION
+# -------------------------------------------------
+_CAL_PARAMS = {"DBSCAN": {"eps": 0.15, "min_samples": 5},
+               "HDBSCAN": {"min_cluster_size": 10, "min_samples": 10}}
+
+
+def _calibration_data(n, d, seed=0):
+    """Standardized blobs (10 emitters) with 10% uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-3, 3, (10, d))
+    n_noise = n // 10
+    X = np.vstack([
+        centers[rng.integers(0, 10, n - n_noise)] + rng.normal(0, 0.15, (n - n_noise, d)),
+        rng.uniform(-4, 4, (n_noise, d)),
+    ])
+    return (X - X.mean(axis=0)) / X.std(axis=0)
+
+
+def calibrate(algorithm, sizes=CALIBRATION_SIZES, dims=CALIBRATION_DIMS, budget_s=CANDIDATE_BUDGET_S):
+    """Time every candidate; returns {dim: {size: {candidate_id: seconds}}}."""
+    cands = {candidate_id(c): c for c in candidates(algorithm)}
+    results = {}
+    for d in dims:
+        alive = dict(cands)
+        results[str(d)] = {}
+        deadline = time.perf_counter() + CALIBRATION_BUDGET_S / len(dims)
+        for n in sizes:
+            if results[str(d)] and time.perf_counter() > deadline:
+                break
+            X = _calibration_data(n, d)
+            timings = {}
+            for cid, c in alive.items():
+                t0 = time.perf_counter()
+                fit_predict(algorithm, X, _CAL_PARAMS[algorithm], backend=c)
+                timings[cid] = time.perf_counter() - t0
+            results[str(d)][str(n)] = timings
+            alive = {cid: c for cid, c in alive.items() if timings[cid] <= budget_s}
+            if not alive:
+                break
+    return {"candidates": cands, "timings": results}
+
+
+def _read_cache():
+    try:
+        with open(CACHE_PATH) as f:
+            table = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return table if table.get("fingerprint") == fingerprint() else None
+
+
+def _write_cache(table):
+    folder = os.path.dirname(CACHE_PATH)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = f"{CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(table, f, indent=1)
+    os.replace(tmp, CACHE_PATH)
+
+
+class _CacheLock:
+    """Exclusive OS lock next to the cache file, held while calibrating."""
+
+    def __enter__(self):
+        folder = os.path.dirname(CACHE_PATH)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.fh = open(CACHE_PATH + ".lock", "a")
+        if fcntl is not None:
+            fcntl.flock(self.fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.fh, fcntl.LOCK_UN)
+        self.fh.close()
+
+
+def calibration(algorithm, force=False):
+    """Calibration for `algorithm`, measured on first use and cached on disk."""
+    global _table
+    with _lock:
+        if _table is None or force:
+            _table = (None if force else _read_cache()) or {"fingerprint": fingerprint(), "algorithms": {}}
+        if algorithm not in _table["algorithms"]:
+            with _CacheLock():
+                # Another worker may have calibrated while we waited
+                on_disk = _read_cache()
+                if not force and on_disk and algorithm in on_disk["algorithms"]:
+                    _table["algorithms"][algorithm] = on_disk["algorithms"][algorithm]
+                else:
+                    with perf.stage("backend_calibration", algorithm=algorithm):
+                        _table["algorithms"][algorithm] = calibrate(algorithm)
+                    if on_disk:
+                        _table["algorithms"] = {**on_disk["algorithms"], **_table["algorithms"]}
+                    _write_cache(_table)
+        return _table["algorithms"][algorithm]
+
+
+def _nearest(keys, value, log=False):
+    keys = sorted(keys, key=int)
+    f = (lambda k: abs(np.log(int(k)) - np.log(max(value, 1)))) if log else (lambda k: abs(int(k) - value))
+    return min(keys, key=f)
+
+
+def choose(algorithm, n, d):
+    """Fastest calibrated backend for n pulses of dimensionality d."""
+    if algorithm not in ("DBSCAN", "HDBSCAN") or not candidates(algorithm):
+        return _default(algorithm)
+    cal = calibration(algorithm)
+    by_size = cal["timings"][_nearest(cal["timings"], d)]
+    # Sizes beyond the largest calibrated one use its timings; slow
+    # candidates were already dropped there, and brute force (O(n^2)
+    # time, and memory for HDBSCAN) is not extrapolated
+    timings = by_size[_nearest(by_size, n, log=True)]
+    if n > max(int(k) for k in by_size):
+        timings = {cid: t for cid, t in timings.items() if cal["candidates"][cid]["algorithm"] != "brute"}
+    if not timings:
+        return _default(algorithm)
+    best = min(timings, key=timings.get)
+    return cal["candidates"][best]
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Calibrate and show the clustering backend choices.")
+    parser.add_argument("--calibrate", action="store_true", help="re-run the micro-benchmark")
+    args = parser.parse_args(argv)
+
+    for algorithm in ("DBSCAN", "HDBSCAN"):
+        if not candidates(algorithm):
+            continue
+        cal = calibration(algorithm, force=args.calibrate)
+        print(f"{algorithm}:")
+        for d, by_size in cal["timings"].items():
+            for n, timings in by_size.items():
+                best = min(timings, key=timings.get)
+                print(f"  d={d} n={n:>6}: {best} ({timings[best] * 1e3:.1f} ms, {len(timings)} timed)")
+    print(f"Cache: {CACHE_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from sklearn.metrics import silhouette_score, davies_bouldin_score
+from sklearn.preprocessing import StandardScaler
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+import perf
+from deinterleaving.backends import HAS_HDBSCAN, fit_predict as backend_fit_predict, job_cores
+
+# Rows per block for the out-of-core (chunked) path
+CHUNK_ROWS = 65_536
+
+# -------------------------------------------------
+# Clustering core shared by the Streamlit page and the benchmark suite.
+# Kept free of any Streamlit calls so it can run headless.
+# -------------------------------------------------
+
+def available_algorithms():
+    algo_options = ["K-Means", "K-Means (Mini-Batch)", "DBSCAN"]
+    if HAS_HDBSCAN:
+        algo_options.insert(2, "HDBSCAN")
+    return algo_options
+
+
+def scale_features(df, features):
+    X = df[features].values
+    return StandardScaler().fit_transform(X)
+
+
+class FeatureMatrix:
+    """
+    The selected features scaled once into one contiguous, read-only matrix
+    (float32 by default), plus the fitted scaler. Auto-tune, clustering runs
+    and predictions on new pulses (transform) all share it instead of
+    re-scaling per call.
+    """
+
+    def __init__(self, df, features, dtype=np.float32):
+        self.features = list(features)
+        X = df[self.features].to_numpy(dtype=np.float64, copy=True)
+        self.scaler = StandardScaler().fit(X)
+        self.X = self._apply(X, dtype)
+        self.X.setflags(write=False)
+
+    def _apply(self, X, dtype):
+        X -= self.scaler.mean_  # in place: no second float64 copy
+        X /= self.scaler.scale_
+        return np.ascontiguousarray(X, dtype=dtype)
+
+    def transform(self, df):
+        """New pulses in the same scaled space (e.g. to predict against a fitted model)."""
+        return self._apply(df[self.features].to_numpy(dtype=np.float64, copy=True), self.X.dtype)
+
+    @property
+    def nbytes(self):
+        return self.X.nbytes
+
+
+def count_clusters(labels):
+    """Number of clusters in a label vector, excluding noise (-1)."""
+    if len(labels) == 0:
+        return 0
+    uniq = np.unique(labels)
+    return int(len(uniq) - np.count_nonzero(uniq == -1))
+
+
+def normalize_labels(labels, toa=None):
+    """
+    Raw labels -> compact emitter IDs in one vectorized pass.
+
+    Noise (-1) becomes 0 and clusters become 1..N, numbered by the TOA of
+    their first pulse when `toa` is given, else by size (largest first);
+    ties keep raw label order. Returns (ids, sizes, noise): ids as int16
+    (int32 if there are more clusters than int16 holds), sizes[i] the pulse
+    count of emitter i + 1, noise the number of noise pulses.
+    """
+    uniq, inv, counts = np.unique(np.asarray(labels), return_inverse=True, return_counts=True)
+    inv = inv.reshape(-1)
+    is_noise = uniq == -1
+    clusters = np.flatnonzero(~is_noise)
+
+    if toa is not None:
+        first = np.full(len(uniq), np.inf)
+        np.minimum.at(first, inv, np.asarray(toa, dtype=np.float64))
+        key = first[clusters]
+    else:
+        key = -counts[clusters]
+    ranked = clusters[np.argsort(key, kind="stable")]
+
+    dtype = np.int16 if len(ranked) <= np.iinfo(np.int16).max else np.int32
+    lut = np.zeros(len(uniq), dtype=dtype)
+    lut[ranked] = np.arange(1, len(ranked) + 1)
+    return lut[inv], counts[ranked], int(counts[is_noise].sum())
+
+
+def run_clustering(X_scaled, algorithm, params):
+    """Run one algorithm on an already-scaled matrix and return raw labels."""
+    labels = []
+
+    if algorithm == "K-Means":
+        kmeans = KMeans(n_clusters=params["n_clusters"], random_state=42, n_init=10)
+        labels = kmeans.fit_predict(X_scaled)
+
+    elif algorithm == "K-Means (Mini-Batch)":
+        labels = minibatch_kmeans(X_scaled, None, params["n_clusters"],
+                                  chunk_rows=params.get("chunk_rows", CHUNK_ROWS))
+
+    elif algorithm in ("HDBSCAN", "DBSCAN"):
+        # Backend (library, neighbour search, threads, dtype) picked per
+        # data size from the on-disk calibration (deinterleaving/backends.py)
+        labels = backend_fit_predict(algorithm, X_scaled, params)
+
+    return labels
+
+
+# -------------------------------------------------
+# GRID DENSITY PRE-FILTER (DBSCAN / HDBSCAN)
+# -------------------------------------------------
+# Scaled pulses are hashed into grid cells of side `cell`, and one
+# np.unique pass counts every cell's occupancy. A pulse is kept when the
+# cells within `radius` of its own hold at least `min_count` pulses. The
+# rest are isolated noise: they skip the clusterer and are labelled -1.
+# Cell keys are a linear hash (uint64 wrap-around), so the neighbour at
+# offset o is key + hash(o). A collision can only over-count and keep a
+# pulse. With cell = eps, min_count = min_samples and radius = 2, DBSCAN's
+# result is unchanged: a core point's eps-ball lies in its own 3^d block,
+# which lies in the 5^d block of every pulse within eps of it.
+
+PREFILTER_RADIUS = 2
+_HASH = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                  0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53], dtype=np.uint64)
+
+
+def density_prefilter(X, cell, min_count, radius=PREFILTER_RADIUS):
+    """Boolean mask of the pulses in dense enough grid neighbourhoods."""
+    X = np.asarray(X)
+    n, d = X.shape
+    if n == 0 or min_count <= 1:
+        return np.ones(n, dtype=bool)
+    mult = np.resize(_HASH, d)  # more features than multipliers: reuse (collisions only keep more)
+    cells = np.floor(X / cell).astype(np.int64).view(np.uint64)
+    keys = (cells * mult).sum(axis=1, dtype=np.uint64)
+    uniq, inv, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+    span = np.arange(-radius, radius + 1, dtype=np.int64)
+    offsets = np.stack(np.meshgrid(*[span] * d, indexing="ij"), axis=-1).reshape(-1, d)
+    deltas = np.unique((offsets.view(np.uint64) * mult).sum(axis=1, dtype=np.uint64))
+    neighbours = np.zeros(len(uniq), dtype=np.int64)
+    for delta in deltas:
+        target = uniq + delta
+        j = np.minimum(np.searchsorted(uniq, target), len(uniq) - 1)
+        hit = uniq[j] == target
+        neighbours[hit] += counts[j[hit]]
+    return neighbours[inv.reshape(-1)] >= min_count
+
+
+def prefilter_cell(algorithm, params):
+    """Grid cell for an algorithm: eps for DBSCAN (exact), else params["cell"]."""
+    return params["eps"] if algorithm == "DBSCAN" else params["cell"]
+
+
+def run_prefiltered(X_scaled, algorithm, params, compare=False):
+    """
+    run_clustering() on the pulses that survive density_prefilter(); dropped
+    pulses are noise (-1). Returns (labels, report). With compare=True the
+    unfiltered run is timed too, giving the speedup and how many pulses
+    changed assignment.
+    """
+    n = len(X_scaled)
+    t0 = time.perf_counter()
+    with perf.stage("density_prefilter", rows=n):
+        keep = density_prefilter(X_scaled, prefilter_cell(algorithm, params), params["min_samples"])
+    t1 = time.perf_counter()
+    labels = np.full(n, -1, dtype=np.int64)
+    if keep.sum() >= params["min_samples"]:
+        labels[keep] = run_clustering(X_scaled[keep], algorithm, params)
+    t2 = time.perf_counter()
+
+    report = {"kept": int(keep.sum()), "dropped": int(n - keep.sum()),
+              "filter_s": t1 - t0, "run_s": t2 - t1}
+    if compare:
+        from deinterleaving.metrics import purity
+        from sklearn.metrics import adjusted_rand_score
+        t3 = time.perf_counter()
+        full = run_clustering(X_scaled, algorithm, params)
+        report["full_s"] = time.perf_counter() - t3
+        report["speedup"] = report["full_s"] / max(t2 - t0, 1e-9)
+        # Pulses outside their filtered cluster's majority unfiltered label
+        report["changed"] = int(round(n * (1.0 - purity(full, labels)))) if n else 0
+        report["ari_vs_full"] = float(adjusted_rand_score(full, labels)) if n else 1.0
+    return labels, report
+
+
+# -------------------------------------------------
+# OUT-OF-CORE PATH (chunked scaling + Mini-Batch K-Means)
+# -------------------------------------------------
+# Works on a memory-mapped Recording, a DataFrame or a 2-D array without
+# ever materializing more than one float32 block of `chunk_rows` rows
+# (plus the int32 label vector), so K-Means runs on recordings larger
+# than RAM. The bound is on top of the source itself: an in-memory
+# DataFrame is scaled chunk by chunk from its own columns (no full scaled
+# copy), while an already-scaled matrix passed through run_clustering()
+# is of course already resident.
+
+def iter_feature_chunks(source, features, chunk_rows=CHUNK_ROWS):
+    """Yield float32 (rows x d) blocks of the selected features."""
+    if hasattr(source, "column"):  # Recording (memory-mapped columns)
+        cols = [source.column(f) for f in features]
+        n = len(source)
+        for start in range(0, n, chunk_rows):
+            yield np.column_stack([c[start:start + chunk_rows] for c in cols]).astype(np.float32, copy=False)
+    elif hasattr(source, "columns"):  # DataFrame
+        cols = [source[f].to_numpy() for f in features]
+        for start in range(0, len(source), chunk_rows):
+            yield np.column_stack([c[start:start + chunk_rows] for c in cols]).astype(np.float32, copy=False)
+    else:  # 2-D array; features ignored
+        for start in range(0, len(source), chunk_rows):
+            yield np.asarray(source[start:start + chunk_rows], dtype=np.float32)
+
+
+def fit_scaler_chunked(source, features, chunk_rows=CHUNK_ROWS):
+    scaler = StandardScaler()
+    for block in iter_feature_chunks(source, features, chunk_rows):
+        scaler.partial_fit(block)
+    return scaler
+
+
+def minibatch_kmeans(source, features, n_clusters, chunk_rows=CHUNK_ROWS, epochs=2, progress=None):
+    """Chunked StandardScaler + MiniBatchKMeans; returns int32 labels."""
+    n = len(source)
+    chunk_rows = max(chunk_rows, 3 * n_clusters)
+    n_chunks = max(1, -(-n // chunk_rows))
+    steps = n_chunks * (epochs + 2)
+    done = 0
+
+    with perf.stage("chunked_scaler_fit"):
+        scaler = fit_scaler_chunked(source, features, chunk_rows)
+    done += n_chunks
+
+    mbk = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=min(chunk_rows, 4096), n_init=3)
+    with perf.stage("minibatch_fit", epochs=epochs):
+        for _ in range(epochs):
+            for block in iter_feature_chunks(source, features, chunk_rows):
+                if len(block) >= n_clusters:
+                    mbk.partial_fit(scaler.transform(block))
+                done += 1
+                if progress:
+                    progress(done / steps)
+
+    labels = np.empty(n, dtype=np.int32)
+    with perf.stage("minibatch_predict"):
+        start = 0
+        for block in iter_feature_chunks(source, features, chunk_rows):
+            labels[start:start + len(block)] = mbk.predict(scaler.transform(block))
+            start += len(block)
+            done += 1
+            if progress:
+                progress(done / steps)
+    return labels
+
+
+def minibatch_kmeans_recording(path, features, n_clusters, chunk_rows=CHUNK_ROWS, progress=None):
+    """Out-of-core K-Means straight from a recording's memory maps (job-friendly)."""
+    from deinterleaving.recordings import open_recording
+    return minibatch_kmeans(open_recording(path), features, n_clusters, chunk_rows, progress=progress)
+
+
+# -------------------------------------------------
+# AUTO-TUNE (match a known emitter count)
+# -------------------------------------------------
+# A warm start ({"params": previous optimum, "n": previous pulse count,
+# "emitters": previous emitter count}) first searches outward from the
+# previous optimum within WARM_RADIUS steps; only if that finds no exact
+# match does the full sweep run, reusing every value already evaluated.
+# HDBSCAN's min_cluster_size is rescaled by pulses per emitter, not total
+# pulses: in Auto mode each window redraws its emitters, so more pulses
+# can mean more emitters rather than bigger clusters.
+
+WARM_RADIUS = 4
+
+
+def _sweep(values, evaluate, start_idx=None, progress=None, param="value"):
+    """
+    Evaluate candidate values until one gives zero count error.
+    Returns (best index, best error, info) with info on how it was found.
+    """
+    tried = {}
+
+    def err_at(i):
+        if i not in tried:
+            with perf.stage("tune_iter", **{param: values[i]}):
+                tried[i] = evaluate(values[i])
+            if progress:
+                progress(len(tried) / len(values))
+        return tried[i]
+
+    mode = "full"
+    if start_idx is not None:
+        start_idx = int(np.clip(start_idx, 0, len(values) - 1))
+        for step in range(WARM_RADIUS + 1):
+            for i in ([start_idx] if step == 0 else [start_idx + step, start_idx - step]):
+                if 0 <= i < len(values) and err_at(i) == 0:
+                    return i, 0, {"mode": "warm", "evaluated": len(tried)}
+        mode = "warm miss, full sweep"
+
+    for i in range(len(values)):
+        if err_at(i) == 0:
+            break
+
+    # Ties go to the earliest value in sweep order, as in a plain scan
+    best = min(tried, key=lambda i: (tried[i], i))
+    return best, tried[best], {"mode": mode, "evaluated": len(tried)}
+
+
+def autotune_hdbscan(X_scaled, known_emitters, progress=None, warm_start=None):
+    """
+    Scan min_cluster_size (= min_samples) until the cluster count
+    matches known_emitters. Returns (params, abs count error, search info).
+    progress: optional callback receiving the fraction of the sweep done.
+    """
+    # Search space
+    search_range = list(range(2, 40, 1))
+
+    def evaluate(mcs):
+        l = run_clustering(X_scaled, "HDBSCAN", {"min_cluster_size": mcs, "min_samples": mcs})
+        return abs(count_clusters(l) - known_emitters)
+
+    start_idx = None
+    if warm_start:
+        # Cluster sizes grow with pulses per emitter; without the previous
+        # emitter count the previous optimum is reused as is
+        scaled = warm_start["params"]["min_cluster_size"]
+        if warm_start.get("emitters") and known_emitters:
+            per_emitter = len(X_scaled) / known_emitters
+            scaled *= per_emitter / max(warm_start["n"] / warm_start["emitters"], 1)
+        start_idx = int(round(scaled)) - search_range[0]
+
+    i, best_score, info = _sweep(search_range, evaluate, start_idx, progress, "min_cluster_size")
+    return {"min_cluster_size": search_range[i], "min_samples": search_range[i]}, best_score, info
+
+
+def autotune_dbscan(X_scaled, known_emitters, progress=None, warm_start=None):
+    """
+    Scan eps (min_samples fixed at 5) until the cluster count matches
+    known_emitters. Returns (params, abs count error, search info).
+    """
+    # Search space for EPS
+    # 0.1 to 2.0 usually covers scaled data (StandardScaler makes mean=0, std=1)
+    # We'll scan finely.
+    eps_range = [round(float(e), 2) for e in np.arange(0.1, 3.0, 0.1)]
+    ms = 5 # Fix min_samples or tune it too? kept simple for now
+
+    def evaluate(eps):
+        l = run_clustering(X_scaled, "DBSCAN", {"eps": eps, "min_samples": ms})
+        return abs(count_clusters(l) - known_emitters)
+
+    start_idx = None
+    if warm_start:
+        # eps lives in standardized units, so it carries over unscaled
+        start_idx = int(np.argmin([abs(e - warm_start["params"]["eps"]) for e in eps_range]))
+
+    i, best_score, info = _sweep(eps_range, evaluate, start_idx, progress, "eps")
+    return {"eps": eps_range[i], "min_samples": ms}, best_score, info
+
+
+# -------------------------------------------------
+# AUTOMATIC K SELECTION (emitter count unknown)
+# -------------------------------------------------
+# K-Means candidates are fitted on a bounded subsample and scored on a
+# smaller evaluation sample, either by silhouette (O(s^2) on the sample, not
+# the full O(n^2)) or by Davies-Bouldin (O(s*k), cheaper). Likelihood-based
+# criteria (BIC, Calinski-Harabasz) keep rewarding splits of the very tight
+# clusters simulated PDWs form, so they are not offered. The k range is split into contiguous
+# blocks run in parallel threads; inside a block each k is warm-started from
+# the previous k's centroids plus the worst-fitted point. Candidates stop
+# being started once the time budget is spent and the best k found so far
+# is returned. A candidate whose fit collapses to one cluster counts as
+# evaluated but is never picked. Threads are capped by job_cores() so
+# concurrent jobs do not oversubscribe the machine.
+
+def _score_k_block(X_fit, X_eval, ks, method, deadline, on_done):
+    scores = {}
+    centers = None
+    for k in ks:
+        if time.perf_counter() > deadline:
+            break
+        if centers is None:
+            km = KMeans(n_clusters=k, random_state=42, n_init=3)
+        else:
+            # Warm start: previous centroids + the point furthest from its centroid
+            d2 = ((X_fit - centers[prev_labels]) ** 2).sum(axis=1)
+            init = np.vstack([centers, X_fit[np.argmax(d2)]])
+            km = KMeans(n_clusters=k, init=init, n_init=1, random_state=42)
+        prev_labels = km.fit_predict(X_fit)
+        centers = km.cluster_centers_
+
+        eval_labels = km.predict(X_eval)
+        if len(np.unique(eval_labels)) < 2:
+            scores[k] = -np.inf
+        elif method == "davies_bouldin":
+            scores[k] = -float(davies_bouldin_score(X_eval, eval_labels))  # negate: higher is better
+        else:
+            scores[k] = float(silhouette_score(X_eval, eval_labels))
+        on_done()
+    return scores
+
+
+def select_k(X_scaled, k_min=2, k_max=20, method="silhouette", time_budget_s=10.0,
+             fit_sample=20_000, eval_sample=3_000, n_jobs=4, progress=None):
+    """
+    Pick the number of clusters for K-Means. Returns a dict with best_k,
+    per-k scores (higher is better), evaluated count and whether the time
+    budget cut the search short.
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + time_budget_s
+    rng = np.random.default_rng(0)
+
+    X = np.asarray(X_scaled, dtype=np.float32)
+    k_max = max(k_min, min(k_max, len(X) - 1))
+    X_fit = X[rng.choice(len(X), fit_sample, replace=False)] if len(X) > fit_sample else X
+    X_eval = X_fit[rng.choice(len(X_fit), eval_sample, replace=False)] if len(X_fit) > eval_sample else X_fit
+
+    ks = list(range(k_min, k_max + 1))
+    n_jobs = max(1, min(n_jobs, len(ks), job_cores()))
+    blocks = [list(b) for b in np.array_split(ks, n_jobs) if len(b)]
+
+    finished = [0]
+    def on_done():
+        finished[0] += 1
+        if progress:
+            progress(finished[0] / len(ks))
+
+    scores = {}
+    with perf.stage("select_k", method=method, k_range=f"{k_min}-{k_max}"):
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_score_k_block, X_fit, X_eval, b, method, deadline, on_done) for b in blocks]
+            for fut in futures:
+                scores.update(fut.result())
+
+    evaluated = len(scores)
+    scores = {k: v for k, v in scores.items() if np.isfinite(v)}
+    best_k = max(scores, key=scores.get) if scores else k_min
+    return {
+        "best_k": int(best_k),
+        "scores": {int(k): float(v) for k, v in sorted(scores.items())},
+        "method": method,
+        "evaluated": evaluated,
+        "timed_out": evaluated < len(ks),
+        "elapsed_s": time.perf_counter() - t0,
+    }
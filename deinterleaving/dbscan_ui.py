@@ -1,27 +1,175 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import hashlib
+import io
+import json
+import os
+import time
 
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import DBSCAN, KMeans
 import matplotlib.pyplot as plt
 
-# Try importing HDBSCAN from sklearn (v1.3+) or hdbscan package
-try:
-    from sklearn.cluster import HDBSCAN
-    HAS_HDBSCAN = True
-    HDBSCAN_LIB = "sklearn"
-except ImportError:
+import catalog
+import pdw_format
+import perf
+from deinterleaving.clustering import FeatureMatrix, available_algorithms, count_clusters, normalize_labels
+from deinterleaving.ensemble import ENSEMBLE, consensus, ensemble_members
+from deinterleaving.jobs import get_queue, JobQueueFull, DONE, FAILED, CANCELLED
+from deinterleaving.library import REQUIRED_COLUMNS as LIBRARY_COLUMNS, cluster_parameters, load_library, match_table
+from deinterleaving.metrics import score_labels
+from deinterleaving.pipeline import PIPELINE, DEFAULTS as PIPELINE_DEFAULTS, REQUIRED_COLUMNS as PIPELINE_COLUMNS
+from deinterleaving.pri_analysis import pri_structure
+from deinterleaving.recordings import open_recording, list_recordings
+from ingest.server import INGEST_HOST, INGEST_PORT, get_server as get_ingest_server, stream_id as ingest_stream_id
+
+JOB_POLL_S = 0.5
+MAX_PLOT_POINTS = 50_000  # scatter is decimated beyond this
+ENSEMBLE_JOB_KEY = "ensemble_job_{}"  # one job per member algorithm
+JOB_KEYS = ["tune_job_hdbscan", "tune_job_dbscan", "select_k_job", "run_job"] + [
+    ENSEMBLE_JOB_KEY.format(a) for a in ensemble_members()
+]
+
+# -------------------------------------------------
+# BACKGROUND JOB HELPERS
+# -------------------------------------------------
+# Auto-tune and clustering run in the server-wide process pool
+# (deinterleaving/jobs.py); the session only keeps job IDs in dbscan_state.
+
+def _current_user():
+    return st.session_state.get("user_info", {}).get("username", "anonymous")
+
+
+def _submit_job(state, key, fn_name, *args, label=None, meta=None, **kwargs):
     try:
-        import hdbscan
-        HAS_HDBSCAN = True
-        HDBSCAN_LIB = "hdbscan"
-    except ImportError:
-        HAS_HDBSCAN = False
-        HDBSCAN_LIB = None
+        state[key] = {
+            "id": get_queue().submit(_current_user(), fn_name, *args, label=label, **kwargs),
+            **(meta or {})
+        }
+    except JobQueueFull as e:
+        st.error(f"❌ Job queue full: {e}")
+
+
+def _cancel_jobs(state):
+    for key in JOB_KEYS:
+        job = state.pop(key, None)
+        if job:
+            get_queue().cancel(job["id"])
+    state.pop("ensemble_pending", None)
+
+
+def _poll_job(state, key):
+    """
+    Show progress for the job stored under state[key].
+    Returns (status, result, job meta) once it has finished, else None.
+    """
+    job = state.get(key)
+    if not job:
+        return None
+
+    q = get_queue()
+    info = q.status(job["id"])
+    if info is None:
+        # Expired or server restarted: forget it so the page can resubmit
+        del state[key]
+        return None
+
+    if info["status"] == DONE:
+        del state[key]
+        return DONE, q.result(job["id"]), job
+    if info["status"] in (FAILED, CANCELLED):
+        del state[key]
+        q.forget(job["id"])
+        if info["status"] == FAILED:
+            st.error(f"❌ {info['label']} failed: {info['error']}")
+        return info["status"], None, job
+
+    if info["status"] == "queued":
+        text = f"⏳ {info['label']} — queued (position {info['position'] + 1}, waited {info['wait_s']:.0f}s)"
+    else:
+        text = f"⚙️ {info['label']} — running {info['run_s']:.1f}s"
+    st.progress(info["progress"], text=text)
+    if st.button("Cancel", key=f"cancel_{key}"):
+        q.cancel(job["id"])
+    return None
+
+
+def open_in_deinterleaver(path):
+    """
+    Load a recorded/catalogued dataset into the de-interleaving state.
+    The catalog's ground-truth emitter count per simulator window (if any)
+    becomes the known emitter count; detected cluster counts never do.
+    """
+    state = st.session_state.dbscan_state
+
+    # A CSV (or a `.pdw`'s fixed-point columns) is converted once into a
+    # columnar cache; later opens just memory-map it. The frame is zero-copy
+    # views of those maps, so clustering pages in only its feature columns.
+    with st.spinner("Opening recording..."), perf.stage("open_recording"):
+        rec = open_recording(path)
+    missing = [c for c in ("freq_MHz", "pri_us", "toa_us") if c not in rec.columns]
+    if missing:
+        st.error(f"Recording is missing PDW columns: {', '.join(missing)}")
+        return False
+
+    name = os.path.basename(path)
+    meta = catalog.load_catalog(os.path.dirname(path)).get(name, {})
+
+    state["df"] = rec.frame()
+    state["data_version"] = state.get("data_version", 0) + 1
+    state["filename"] = f"Recording: {name}"
+    state["file_path"] = path
+    state["source_key"] = f"file:{path}"
+    state["file_known_emitters"] = meta.get("window_emitters")
+    state["results"] = None
+    state["summary"] = None
+    _cancel_jobs(state)
+    if "tuned_params" in state: del state["tuned_params"]
+    if "tuned_params_dbscan" in state: del state["tuned_params_dbscan"]
+    state.pop("auto_k", None)
+    st.session_state.last_active_mode = "File"
+    return True
+
+
+def _feature_matrix(state, df_input, features):
+    """
+    Scaled float32 features for the loaded data, built once per
+    (data_version, features) and shared by Find k, auto-tune and Run.
+    Loading or refreshing a source bumps data_version, which invalidates it.
+    """
+    key = (state.get("data_version", 0), tuple(features))
+    cached = state.get("feature_cache")
+    if cached is None or cached[0] != key:
+        with perf.stage("scaling", rows=len(df_input)):
+            cached = (key, FeatureMatrix(df_input, features))
+        state["feature_cache"] = cached
+    return cached[1].X
+
+
+def _tune_warm_start(state, algo):
+    """Previous optimum for this data source (None -> full sweep)."""
+    return state.get("tune_history", {}).get(state.get("source_key"), {}).get(algo)
+
+
+def _remember_tune(state, algo, params, n, emitters):
+    hist = state.setdefault("tune_history", {}).setdefault(state.get("source_key"), {})
+    hist[algo] = {"params": params, "n": n, "emitters": emitters}
+
+
+# -------------------------------------------------
+# PAGE
+# -------------------------------------------------
+# The page is three st.fragment sections (data source, parameters,
+# results). A widget change reruns only its own section, so moving the eps
+# slider doesn't rebuild the input preview, redraw the figure or re-export
+# the CSV. A section asks for a full rerun only when it changes something
+# the others show: newly loaded data, a job starting/finishing, or new
+# results. Each section renders its own performance panel (when it ran
+# instrumented stages), so the timings follow fragment-only reruns.
 
 def dbscan_ui():
 
+    perf.begin_run("deinterleaving")
+
     # Load persistent state
     state = st.session_state.dbscan_state
 
@@ -32,65 +180,170 @@ def dbscan_ui():
         "to separate interleaved PDWs into emitters."
     )
 
+    _data_source_section(state)
+
+    # If no data loaded yet
+    if state.get("df") is None:
+        return
+
+    # While a job is queued/running, the parameter section re-polls on a
+    # timer without touching the rest of the page.
+    polling = any(key in state for key in JOB_KEYS)
+    st.fragment(_parameters_section, run_every=JOB_POLL_S if polling else None)(state, polling)
+
+    if state.get("results") is not None:
+        _results_section(state)
+
+
+@st.fragment
+@perf.fragment_panel("deinterleaving:data_source", "⏱️ Performance · data source")
+def _data_source_section(state):
+
     # -----------------------------
     # 1. DATA SOURCE SELECTION
     # -----------------------------
     
     # Check default index based on last activity
     last_mode = st.session_state.get("last_active_mode", "Auto")
-    default_idx = 0 if last_mode == "Auto" else 1
+    default_idx = {"Auto": 0, "Manual": 1, "File": 2, "Ingest": 3}.get(last_mode, 0)
 
     data_source = st.radio(
         "Data Source",
-        ["Auto Mode (Live)", "Manual Mode (Live)"],
+        ["Auto Mode (Live)", "Manual Mode (Live)", "Recorded File", "Ingest (Live)"],
         index=default_idx,
         horizontal=True
     )
 
-    df_input = None
+    loaded = False
     known_emitters = None
     
     # Logic to load data based on source
     if data_source == "Auto Mode (Live)":
         if st.button("Load/Refresh from Auto Mode"):
-            buf = st.session_state.get("pdw_buffer", [])
+            buf = st.session_state.get("pdw_buffer")
             if not buf:
                 st.warning("Auto Mode buffer is empty. Run simulation first.")
             else:
-                df = pd.DataFrame(buf)
+                df = pd.DataFrame(buf.column_arrays(), copy=False)
                 state["df"] = df
+                state["data_version"] = state.get("data_version", 0) + 1
                 state["filename"] = "Auto Mode Live Data"
+                state["source_key"] = "auto"
+                state.pop("file_path", None)
                 state["results"] = None
                 state["summary"] = None
                 # Clear tuned params so it auto-tunes again for new data
+                # (warm-started from this source's tuning history)
+                _cancel_jobs(state)
                 if "tuned_params" in state: del state["tuned_params"]
                 if "tuned_params_dbscan" in state: del state["tuned_params_dbscan"]
+                state.pop("auto_k", None)
+                loaded = True
                 
-        df_input = state.get("df")
         # Try to get config
         if "auto_config" in st.session_state:
              known_emitters = st.session_state.auto_config.get("num_emitters")
 
     elif data_source == "Manual Mode (Live)":
         if st.button("Load/Refresh from Manual Mode"):
-            buf = st.session_state.get("manual_pdw_buffer", [])
+            buf = st.session_state.get("manual_pdw_buffer")
             if not buf:
                 st.warning("Manual Mode buffer is empty. Run simulation first.")
             else:
-                df = pd.DataFrame(buf)
+                df = pd.DataFrame(buf.column_arrays(), copy=False)
                 state["df"] = df
+                state["data_version"] = state.get("data_version", 0) + 1
                 state["filename"] = "Manual Mode Live Data"
+                state["source_key"] = "manual"
+                state.pop("file_path", None)
                 state["results"] = None
                 state["summary"] = None
                 # Clear tuned params
+                _cancel_jobs(state)
                 if "tuned_params" in state: del state["tuned_params"]
                 if "tuned_params_dbscan" in state: del state["tuned_params_dbscan"]
+                state.pop("auto_k", None)
+                loaded = True
 
-        df_input = state.get("df")
         if "manual_config" in st.session_state:
              known_emitters = st.session_state.manual_config.get("num_emitters")
 
-    # If no data loaded yet
+    elif data_source == "Recorded File":
+        out_dir = st.session_state.get("user_output_dir", "outputs")
+        files = list_recordings(out_dir)
+        if not files:
+            st.warning(f"No recordings (.csv / .pdw) in `{out_dir}` yet.")
+        else:
+            rec_name = st.selectbox("Recording", files)
+            if st.button("Load Recording"):
+                loaded = open_in_deinterleaver(f"{out_dir}/{rec_name}")
+
+        known_emitters = state.get("file_known_emitters")
+
+    elif data_source == "Ingest (Live)":
+        # One listener per server process; each user sees (and clears) only
+        # their own stream. Stopping it is in the Admin Panel.
+        srv = get_ingest_server()
+        username = st.session_state.get("user_info", {}).get("username", "")
+        stream = ingest_stream_id(username)
+        if not srv.running:
+            c1, c2 = st.columns(2)
+            tcp_port = c1.number_input("TCP Port", 1024, 65535, INGEST_PORT)
+            udp_port = c2.number_input("UDP Port (0 = off)", 0, 65535, INGEST_PORT)
+            if st.button("Start Ingest Server"):
+                try:
+                    srv.start(INGEST_HOST, int(tcp_port), int(udp_port))
+                except OSError as e:
+                    st.error(f"❌ Could not start ingest server: {e}")
+
+        if srv.running:
+            s = srv.stats(stream)
+            ports = f"TCP {s['ports']['tcp']}" + (f", UDP {s['ports']['udp']}" if s["ports"]["udp"] else "")
+            st.caption(
+                f"📡 Listening on {s['ports']['host']} ({ports}) · your stream {stream}: "
+                f"{s['my_pulses']} PDWs received, {s['my_buffered']} buffered · "
+                f"server: {s['pulses_per_s']:.0f} pulses/s avg, {s['errors']} bad packets"
+            )
+            c1, c2 = st.columns(2)
+            if c1.button("Load/Refresh from Ingest"):
+                df = srv.snapshot(stream)
+                if df.empty:
+                    st.warning(
+                        "Nothing received on your stream yet. Point a sender at the ingest port "
+                        f"(`python -m ingest.sender --user {username}`)."
+                    )
+                else:
+                    state["df"] = df
+                    state["data_version"] = state.get("data_version", 0) + 1
+                    state["filename"] = "Ingest Live Data"
+                    state["source_key"] = "ingest"
+                    # One window's ground truth, as for recorded files: Auto
+                    # senders redraw their emitters every window
+                    state["ingest_known_emitters"] = (
+                        catalog.window_emitters(df["toa_us"].to_numpy(), df["true_emitter"].to_numpy())
+                        if "true_emitter" in df.columns else None
+                    )
+                    state.pop("file_path", None)
+                    state["results"] = None
+                    state["summary"] = None
+                    _cancel_jobs(state)
+                    if "tuned_params" in state: del state["tuned_params"]
+                    if "tuned_params_dbscan" in state: del state["tuned_params_dbscan"]
+                    state.pop("auto_k", None)
+                    st.session_state.last_active_mode = "Ingest"
+                    loaded = True
+            if c2.button("Clear My Stream"):
+                srv.clear(stream)
+
+        known_emitters = state.get("ingest_known_emitters")
+
+    # The other sections read the data and ground truth from state; rerun
+    # them when either changed here.
+    if loaded or known_emitters != state.get("known_emitters"):
+        state["known_emitters"] = known_emitters
+        st.rerun()
+
+    df_input = state.get("df")
     if df_input is None:
         return
 
@@ -105,7 +358,14 @@ def dbscan_ui():
     st.dataframe(df_input.head(10))
     st.divider()
 
-    # -----------------------------
+
+@perf.fragment_panel("deinterleaving:parameters", "⏱️ Performance · parameters & jobs")
+def _parameters_section(state, polling):
+
+    df_input = state["df"]
+    known_emitters = state.get("known_emitters")
+    results_version = state.get("results_version", 0)
+
     # -----------------------------
     # 2. FEATURE SELECTION
     # -----------------------------
@@ -139,9 +399,11 @@ def dbscan_ui():
     col_algo, col_params = st.columns([1, 2])
 
     with col_algo:
-        algo_options = ["K-Means", "DBSCAN"]
-        if HAS_HDBSCAN:
-            algo_options.insert(1, "HDBSCAN")
+        algo_options = available_algorithms()
+        if all(c in df_input.columns for c in PIPELINE_COLUMNS):
+            algo_options.append(PIPELINE)
+        if len(ensemble_members()) >= 2:
+            algo_options.append(ENSEMBLE)
         
         algorithm = st.selectbox("Clustering Algorithm", algo_options)
 
@@ -149,8 +411,32 @@ def dbscan_ui():
         params = {}
         if algorithm == "K-Means":
             st.markdown("**K-Means Parameters**")
+
+            # Unknown emitter count: offer a time-bounded automatic k search
+            if not known_emitters:
+                with st.expander("🔎 Auto-select k", expanded="auto_k" not in state):
+                    k_range = st.slider("k range", 2, 50, (2, 20))
+                    method = st.radio("Criterion", ["silhouette", "davies_bouldin"], horizontal=True)
+                    budget = st.number_input("Time budget (s)", 1.0, 120.0, 10.0, 1.0)
+                    if st.button("Find k", disabled="select_k_job" in state):
+                        X_scaled = _feature_matrix(state, df_input, features)
+                        _submit_job(
+                            state, "select_k_job", "select_k", X_scaled, k_range[0], k_range[1],
+                            method, budget, label=f"Selecting k in {k_range[0]}-{k_range[1]} ({method})"
+                        )
+                    done = _poll_job(state, "select_k_job")
+                    if done and done[0] == DONE:
+                        state["auto_k"] = done[1]
+                    if "auto_k" in state:
+                        ak = state["auto_k"]
+                        st.success(
+                            f"Best k = {ak['best_k']} ({ak['method']}, {ak['evaluated']} candidates "
+                            f"in {ak['elapsed_s']:.1f}s{', budget hit' if ak['timed_out'] else ''})"
+                        )
+                        st.line_chart(pd.Series(ak["scores"], name=ak["method"]))
+
             # If we know the emitters, default to that, but allow override
-            default_k = known_emitters if known_emitters else 3
+            default_k = known_emitters if known_emitters else state.get("auto_k", {}).get("best_k", 3)
             k_val = st.number_input("Number of Clusters (k)", 2, 50, int(default_k))
             params["n_clusters"] = k_val
             
@@ -159,6 +445,18 @@ def dbscan_ui():
             elif known_emitters:
                 st.warning(f"⚠️ Mismatch with known emitter count ({known_emitters})")
 
+        elif algorithm == "K-Means (Mini-Batch)":
+            st.markdown("**Mini-Batch K-Means Parameters**")
+            default_k = known_emitters if known_emitters else 3
+            params["n_clusters"] = st.number_input("Number of Clusters (k)", 2, 50, int(default_k))
+            params["chunk_rows"] = st.select_slider(
+                "Chunk Size (rows)", [8_192, 16_384, 32_768, 65_536, 131_072, 262_144], 65_536
+            )
+            st.caption(
+                "Out-of-core: scaling and clustering stream float32 chunks"
+                + (" straight from the recording's memory maps." if state.get("file_path") else ".")
+            )
+
         elif algorithm == "HDBSCAN":
             st.markdown("**HDBSCAN Parameters**")
             
@@ -166,54 +464,27 @@ def dbscan_ui():
             # If we know target emitters and haven't tuned yet for this data:
             if known_emitters and "tuned_params" not in st.session_state.dbscan_state:
                 
-                with st.spinner(f"Automatically tuning HDBSCAN for {known_emitters} emitters..."):
-                    best_score = float('inf')
-                    best_mcs = 5
-                    best_ms = 5
-                    
-                    # Search space
-                    search_range = range(2, 40, 1) 
-                    
-                    for mcs in search_range:
-                        ms = mcs 
-                        
-                        # Prepare data
-                        X = df_input[features].values
-                        X_scaled = StandardScaler().fit_transform(X)
-                        
-                        # Run fast fit
-                        if HDBSCAN_LIB == "sklearn":
-                            c = HDBSCAN(min_cluster_size=mcs, min_samples=ms)
-                            l = c.fit_predict(X_scaled)
-                        elif HDBSCAN_LIB == "hdbscan":
-                            c = hdbscan.HDBSCAN(min_cluster_size=mcs, min_samples=ms)
-                            l = c.fit_predict(X_scaled)
-                        else:
-                            l = []
-                            
-                        # Count clusters
-                        if len(l) > 0:
-                            n_clusters = len(set(l)) - (1 if -1 in l else 0)
-                        else:
-                            n_clusters = 0
-                            
-                        err = abs(n_clusters - known_emitters)
-                        
-                        if err < best_score:
-                            best_score = err
-                            best_mcs = mcs
-                            best_ms = ms
-                        
-                        if err == 0:
-                            break
-                    
+                if "tune_job_hdbscan" not in state:
+                    X_scaled = _feature_matrix(state, df_input, features)
+                    _submit_job(
+                        state, "tune_job_hdbscan", "autotune_hdbscan", X_scaled, known_emitters,
+                        label=f"Auto-tuning HDBSCAN for {known_emitters} emitters",
+                        warm_start=_tune_warm_start(state, "HDBSCAN")
+                    )
+
+                done = _poll_job(state, "tune_job_hdbscan")
+                if done and done[0] == DONE:
+                    best, best_score, info = done[1]
                     # Save results
-                    st.session_state.dbscan_state["tuned_params"] = {
-                        "min_cluster_size": best_mcs, 
-                        "min_samples": best_ms
-                    }
-                
-                st.success(f"Auto-Tuned: Size={best_mcs} (Diff: {best_score})")
+                    st.session_state.dbscan_state["tuned_params"] = best
+                    _remember_tune(state, "HDBSCAN", best, len(df_input), known_emitters)
+                    st.toast(
+                        f"Auto-Tuned: Size={best['min_cluster_size']} (Diff: {best_score}) "
+                        f"· {info['mode']}, {info['evaluated']} fits", icon="🎯"
+                    )
+                elif done:
+                    # Cancelled / failed: fall back to defaults, don't resubmit
+                    st.session_state.dbscan_state["tuned_params"] = {}
 
             # Use tuned params (or defaults if no tuning happened)
             tuned = st.session_state.dbscan_state.get("tuned_params", {})
@@ -235,47 +506,25 @@ def dbscan_ui():
             
             # AUTOMATIC TUNING
             if known_emitters and "tuned_params_dbscan" not in st.session_state.dbscan_state:
-                 with st.spinner(f"Automatically tuning DBSCAN for {known_emitters} emitters..."):
-                    best_score = float('inf')
-                    best_eps = 0.5
-                    best_ms = 5
-                    
-                    # Search space for EPS
-                    # 0.1 to 2.0 usually covers scaled data (StandardScaler makes mean=0, std=1)
-                    # We'll scan finely.
-                    eps_range = np.arange(0.1, 3.0, 0.1)
-                    
-                    for eps in eps_range:
-                        ms = 5 # Fix min_samples or tune it too? kept simple for now
-                        
-                        # Prepare data
-                        X = df_input[features].values
-                        X_scaled = StandardScaler().fit_transform(X)
-                        
-                        db = DBSCAN(eps=eps, min_samples=ms)
-                        l = db.fit_predict(X_scaled)
-                        
-                        # Count clusters
-                        if len(l) > 0:
-                            n_clusters = len(set(l)) - (1 if -1 in l else 0)
-                        else:
-                            n_clusters = 0
-                        
-                        err = abs(n_clusters - known_emitters)
-                        
-                        if err < best_score:
-                            best_score = err
-                            best_eps = eps
-                            best_ms = ms
-                            
-                        if err == 0:
-                            break
-                    
-                    st.session_state.dbscan_state["tuned_params_dbscan"] = {
-                        "eps": float(best_eps),
-                        "min_samples": best_ms
-                    }
-                 st.success(f"Auto-Tuned: Eps={best_eps:.2f} (Diff: {best_score})")
+                if "tune_job_dbscan" not in state:
+                    X_scaled = _feature_matrix(state, df_input, features)
+                    _submit_job(
+                        state, "tune_job_dbscan", "autotune_dbscan", X_scaled, known_emitters,
+                        label=f"Auto-tuning DBSCAN for {known_emitters} emitters",
+                        warm_start=_tune_warm_start(state, "DBSCAN")
+                    )
+
+                done = _poll_job(state, "tune_job_dbscan")
+                if done and done[0] == DONE:
+                    best, best_score, info = done[1]
+                    st.session_state.dbscan_state["tuned_params_dbscan"] = best
+                    _remember_tune(state, "DBSCAN", best, len(df_input), known_emitters)
+                    st.toast(
+                        f"Auto-Tuned: Eps={best['eps']:.2f} (Diff: {best_score}) "
+                        f"· {info['mode']}, {info['evaluated']} fits", icon="🎯"
+                    )
+                elif done:
+                    st.session_state.dbscan_state["tuned_params_dbscan"] = {}
 
             # Use tuned
             tuned = st.session_state.dbscan_state.get("tuned_params_dbscan", {})
@@ -285,119 +534,243 @@ def dbscan_ui():
             params["eps"] = eps
             params["min_samples"] = min_samples
 
+        elif algorithm == PIPELINE:
+            st.markdown("**Two-Stage Pipeline** (DOA/PW gating → PRI analysis)")
+            p1, p2 = st.columns(2)
+            params["doa_tol_deg"] = p1.number_input("DOA Gate (deg)", 0.5, 45.0, PIPELINE_DEFAULTS["doa_tol_deg"], 0.5)
+            params["pw_tol_pct"] = p2.number_input("PW Gate (%)", 0.5, 50.0, PIPELINE_DEFAULTS["pw_tol_pct"], 0.5)
+            params["pri_tol_us"] = p1.number_input("PRI Tolerance (µs)", 0.1, 100.0, PIPELINE_DEFAULTS["pri_tol_us"], 0.1)
+            params["min_pulses"] = p2.number_input("Min Pulses per Train", 3, 100, PIPELINE_DEFAULTS["min_pulses"])
+            st.caption(
+                "Uses DOA, PW and TOA only (the feature selection above is ignored), "
+                "so frequency-agile and staggered emitters are recovered whole."
+            )
+
+        elif algorithm == ENSEMBLE:
+            st.markdown("**Ensemble** (members run concurrently, combined by majority co-association)")
+            members = st.multiselect("Members", ensemble_members(), default=ensemble_members())
+            default_k = known_emitters if known_emitters else state.get("auto_k", {}).get("best_k", 3)
+            params["n_clusters"] = st.number_input("K-Means Clusters (k)", 2, 50, int(default_k))
+            # Density members reuse this source's tuned parameters; otherwise
+            # the member job auto-tunes (known emitter count) or uses defaults
+            params["members"] = {
+                "K-Means": {"n_clusters": params["n_clusters"]},
+                "DBSCAN": state.get("tuned_params_dbscan") or None,
+                "HDBSCAN": state.get("tuned_params") or None,
+            }
+            untuned = [a for a in members if a != "K-Means" and params["members"][a] is None]
+            st.caption(
+                f"{get_queue().max_workers} pool worker(s) · "
+                + (f"{', '.join(untuned)}: {'auto-tuned in the job' if known_emitters else 'default parameters'}"
+                   if untuned else "density members use their tuned parameters")
+            )
+            if len(members) < 2:
+                st.warning("Select at least 2 members.")
+
+        prefilter = compare = False
+        if algorithm in ("DBSCAN", "HDBSCAN"):
+            with st.expander("🧹 Density Pre-Filter"):
+                prefilter = st.checkbox("Drop isolated pulses before clustering")
+                if algorithm == "HDBSCAN":
+                    params["cell"] = st.number_input("Grid Cell (scaled units)", 0.005, 2.0, 0.05, 0.005, format="%.3f")
+                    st.caption("Pulses with fewer than Min Samples neighbours within 2 cells become noise (approximate).")
+                else:
+                    st.caption("Cell = eps, 2-cell radius: drops only pulses DBSCAN would label noise.")
+                compare = st.checkbox("Also run unfiltered (reports speedup and assignment change)", disabled=not prefilter)
+
     # -----------------------------
     # RUN DE-INTERLEAVING
     # -----------------------------
-    if st.button(f"Run {algorithm}"):
+    busy = "run_job" in state or "ensemble_pending" in state
+    if st.button(f"Run {algorithm}", disabled=busy or (algorithm == ENSEMBLE and len(members) < 2)):
         
-        # Scaling
-        X = df_input[features].values
-        X_scaled = StandardScaler().fit_transform(X)
-        
-        labels = []
-        
-        if algorithm == "K-Means":
-            kmeans = KMeans(n_clusters=params["n_clusters"], random_state=42, n_init=10)
-            labels = kmeans.fit_predict(X_scaled)
-            
-        elif algorithm == "HDBSCAN":
-            if HDBSCAN_LIB == "sklearn":
-                clusterer = HDBSCAN(
-                    min_cluster_size=params["min_cluster_size"],
-                    min_samples=params["min_samples"]
+        meta = {"algorithm": algorithm, "known_emitters": known_emitters, "submitted": time.time()}
+        label = f"{algorithm} on {len(df_input)} PDWs"
+
+        if algorithm == "K-Means (Mini-Batch)" and state.get("file_path"):
+            # The worker streams the recording itself; nothing is scaled here
+            _submit_job(
+                state, "run_job", "minibatch_kmeans_recording",
+                state["file_path"], features, params["n_clusters"], params["chunk_rows"],
+                label=label, meta=meta
+            )
+        elif algorithm == "K-Means (Mini-Batch)":
+            # In-memory data: the worker scales the raw feature columns chunk
+            # by chunk instead of receiving a full scaled matrix
+            _submit_job(
+                state, "run_job", "minibatch_kmeans",
+                df_input[features], features, params["n_clusters"], params["chunk_rows"],
+                label=label, meta=meta
+            )
+        elif algorithm == ENSEMBLE:
+            # One pool job per member, all on the same cached matrix
+            X_scaled = _feature_matrix(state, df_input, features)
+            for member in members:
+                _submit_job(
+                    state, ENSEMBLE_JOB_KEY.format(member), "ensemble.run_member",
+                    X_scaled, member, params["members"][member], known_emitters,
+                    label=f"{member} (ensemble member) on {len(df_input)} PDWs", meta={**meta, "member": member}
                 )
-                labels = clusterer.fit_predict(X_scaled)
-            elif HDBSCAN_LIB == "hdbscan":
-                clusterer = hdbscan.HDBSCAN(
-                    min_cluster_size=params["min_cluster_size"],
-                    min_samples=params["min_samples"]
+            state["ensemble_pending"] = {"meta": meta, "members": {}}
+        elif algorithm == PIPELINE:
+            _submit_job(
+                state, "run_job", "pipeline.deinterleave",
+                *(df_input[c].to_numpy() for c in PIPELINE_COLUMNS), params,
+                label=label, meta=meta
+            )
+        else:
+            # Cached per (data_version, features); reused across runs
+            X_scaled = _feature_matrix(state, df_input, features)
+            if prefilter:
+                _submit_job(
+                    state, "run_job", "run_prefiltered", X_scaled, algorithm, params, compare,
+                    label=f"{label} (pre-filtered)", meta={**meta, "prefilter": True}
                 )
-                labels = clusterer.fit_predict(X_scaled)
-                
-        elif algorithm == "DBSCAN":
-            db = DBSCAN(eps=params["eps"], min_samples=params["min_samples"])
-            labels = db.fit_predict(X_scaled)
-
-        # Process Labels
-        # Force Noise (-1) to 0 or similar? Usually we keep it as -1 or 0.
-        # Let's map unique labels to 1..N. Noise (-1) goes to 0 ("Unidentified").
-        unique_labels = sorted(set(labels))
-        # Logic: if -1 exists, map it to 0. Others map to 1, 2, 3...
-        label_map = {}
-        counter = 1
-        for l in unique_labels:
-            if l == -1:
-                label_map[l] = 0 # Noise
             else:
-                label_map[l] = counter
-                counter += 1
-                
-        state["results"] = [label_map[l] for l in labels]
-        state["algo_used"] = algorithm
-        state["summary"] = {
-            "total": len(df_input),
-            "num_clusters": len(set(label_map.values())) - (1 if 0 in label_map.values() else 0),
-            "noise_points": list(labels).count(-1),
-            "known_emitters": known_emitters
+                _submit_job(state, "run_job", "run_clustering", X_scaled, algorithm, params, label=label, meta=meta)
+
+    done = _poll_job(state, "run_job")
+    if done and done[0] == DONE:
+        labels, job = done[1], done[2]
+        algorithm = job["algorithm"]
+        prefilter_report = None
+        if job.get("prefilter"):
+            labels, prefilter_report = labels
+        perf.record("clustering (job)", (time.time() - job["submitted"]) * 1e3, algo=algorithm)
+        _store_results(state, labels, algorithm, job["known_emitters"], prefilter=prefilter_report)
+
+    pending = state.get("ensemble_pending")
+    if pending is not None:
+        for member in ensemble_members():
+            done = _poll_job(state, ENSEMBLE_JOB_KEY.format(member))
+            if done and done[0] == DONE:
+                pending["members"][member] = done[1]
+        if not any(ENSEMBLE_JOB_KEY.format(m) in state for m in ensemble_members()):
+            del state["ensemble_pending"]
+            _finish_ensemble(state, pending)
+
+    # A job was submitted or finished, or new results arrived: rerun the
+    # page so the poller is (dis)armed and the results section refreshes.
+    if any(key in state for key in JOB_KEYS) != polling or state.get("results_version", 0) != results_version:
+        st.rerun()
+
+
+def _store_results(state, labels, algorithm, known_emitters, agreement=None, **extra):
+    """Keep a finished run's labels and summary; bumps results_version."""
+    # Noise (-1) -> 0 ("Unidentified"), clusters -> 1..N in order of first
+    # appearance; stored as a compact int16/int32 array
+    with perf.stage("label_normalize"):
+        ids, sizes, noise = normalize_labels(labels, state["df"]["toa_us"].to_numpy())
+
+    state["results"] = ids
+    state["agreement"] = agreement
+    state["algo_used"] = algorithm
+    state["summary"] = {
+        "total": len(ids),
+        "num_clusters": len(sizes),
+        "noise_points": noise,
+        "cluster_sizes": sizes.tolist(),
+        "known_emitters": known_emitters,
+        **extra
+    }
+    state["results_version"] = state.get("results_version", 0) + 1
+    st.toast("De-Interleaving Completed", icon="✅")
+
+
+def _finish_ensemble(state, pending):
+    """Consensus of the finished ensemble members (cancelled/failed ones are left out)."""
+    done = pending["members"]
+    if len(done) < 2:
+        st.error(f"❌ Ensemble needs at least 2 finished members ({len(done)} finished).")
+        return
+    meta = pending["meta"]
+    perf.record("ensemble (jobs)", (time.time() - meta["submitted"]) * 1e3, members=len(done))
+
+    with perf.stage("consensus", rows=len(state["df"]), members=len(done)):
+        labels, agreement, info = consensus([r["labels"] for r in done.values()])
+
+    truth = state["df"]["true_emitter"].to_numpy() if "true_emitter" in state["df"].columns else None
+    members = {}
+    for name, r in done.items():
+        members[name] = {
+            "clusters": count_clusters(r["labels"]),
+            "noise": int((r["labels"] < 0).sum()),
+            "elapsed_s": r["elapsed_s"],
+            "params": r["params"],
+            "ari": score_labels(truth, r["labels"])["ari"] if truth is not None else None,
         }
-        
-        st.success("De-Interleaving Completed")
+    report = {
+        "members": members,
+        "fragments": info["fragments"],
+        "mean_agreement": float(agreement.mean()) if len(agreement) else 1.0,
+        "unanimous": float((agreement == 1.0).mean()) if len(agreement) else 1.0,
+    }
+    _store_results(state, labels, ENSEMBLE, meta["known_emitters"], agreement=agreement, ensemble=report)
 
-    # -----------------------------
-    # DISPLAY RESULTS
-    # -----------------------------
-    if state.get("results") is not None:
-        
-        df_display = df_input.copy()
-        df_display["Emitter_ID"] = state["results"]
-        # Label 0 as "Noise" for clarity? Or just keep ID 0.
-        
-        summ = state.get("summary", {})
-        
-        # Determine success color based on count match
-        detected = summ.get('num_clusters', 0)
-        expected = summ.get('known_emitters')
-        
-        match_msg = ""
-        if expected:
-            if detected == expected:
-                match_msg = "✅ **MATCHES** Simulation Count"
-            else:
-                match_msg = f"⚠️ **MISMATCH** (Expected {expected})"
-
-        st.markdown(
-            f"""
-            ### Results ({state.get('algo_used')})
-            - **Detected Emitters:** {detected} {match_msg}
-            - **Noise Points:** {summ.get('noise_points', 0)}
-            """
-        )
 
-        st.subheader("Emitter-Wise Pulse Consistency")
-        summary_df = (
-            df_display.groupby("Emitter_ID")
-              .agg(
-                  Count=("Emitter_ID", "count"),
-                  Freq_Mean=("freq_MHz", "mean"),
-                  Freq_Std=("freq_MHz", "std"),
-                  PRI_Mean=("pri_us", "mean"),
-                  PRI_Std=("pri_us", "std")
-              )
-              .reset_index()
-              .round(2)
-        )
-        st.dataframe(summary_df)
+# -----------------------------
+# DISPLAY RESULTS
+# -----------------------------
+def _results_products(state):
+    """
+    Everything the results section shows, built once per clustering run
+    (results_version) and kept in state: reruns just redisplay it and
+    the CSV is exported only when the results actually change.
+    """
+    version = state.get("results_version", 0)
+    cache = state.get("results_cache")
+    if cache is not None and cache["version"] == version:
+        return cache, False
+
+    # assign() shares the input columns (copy-on-write) instead of
+    # duplicating a possibly memory-mapped recording
+    df_display = state["df"].assign(Emitter_ID=state["results"])
+    cache = {"version": version, "scores": None, "plot_caption": None, "cluster_params": None,
+             "agreement_hist": None}
+
+    # Ensemble runs: per-pulse share of members agreeing with the consensus
+    agreement = state.get("agreement")
+    if agreement is not None:
+        df_display = df_display.assign(Agreement=agreement)
+        shares = pd.Series(agreement).round(2).value_counts().sort_index()
+        cache["agreement_hist"] = pd.DataFrame({"Pulses": shares.to_numpy()}, index=shares.index.astype(str))
+
+    # Simulator ground truth (present for freshly generated buffers)
+    if "true_emitter" in df_display.columns:
+        cache["scores"] = score_labels(df_display["true_emitter"], df_display["Emitter_ID"])
+
+    if all(c in df_display.columns for c in LIBRARY_COLUMNS):
+        cache["cluster_params"] = cluster_parameters(df_display)
+
+    with perf.stage("groupby"):
+        aggs = {"Count": ("Emitter_ID", "count"), "Freq_Mean": ("freq_MHz", "mean"),
+                "Freq_Std": ("freq_MHz", "std")}
+        if agreement is not None:
+            aggs["Agreement"] = ("Agreement", "mean")
+        summary_df = df_display.groupby("Emitter_ID").agg(**aggs).reset_index()
 
-        st.subheader("Cluster Visualization")
+    # PRI measured from each cluster's TOAs (not the simulator's pri_us)
+    with perf.stage("pri_analysis", clusters=len(summary_df)):
+        pri = pri_structure(df_display["toa_us"].to_numpy(), df_display["Emitter_ID"].to_numpy())
+        cache["summary_df"] = summary_df.merge(
+            pri.drop(columns="Pulses"), on="Emitter_ID", how="left"
+        ).round(2)
+
+    with perf.stage("plotting"):
         fig, ax = plt.subplots()
-        
+        df_plot = df_display
+        if len(df_plot) > MAX_PLOT_POINTS:
+            step = int(np.ceil(len(df_plot) / MAX_PLOT_POINTS))
+            df_plot = df_plot.iloc[::step]
+            cache["plot_caption"] = f"Plot shows 1 in every {step} pulses ({len(df_display)} total)."
+    
         # Plot Noise first (black/grey)
-        noise = df_display[df_display["Emitter_ID"] == 0]
+        noise = df_plot[df_plot["Emitter_ID"] == 0]
         if not noise.empty:
             ax.scatter(noise["toa_us"], noise["freq_MHz"], c="lightgrey", s=10, label="Noise", alpha=0.5)
-            
+        
         # Plot Clusters
-        clusters = df_display[df_display["Emitter_ID"] > 0]
+        clusters = df_plot[df_plot["Emitter_ID"] > 0]
         if not clusters.empty:
             scatter = ax.scatter(
                 clusters["toa_us"], 
@@ -408,15 +781,144 @@ def dbscan_ui():
             )
             # Legend? usually too many points, but colour bar might help
             # plt.colorbar(scatter, ax=ax)
-            
+        
         ax.set_xlabel("TOA (µs)")
         ax.set_ylabel("Frequency (MHz)")
         ax.set_title(f"De-Interleaving Results ({state.get('algo_used')})")
-        st.pyplot(fig)
-        
-        # Save to User Directory
-        out_dir = st.session_state.get("user_output_dir", "outputs")
-        df_display.to_csv(f"{out_dir}/deinterleaved_pdws.csv", index=False)
-        
+        # Same rendering st.pyplot would do, kept as PNG bytes
+        png = io.BytesIO()
+        fig.savefig(png, format="png", dpi=200, bbox_inches="tight")
+        plt.close(fig)
+        cache["plot_png"] = png.getvalue()
+
+    # Save to User Directory
+    out_dir = st.session_state.get("user_output_dir", "outputs")
+    cache["export_path"] = f"{out_dir}/deinterleaved_pdws.csv"
+    with perf.stage("export", rows=len(df_display)):
+        catalog.save_csv(
+            df_display, cache["export_path"], "deinterleaved",
+            {"algorithm": state.get("algo_used"), "features": state.get("features"),
+             "input": state.get("filename")}
+        )
+        # The binary format has no ground-truth or agreement field
+        df_pdw = df_display.drop(columns=["true_emitter", "Agreement"], errors="ignore")
+        if pdw_format.supports(df_pdw.columns):
+            try:
+                catalog.save_pdw(
+                    df_pdw,
+                    f"{out_dir}/deinterleaved_pdws.pdw", "deinterleaved",
+                    {"algorithm": state.get("algo_used"), "input": state.get("filename")}
+                )
+            except ValueError as e:  # NaN / out-of-range field: the CSV has it all
+                cache["pdw_skipped"] = str(e)
+
+    state["results_cache"] = cache
+    return cache, True
+
+
+@st.fragment
+@perf.fragment_panel("deinterleaving:results", "⏱️ Performance · results")
+def _results_section(state):
+
+    cache, fresh = _results_products(state)
+    summ = state.get("summary", {})
+    
+    # Determine success color based on count match
+    detected = summ.get('num_clusters', 0)
+    expected = summ.get('known_emitters')
+    
+    match_msg = ""
+    if expected:
+        if detected == expected:
+            match_msg = "✅ **MATCHES** Simulation Count"
+        else:
+            match_msg = f"⚠️ **MISMATCH** (Expected {expected})"
+
+    st.markdown(
+        f"""
+        ### Results ({state.get('algo_used')})
+        - **Detected Emitters:** {detected} {match_msg}
+        - **Noise Points:** {summ.get('noise_points', 0)}
+        """
+    )
+
+    pf = summ.get("prefilter")
+    if pf:
+        msg = (f"🧹 Pre-filter dropped {pf['dropped']} of {pf['kept'] + pf['dropped']} pulses as noise "
+               f"({pf['filter_s'] * 1e3:.0f} ms filter + {pf['run_s']:.2f} s clustering)")
+        if "speedup" in pf:
+            msg += (f" · {pf['speedup']:.2f}× vs unfiltered ({pf['full_s']:.2f} s), "
+                    f"{pf['changed']} pulses changed assignment (ARI {pf['ari_vs_full']:.3f} vs unfiltered)")
+        st.caption(msg)
+
+    ens = summ.get("ensemble")
+    if ens:
+        st.caption("🤝 Consensus of " + " · ".join(
+            f"{name}: {m['clusters']} clusters, {m['noise']} noise, {m['elapsed_s']:.1f}s"
+            + (f", ARI {m['ari']:.3f}" if m["ari"] is not None else "")
+            for name, m in ens["members"].items()
+        ))
+        st.caption(
+            f"Per-pulse agreement: mean {ens['mean_agreement']:.2f}, "
+            f"{100 * ens['unanimous']:.1f}% unanimous ({ens['fragments']} label fragments)"
+        )
+        st.bar_chart(cache["agreement_hist"], x_label="Share of members agreeing", y_label="Pulses")
+
+    scores = cache["scores"]
+    if scores is not None:
+        m1, m2, m3 = st.columns(3)
+        m1.metric("ARI", f"{scores['ari']:.3f}")
+        m2.metric("NMI", f"{scores['nmi']:.3f}")
+        m3.metric("Purity", f"{scores['purity']:.3f}")
+
+    st.subheader("Emitter-Wise Pulse Consistency")
+    st.dataframe(cache["summary_df"])
+
+    if cache["cluster_params"] is not None and len(cache["cluster_params"]):
+        _library_matching(state, cache["cluster_params"])
+
+    st.subheader("Cluster Visualization")
+    if cache["plot_caption"]:
+        st.caption(cache["plot_caption"])
+    st.image(cache["plot_png"])
+    
+    if fresh:
         st.toast("✅ De-Interleaving Analysis Saved!", icon="💾")
-        st.info(f"Result saved to {out_dir}/deinterleaved_pdws.csv")
+    st.info(f"Result saved to {cache['export_path']}")
+    if cache.get("pdw_skipped"):
+        st.caption(f"No `.pdw` copy: {cache['pdw_skipped']}")
+
+
+def _library_matching(state, cluster_params):
+    """Identify detected clusters against a known-emitter library."""
+    with st.expander("📚 Emitter Library Matching"):
+        source = st.radio("Library", ["Manual Mode emitters", "Upload JSON"], horizontal=True)
+        if source == "Upload JSON":
+            upload = st.file_uploader(
+                "Emitter library (.json: list of emitters or a Manual Mode config)", type="json"
+            )
+            raw = upload.getvalue() if upload else None
+        else:
+            emitters = st.session_state.get("manual_config", {}).get("emitters", [])
+            raw = json.dumps(emitters).encode() if emitters else None
+        if raw is None:
+            st.caption("No library entries yet.")
+            return
+
+        # The KD-tree is built once per distinct library
+        key = hashlib.sha256(raw).hexdigest()
+        cached = state.get("emitter_library")
+        if cached is None or cached[0] != key:
+            try:
+                with perf.stage("library_build"):
+                    cached = (key, load_library(raw))
+            except (ValueError, KeyError, TypeError) as e:
+                st.error(f"❌ Invalid library: {e}")
+                return
+            state["emitter_library"] = cached
+        library = cached[1]
+
+        with perf.stage("library_match", clusters=len(cluster_params), entries=len(library)):
+            table = match_table(library, cluster_params)
+        st.caption(f"{len(library)} library entries · confidence 1.0 = exact match within tolerances")
+        st.dataframe(table, hide_index=True)
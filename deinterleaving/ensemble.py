@@ -0,0 +1,141 @@
+import itertools
+import time
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from deinterleaving.clustering import available_algorithms, run_clustering, autotune_dbscan, autotune_hdbscan, select_k
+
+# -------------------------------------------------
+# ENSEMBLE / CONSENSUS DE-INTERLEAVING
+# -------------------------------------------------
+# K-Means, DBSCAN and HDBSCAN run as separate jobs in the shared pool on the
+# same scaled feature matrix, so the ensemble takes the wall-clock time of
+# the slowest member (given enough workers). Their labelings are combined
+# by evidence accumulation without the dense n x n co-association matrix:
+# 1. Pulses with the same label in every member are one "fragment"; they
+#    co-associate fully. One np.unique pass per member finds them.
+# 2. Two fragments co-associate by majority (> half the members) iff they
+#    share a non-noise label in every member of some quorum-sized subset.
+#    Each subset's label tuples are hyperedges (fragment -> group node),
+#    so the thresholded co-association graph has O(fragments x subsets)
+#    edges instead of O(n^2).
+# 3. Its connected components are the consensus emitters (single link at
+#    0.5). Fragments most members call noise, and components smaller than
+#    `min_size` pulses, are noise.
+# Per-pulse agreement is the share of members whose cluster (mapped to the
+# consensus cluster it overlaps most) agrees with the consensus label.
+
+ENSEMBLE = "Ensemble (consensus)"
+MEMBERS = ("K-Means", "DBSCAN", "HDBSCAN")
+MIN_CONSENSUS_SIZE = 5
+DEFAULT_PARAMS = {
+    "DBSCAN": {"eps": 0.7, "min_samples": 5},
+    "HDBSCAN": {"min_cluster_size": 5, "min_samples": 5},
+}
+
+
+def ensemble_members():
+    """Members available in this install (HDBSCAN is optional)."""
+    return [a for a in MEMBERS if a in available_algorithms()]
+
+
+def run_member(X_scaled, algorithm, params=None, known_emitters=None, progress=None):
+    """
+    One ensemble member as a pool job. Without params, K-Means uses
+    known_emitters clusters (or picks k with select_k when it is unknown),
+    and DBSCAN/HDBSCAN are auto-tuned to known_emitters when it is given,
+    else use DEFAULT_PARAMS. Returns {"labels", "params", "elapsed_s"}.
+    """
+    t0 = time.perf_counter()
+    if params is None:
+        if algorithm == "K-Means":
+            k = known_emitters or select_k(X_scaled, progress=progress)["best_k"]
+            params = {"n_clusters": int(k)}
+        elif known_emitters and algorithm == "DBSCAN":
+            params = autotune_dbscan(X_scaled, known_emitters, progress=progress)[0]
+        elif known_emitters and algorithm == "HDBSCAN":
+            params = autotune_hdbscan(X_scaled, known_emitters, progress=progress)[0]
+        else:
+            params = dict(DEFAULT_PARAMS[algorithm])
+    labels = np.asarray(run_clustering(X_scaled, algorithm, params))
+    return {"labels": labels, "params": params, "elapsed_s": time.perf_counter() - t0}
+
+
+# -------------------------------------------------
+# CONSENSUS
+# -------------------------------------------------
+def _dense_key(columns):
+    """Dense row IDs (0..k-1) of the label tuples formed by `columns`."""
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    for col in columns:
+        _, col = np.unique(col, return_inverse=True)
+        # key < rows before the product, so it never overflows int64
+        _, key = np.unique(key * (int(col.max(initial=0)) + 1) + col.reshape(-1), return_inverse=True)
+        key = key.reshape(-1)
+    return key
+
+
+def _majority_map(src, dst, weights):
+    """For each src value, the dst value it overlaps most (weighted); per element of src."""
+    pair = _dense_key([src, dst])
+    w = np.bincount(pair, weights=weights)
+    p_src = np.empty(len(w), dtype=src.dtype)
+    p_dst = np.empty(len(w), dtype=dst.dtype)
+    p_src[pair], p_dst[pair] = src, dst
+    order = np.lexsort((-w, p_src))
+    s = p_src[order]
+    first = np.concatenate([[True], s[1:] != s[:-1]])
+    best_src, best_dst = s[first], p_dst[order][first]
+    return best_dst[np.searchsorted(best_src, src)]
+
+
+def consensus(label_sets, min_size=MIN_CONSENSUS_SIZE):
+    """
+    Consensus labels (-1 = noise) and per-pulse agreement (0..1) of several
+    raw labelings of the same pulses. Returns (labels, agreement, info).
+    """
+    L = np.column_stack([np.asarray(l, dtype=np.int64).reshape(-1) for l in label_sets])
+    n, m = L.shape
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), {"fragments": 0, "members": m}
+    quorum = m // 2 + 1
+
+    # ----- fragments: identical label tuple across all members -----
+    frag = _dense_key(list(L.T))
+    M = int(frag.max()) + 1
+    rep = np.empty(M, dtype=np.int64)
+    rep[frag] = np.arange(n)
+    F = L[rep]
+    frag_size = np.bincount(frag, minlength=M)
+    noise = (F < 0).sum(axis=1) >= quorum
+
+    # ----- majority co-association graph as fragment -> group hyperedges -----
+    rows, cols, n_groups = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], M
+    for subset in itertools.combinations(range(m), quorum):
+        sub = F[:, subset]
+        ok = np.flatnonzero((sub >= 0).all(axis=1) & ~noise)
+        if len(ok) == 0:
+            continue
+        group = _dense_key(list(sub[ok].T))
+        rows.append(ok)
+        cols.append(n_groups + group)
+        n_groups += int(group.max()) + 1
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n_groups, n_groups))
+    comp = connected_components(graph, directed=False)[1][:M]
+
+    comp_size = np.bincount(comp, weights=frag_size)
+    frag_label = np.where(noise | (comp_size[comp] < min_size), -1, comp)
+
+    # ----- agreement: members whose (mapped) cluster matches the consensus -----
+    agree = np.zeros(M)
+    for k in range(m):
+        mapped = _majority_map(F[:, k], frag_label, frag_size)
+        mapped[F[:, k] < 0] = -1  # member noise only agrees with consensus noise
+        agree += mapped == frag_label
+    agree /= m
+
+    info = {"fragments": M, "members": m, "quorum": quorum}
+    return frag_label[frag], agree[frag].astype(np.float32), info
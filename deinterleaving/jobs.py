@@ -0,0 +1,260 @@
+import collections
+import inspect
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# -------------------------------------------------
+# SERVER-WIDE CLUSTERING JOB QUEUE
+# -------------------------------------------------
+# One bounded process pool per Streamlit server process, shared by every
+# session. Jobs are queued per user and dispatched round-robin across users,
+# so one analyst queueing many HDBSCAN runs can't starve the others, and at
+# most `max_workers` fits run at once regardless of how many sessions are
+# open. Sessions keep only the job ID and poll for status/result.
+#
+# Cancellation is immediate for queued jobs. A job already running in a
+# worker cannot be interrupted safely; it is marked cancelled and its
+# result is discarded when the worker finishes.
+
+MAX_WORKERS = int(os.environ.get("PDW_JOB_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+MAX_QUEUED_PER_USER = int(os.environ.get("PDW_JOB_MAX_QUEUED", 4))
+RESULT_TTL_S = 600
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+# Set in each worker by the pool initializer
+_progress_q = None
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+# -------------------------------------------------
+# WORKER SIDE
+# -------------------------------------------------
+def _init_worker(progress_q):
+    global _progress_q
+    _progress_q = progress_q
+
+
+def report_progress(job_id, fraction):
+    """Called from inside a job; no-op when run outside the pool."""
+    if _progress_q is not None and job_id is not None:
+        try:
+            _progress_q.put_nowait((job_id, float(fraction)))
+        except Exception:
+            pass
+
+
+def _run_job(job_id, fn_name, args, kwargs):
+    import importlib
+    import perf
+    perf.begin_run(f"job:{fn_name}")
+    # "name" -> clustering.name, "module.name" -> deinterleaving.module.name
+    module, _, name = fn_name.rpartition(".")
+    fn = getattr(importlib.import_module(f"deinterleaving.{module or 'clustering'}"), name)
+    kwargs = dict(kwargs)
+    if "progress" in inspect.signature(fn).parameters:
+        kwargs["progress"] = lambda f: report_progress(job_id, f)
+    return fn(*args, **kwargs)
+
+
+# -------------------------------------------------
+# SCHEDULER SIDE
+# -------------------------------------------------
+class Job:
+    __slots__ = ("id", "user", "fn_name", "args", "kwargs", "label", "status",
+                 "progress", "submitted", "started", "finished", "result", "error", "future")
+
+    def __init__(self, job_id, user, fn_name, args, kwargs, label):
+        self.id = job_id
+        self.user = user
+        self.fn_name = fn_name
+        self.args = args
+        self.kwargs = kwargs
+        self.label = label
+        self.status = QUEUED
+        self.progress = 0.0
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.future = None
+
+
+class JobQueue:
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        ctx = mp.get_context("spawn")  # never fork the threaded Streamlit server
+        self.max_workers = max_workers
+        self._progress_q = ctx.Queue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=ctx,
+            initializer=_init_worker, initargs=(self._progress_q,)
+        )
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._jobs = {}
+        self._pending = collections.OrderedDict()  # user -> deque of job ids
+        self._running = 0
+        self._ids = itertools.count(1)
+
+        threading.Thread(target=self._dispatch_loop, name="pdw-job-dispatch", daemon=True).start()
+        threading.Thread(target=self._progress_loop, name="pdw-job-progress", daemon=True).start()
+
+    # ----- public API -----
+    def submit(self, user, fn_name, *args, label=None, **kwargs):
+        """Queue clustering.<fn_name> (or <module>.<fn>) for `user`; returns job ID."""
+        with self._lock:
+            self._expire()
+            waiting = self._pending.get(user)
+            if waiting is not None and len(waiting) >= MAX_QUEUED_PER_USER:
+                raise JobQueueFull(f"{len(waiting)} jobs already queued for this user")
+            job_id = f"job-{next(self._ids)}"
+            self._jobs[job_id] = Job(job_id, user, fn_name, args, kwargs, label or fn_name)
+            self._pending.setdefault(user, collections.deque()).append(job_id)
+            self._wake.notify()
+        return job_id
+
+    def status(self, job_id):
+        """Snapshot dict (status, progress, queue position, timings) or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            position = None
+            if job.status == QUEUED:
+                position = self._queue_position(job)
+            return {
+                "id": job.id, "label": job.label, "status": job.status,
+                "progress": job.progress, "position": position,
+                "wait_s": (job.started or time.time()) - job.submitted,
+                "run_s": ((job.finished or time.time()) - job.started) if job.started else 0.0,
+                "error": job.error,
+            }
+
+    def result(self, job_id, pop=True):
+        """Result of a DONE job (removed from the table when pop=True)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != DONE:
+                return None
+            if pop:
+                del self._jobs[job_id]
+            return job.result
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in (DONE, FAILED, CANCELLED):
+                return False
+            if job.status == QUEUED:
+                self._pending[job.user].remove(job_id)
+            job.status = CANCELLED
+            job.finished = time.time()
+            return True
+
+    def forget(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in (DONE, FAILED, CANCELLED):
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "running": self._running,
+                "queued": sum(len(q) for q in self._pending.values()),
+                "users_waiting": sum(1 for q in self._pending.values() if q),
+            }
+
+    # ----- internals (call with self._lock held) -----
+    def _queue_position(self, job):
+        # Round-robin order: position = rounds ahead of us * active users (approx.)
+        mine = self._pending.get(job.user, ())
+        rank = list(mine).index(job.id) if job.id in mine else 0
+        ahead = sum(min(len(q), rank + 1) for u, q in self._pending.items() if u != job.user)
+        return rank + ahead
+
+    def _next_job(self):
+        # Rotate users: take one job from the first user with work, then
+        # move that user to the back of the order.
+        for user in list(self._pending):
+            waiting = self._pending[user]
+            if not waiting:
+                del self._pending[user]
+                continue
+            job_id = waiting.popleft()
+            self._pending.move_to_end(user)
+            return self._jobs[job_id]
+        return None
+
+    def _expire(self):
+        cutoff = time.time() - RESULT_TTL_S
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def _dispatch_loop(self):
+        while True:
+            with self._lock:
+                job = None
+                while job is None:
+                    if self._running < self.max_workers:
+                        job = self._next_job()
+                    if job is None:
+                        self._wake.wait()
+                job.status = RUNNING
+                job.started = time.time()
+                self._running += 1
+                job.future = self._pool.submit(_run_job, job.id, job.fn_name, job.args, job.kwargs)
+                job.args = job.kwargs = None  # drop the input matrix reference
+            job.future.add_done_callback(lambda fut, job=job: self._on_done(job, fut))
+
+    def _on_done(self, job, fut):
+        with self._lock:
+            self._running -= 1
+            if job.status == RUNNING:
+                job.finished = time.time()
+                try:
+                    job.result = fut.result()
+                    job.status = DONE
+                    job.progress = 1.0
+                except Exception as e:
+                    job.error = f"{type(e).__name__}: {e}"
+                    job.status = FAILED
+            job.future = None
+            self._wake.notify()
+
+    def _progress_loop(self):
+        while True:
+            try:
+                job_id, fraction = self._progress_q.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None and job.status == RUNNING:
+                    job.progress = fraction
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """The process-wide job queue (created on first use)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
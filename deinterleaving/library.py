@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+# -------------------------------------------------
+# KNOWN-EMITTER LIBRARY
+# -------------------------------------------------
+# Entries use the Manual Mode emitter format (freqs, pri_set, pw, doa, plus
+# an optional name). Each entry becomes one point in a normalized parameter
+# space where one unit is one matching tolerance (log scale for frequency,
+# PRI and PW; DOA on a circle), indexed once with a KD-tree. Matching a
+# detected cluster is then a k-nearest query, O(log n) per cluster, so
+# libraries of tens of thousands of entries match instantly. Confidence is
+# a Gaussian of the distance in tolerance units (1.0 = exact match).
+
+TOLERANCES = {"freq_pct": 1.0, "pri_pct": 2.0, "pw_pct": 10.0, "doa_deg": 10.0}
+REQUIRED_COLUMNS = ["freq_MHz", "pri_us", "pw_us", "doa_deg"]
+
+
+def _vectors(freq, pri, pw, doa, tol, use_doa):
+    cols = [
+        np.log(np.maximum(freq, 1e-9)) / np.log1p(tol["freq_pct"] / 100.0),
+        np.log(np.maximum(pri, 1e-9)) / np.log1p(tol["pri_pct"] / 100.0),
+        np.log(np.maximum(pw, 1e-9)) / np.log1p(tol["pw_pct"] / 100.0),
+    ]
+    if use_doa:
+        r = 180.0 / (np.pi * tol["doa_deg"])  # chord ~ arc / tolerance
+        theta = np.deg2rad(doa)
+        cols += [r * np.cos(theta), r * np.sin(theta)]
+    return np.column_stack(cols)
+
+
+class EmitterLibrary:
+
+    def __init__(self, entries, tolerances=None, use_doa=True):
+        self.tolerances = {**TOLERANCES, **(tolerances or {})}
+        self.use_doa = use_doa
+        self.names = [e.get("name") or f"Emitter {i + 1}" for i, e in enumerate(entries)]
+        # Agile / staggered entries are summarized by their mean, which is
+        # what a cluster's mean frequency / PRI converges to
+        self.params = pd.DataFrame({
+            "freq_MHz": [float(np.mean(e["freqs"])) for e in entries],
+            "pri_us": [float(np.mean(e["pri_set"])) for e in entries],
+            "pw_us": [float(e["pw"]) for e in entries],
+            "doa_deg": [float(e.get("doa", 0.0)) for e in entries],
+        })
+        p = self.params
+        self._tree = KDTree(_vectors(p["freq_MHz"], p["pri_us"], p["pw_us"], p["doa_deg"],
+                                     self.tolerances, use_doa)) if entries else None
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, clusters, k=3):
+        """
+        Nearest library entries for each row of `clusters` (columns
+        freq_MHz, pri_us, pw_us, doa_deg). Returns arrays (index, confidence),
+        each of shape (len(clusters), k), best match first.
+        """
+        k = min(k, len(self))
+        if self._tree is None or len(clusters) == 0:
+            return np.empty((len(clusters), 0), dtype=int), np.empty((len(clusters), 0))
+        X = _vectors(clusters["freq_MHz"].to_numpy(), clusters["pri_us"].to_numpy(),
+                     clusters["pw_us"].to_numpy(), clusters["doa_deg"].to_numpy(),
+                     self.tolerances, self.use_doa)
+        dist, idx = self._tree.query(X, k=k)
+        return idx, np.exp(-0.5 * dist ** 2)
+
+
+def load_library(source, **kwargs):
+    """
+    Library from a Manual Mode config dict ({"emitters": [...]}), a list of
+    emitter dicts, or JSON text/bytes holding either.
+    """
+    if isinstance(source, (bytes, str)):
+        source = json.loads(source)
+    entries = source.get("emitters", []) if isinstance(source, dict) else list(source)
+    return EmitterLibrary(entries, **kwargs)
+
+
+def cluster_parameters(df, labels_col="Emitter_ID"):
+    """Per-cluster parametric summary used for matching (noise excluded)."""
+    d = df[df[labels_col] > 0]
+    theta = np.deg2rad(d["doa_deg"])
+    g = pd.DataFrame({
+        labels_col: d[labels_col],
+        "freq_MHz": d["freq_MHz"],
+        "pri_us": d["pri_us"],
+        "pw_us": d["pw_us"],
+        "sin": np.sin(theta),
+        "cos": np.cos(theta),
+    }).groupby(labels_col)
+    out = g[["freq_MHz", "pri_us"]].mean()
+    out["pw_us"] = g["pw_us"].median()
+    m = g[["sin", "cos"]].mean()
+    out["doa_deg"] = np.rad2deg(np.arctan2(m["sin"], m["cos"])) % 360.0
+    return out.reset_index()
+
+
+def match_table(library, clusters, k=3):
+    """Display table: best match, confidence and runner-up candidates per cluster."""
+    idx, conf = library.match(clusters, k)
+    names = np.asarray(library.names, dtype=object)
+    table = clusters[["Emitter_ID"]].copy()
+    table["Library Match"] = names[idx[:, 0]] if idx.shape[1] else None
+    table["Confidence"] = conf[:, 0].round(3) if conf.shape[1] else np.nan
+    table["Alternatives"] = [
+        ", ".join(f"{names[j]} ({c:.2f})" for j, c in zip(row_i[1:], row_c[1:]))
+        for row_i, row_c in zip(idx, conf)
+    ]
+    return table
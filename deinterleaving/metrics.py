@@ -0,0 +1,31 @@
+import numpy as np
+
+from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+# -------------------------------------------------
+# ACCURACY AGAINST SIMULATOR GROUND TRUTH
+# -------------------------------------------------
+# `true_emitter` is written by the simulation generators; predicted labels
+# may contain noise (-1 raw / 0 remapped) which is scored as its own group.
+
+def purity(true_labels, pred_labels):
+    """Fraction of pulses whose cluster's majority true emitter matches theirs."""
+    true_labels = np.asarray(true_labels)
+    pred_labels = np.asarray(pred_labels)
+    if len(true_labels) == 0:
+        return 0.0
+
+    _, t = np.unique(true_labels, return_inverse=True)
+    _, p = np.unique(pred_labels, return_inverse=True)
+    # Contingency table via one bincount over (pred, true) pairs
+    table = np.bincount(p * (t.max() + 1) + t, minlength=(p.max() + 1) * (t.max() + 1))
+    table = table.reshape(p.max() + 1, t.max() + 1)
+    return float(table.max(axis=1).sum() / len(true_labels))
+
+
+def score_labels(true_labels, pred_labels):
+    return {
+        "ari": float(adjusted_rand_score(true_labels, pred_labels)),
+        "nmi": float(normalized_mutual_info_score(true_labels, pred_labels)),
+        "purity": purity(true_labels, pred_labels),
+    }
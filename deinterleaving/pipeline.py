@@ -0,0 +1,235 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+import perf
+from deinterleaving.backends import job_cores
+
+# -------------------------------------------------
+# TWO-STAGE DE-INTERLEAVING PIPELINE
+# -------------------------------------------------
+# 1. Parametric gating: pulses are grouped by DOA and PW, the parameters
+#    that frequency agility and PRI stagger leave untouched. Tolerance-sized
+#    grid cells are linked to occupied neighbours (linear time, unlike a
+#    radius search); DOA is placed on a circle so 359° and 1° are adjacent.
+# 2. PRI analysis inside each gate, gates in parallel: TOA differences up
+#    to MAX_LAG pulses apart give candidate PRIs; for each candidate
+#    (shortest first, so harmonics never win) every pulse is linked to the
+#    pulse one PRI later and chains of at least `min_pulses` become pulse
+#    trains. A stagger emitter yields one train per phase at its frame
+#    period.
+# 3. Merge: trains with the same period and matching DOA/PW (stagger
+#    phases, a train broken by a gap, an emitter split across gates) become
+#    one emitter.
+# Frequency is never clustered, so agile emitters come out whole.
+
+PIPELINE = "Pipeline"
+DEFAULTS = {"doa_tol_deg": 5.0, "pw_tol_pct": 5.0, "pri_tol_us": 2.0, "min_pulses": 5}
+REQUIRED_COLUMNS = ["toa_us", "doa_deg", "pw_us"]
+MAX_LAG = 16
+
+
+# -------------------------------------------------
+# STAGE 1: DOA / PW GATING
+# -------------------------------------------------
+def _gate_coords(doa, pw, doa_tol_deg, pw_tol_pct):
+    """Coordinates in which one unit is one tolerance."""
+    theta = np.deg2rad(doa)
+    r = 180.0 / (np.pi * doa_tol_deg)  # chord ~ arc / tolerance
+    log_pw = np.log(np.maximum(pw, 1e-9)) / np.log1p(pw_tol_pct / 100.0)
+    return np.column_stack([r * np.cos(theta), r * np.sin(theta), log_pw])
+
+
+def gate_pulses(doa, pw, doa_tol_deg=DEFAULTS["doa_tol_deg"], pw_tol_pct=DEFAULTS["pw_tol_pct"]):
+    """Gate index per pulse: connected groups of occupied tolerance cells."""
+    if len(doa) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    cells = np.floor(_gate_coords(doa, pw, doa_tol_deg, pw_tol_pct)).astype(np.int64)
+    cells -= cells.min(axis=0)
+    span = cells.max(axis=0) + 3
+    keys = (cells[:, 0] * span[1] + cells[:, 1]) * span[2] + cells[:, 2]
+    uniq, cell_of = np.unique(keys, return_inverse=True)
+    cell_of = cell_of.reshape(-1)
+
+    # Link each occupied cell to occupied cells among its 26 neighbours
+    offsets = np.array(np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1])).reshape(3, -1).T
+    rows, cols = [], []
+    for d in offsets:
+        nb = uniq + (d[0] * span[1] + d[1]) * span[2] + d[2]
+        j = np.minimum(np.searchsorted(uniq, nb), len(uniq) - 1)
+        hit = np.flatnonzero(uniq[j] == nb)
+        rows.append(hit)
+        cols.append(j[hit])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(len(uniq), len(uniq)))
+    _, cell_gate = connected_components(graph, directed=False)
+    return cell_gate[cell_of]
+
+
+# -------------------------------------------------
+# STAGE 2: PRI ANALYSIS (per gate)
+# -------------------------------------------------
+def pri_candidates(toa, tol, min_count, max_lag=MAX_LAG):
+    """Candidate PRIs (ascending) from a difference histogram of sorted TOAs."""
+    n = len(toa)
+    if n < 2:
+        return np.empty(0)
+    diffs = np.concatenate([toa[lag:] - toa[:-lag] for lag in range(1, min(max_lag, n - 1) + 1)])
+    diffs = diffs[diffs > tol]
+    if len(diffs) == 0:
+        return np.empty(0)
+
+    bins = np.floor(diffs / tol).astype(np.int64)
+    counts = np.bincount(bins)
+    # A PRI may straddle two bins, so peaks are judged on adjacent pairs.
+    # Chance coincidences spread evenly, so a peak must also clearly exceed
+    # the mean bin count.
+    pair = counts[:-1] + counts[1:]
+    threshold = max(min_count, 4.0 * len(diffs) / len(counts))
+    peak = np.flatnonzero((pair >= threshold) & (counts[:-1] >= counts[1:]))
+    peak = peak[(peak == 0) | (counts[peak] >= counts[np.maximum(peak - 1, 0)])]
+
+    # Refine each peak to the median difference it covers
+    order = np.sort(diffs)
+    lo = np.searchsorted(order, peak * tol)
+    hi = np.searchsorted(order, (peak + 2) * tol)
+    return np.array([np.median(order[a:b]) for a, b in zip(lo, hi) if b > a])
+
+
+def extract_trains(toa, pri, tol):
+    """
+    Link every pulse to the pulse one `pri` later (within `tol`).
+    Returns (head, length): the first pulse of each pulse's chain and the
+    length of that chain, both per pulse.
+    """
+    n = len(toa)
+    target = toa + pri
+    j = np.minimum(np.searchsorted(toa, target - tol), n - 1)
+    src = np.flatnonzero(np.abs(toa[j] - target) <= tol)
+
+    # At most one predecessor per pulse, so chains are disjoint paths
+    _, first = np.unique(j[src], return_index=True)
+    src = src[first]
+    pred = np.arange(n)
+    pred[j[src]] = src
+
+    # Pointer jumping: every pulse finds its chain head in log(length) steps
+    head = pred
+    while True:
+        nxt = head[head]
+        if np.array_equal(nxt, head):
+            break
+        head = nxt
+    return head, np.bincount(head, minlength=n)[head]
+
+
+def _analyse_gate(idx, toa, pri_tol_us, min_pulses):
+    """Pulse trains in one gate: list of (original pulse indices, period)."""
+    order = np.argsort(toa[idx], kind="stable")
+    idx, t = idx[order], toa[idx][order]
+
+    trains = []
+    for pri in pri_candidates(t, pri_tol_us, min_pulses - 1):
+        if len(t) < min_pulses:
+            break
+        head, length = extract_trains(t, pri, pri_tol_us)
+        keep = length >= min_pulses
+        if not keep.any():
+            continue
+        kept = np.flatnonzero(keep)
+        kept = kept[np.argsort(head[kept], kind="stable")]
+        for part in np.split(kept, np.flatnonzero(np.diff(head[kept])) + 1):
+            trains.append((idx[part], float(pri)))
+        idx, t = idx[~keep], t[~keep]
+    return trains
+
+
+# -------------------------------------------------
+# STAGE 3: MERGE TRAINS SHARING A PRI PATTERN
+# -------------------------------------------------
+def merge_trains(trains, doa, pw, params):
+    """Emitter index per train (union of same-period, same-DOA/PW trains)."""
+    if not trains:
+        return np.empty(0, dtype=np.int64)
+
+    period = np.array([p for _, p in trains])
+    theta = [np.deg2rad(doa[ix]) for ix, _ in trains]
+    doa_mean = np.rad2deg(np.array([np.arctan2(np.sin(a).mean(), np.cos(a).mean()) for a in theta]))
+    log_pw = np.log(np.maximum([np.median(pw[ix]) for ix, _ in trains], 1e-9))
+
+    doa_tol = 2 * params["doa_tol_deg"]
+    pw_tol = 2 * np.log1p(params["pw_tol_pct"] / 100.0)
+
+    order = np.argsort(period)
+    p_sorted = period[order]
+    hi = np.searchsorted(p_sorted, p_sorted + params["pri_tol_us"], side="right")
+    rows, cols = [], []
+    for a in range(len(order)):
+        cand = order[a + 1:hi[a]]
+        if len(cand) == 0:
+            continue
+        i = order[a]
+        d_doa = np.abs((doa_mean[cand] - doa_mean[i] + 180.0) % 360.0 - 180.0)
+        ok = cand[(d_doa <= doa_tol) & (np.abs(log_pw[cand] - log_pw[i]) <= pw_tol)]
+        rows.extend([i] * len(ok))
+        cols.extend(ok)
+
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(len(trains), len(trains)))
+    return connected_components(graph, directed=False)[1]
+
+
+# -------------------------------------------------
+# FULL PIPELINE
+# -------------------------------------------------
+def deinterleave(toa, doa, pw, params=None, n_jobs=4, progress=None):
+    """
+    Two-stage de-interleaving. Returns raw labels (-1 = noise), one per
+    pulse, in input order.
+    """
+    params = {**DEFAULTS, **(params or {})}
+    toa = np.asarray(toa, dtype=np.float64)
+    doa = np.asarray(doa, dtype=np.float64)
+    pw = np.asarray(pw, dtype=np.float64)
+    labels = np.full(len(toa), -1, dtype=np.int64)
+    if len(toa) == 0:
+        return labels
+
+    with perf.stage("pipeline_gating", rows=len(toa)):
+        gate = gate_pulses(doa, pw, params["doa_tol_deg"], params["pw_tol_pct"])
+        order = np.argsort(gate, kind="stable")
+        bounds = np.flatnonzero(np.diff(gate[order])) + 1
+        gates = [g for g in np.split(order, bounds) if len(g) >= params["min_pulses"]]
+        gates.sort(key=len, reverse=True)  # largest first keeps the pool busy
+
+    done = [0]
+    def analyse(idx):
+        trains = _analyse_gate(idx, toa, params["pri_tol_us"], params["min_pulses"])
+        done[0] += 1
+        if progress:
+            progress(0.9 * done[0] / len(gates))
+        return trains
+
+    trains = []
+    with perf.stage("pipeline_pri", gates=len(gates)):
+        # Capped like select_k, so a pipeline job doesn't oversubscribe the pool's cores
+        with ThreadPoolExecutor(max_workers=max(1, min(n_jobs, job_cores()))) as pool:
+            for found in pool.map(analyse, gates):
+                trains.extend(found)
+
+    with perf.stage("pipeline_merge", trains=len(trains)):
+        emitter = merge_trains(trains, doa, pw, params)
+        for (ix, _), e in zip(trains, emitter):
+            labels[ix] = e
+
+    if progress:
+        progress(1.0)
+    return labels
+
+
+def deinterleave_frame(df, params=None, progress=None):
+    """deinterleave() on a PDW DataFrame."""
+    return deinterleave(df["toa_us"].to_numpy(), df["doa_deg"].to_numpy(), df["pw_us"].to_numpy(),
+                        params, progress=progress)
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------
+# MEASURED PRI STRUCTURE PER CLUSTER
+# -------------------------------------------------
+# PRI is measured from the TOAs, not taken from the simulator's `pri_us`
+# column. All clusters are analysed in one pass, with no per-cluster
+# Python loop:
+# 1. Pulses are sorted by (cluster, TOA). np.diff over the whole array,
+#    masked at cluster boundaries, gives every cluster's inter-pulse
+#    differences.
+# 2. Differences are binned at `tol_us`. One np.unique over
+#    (cluster, bin) keys is every cluster's difference histogram. Local
+#    maxima holding at least `min_share` of a cluster's differences are
+#    its PRI levels.
+# 3. A level that is an integer multiple of a smaller level, or the sum of
+#    two smaller ones, and is rarer than they are, comes from missing
+#    pulses. The remaining levels are the PRI structure:
+#    one level = constant, several = stagger, none dominant = jitter.
+#    Gaps beyond the longest level are counted as missing pulses.
+
+PRI_TOL_US = 2.0
+MIN_SHARE = 0.05     # share of a cluster's differences a level must hold
+MIN_COVERAGE = 0.5   # below this share in found levels the PRI is jittered
+MIN_DIFFS = 3
+MAX_LEVELS = 8
+MAX_MULTIPLE = 8
+
+COLUMNS = ["Emitter_ID", "Pulses", "PRI_Type", "PRI_Measured", "PRI_Jitter_Pct",
+           "Stagger_Levels", "Frame_PRI", "PRI_Pattern", "Missing_Pulses"]
+
+
+def cluster_differences(toa, labels):
+    """
+    Inter-pulse differences of every cluster (labels > 0) in one pass.
+    Returns (ids, pulses, seg, diffs); seg[i] indexes ids for diffs[i].
+    """
+    toa = np.asarray(toa, dtype=np.float64)
+    labels = np.asarray(labels)
+    keep = labels > 0
+    toa, labels = toa[keep], labels[keep]
+
+    order = np.lexsort((toa, labels))
+    lab, t = labels[order], toa[order]
+    ids, pulses = np.unique(lab, return_counts=True)
+    seg_of = np.searchsorted(ids, lab)
+
+    same = seg_of[1:] == seg_of[:-1]
+    diffs = np.diff(t)[same]
+    seg = seg_of[1:][same]
+    positive = diffs > 0  # coincident TOAs carry no PRI information
+    return ids, pulses, seg[positive], diffs[positive]
+
+
+def _segment_median(seg, values, n_segments):
+    order = np.lexsort((values, seg))
+    v = values[order]
+    counts = np.bincount(seg, minlength=n_segments)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    out = np.full(n_segments, np.nan)
+    has = counts > 0
+    lo = starts[has] + (counts[has] - 1) // 2
+    hi = starts[has] + counts[has] // 2
+    out[has] = 0.5 * (v[lo] + v[hi])
+    return out
+
+
+def _lookup(sorted_keys, keys):
+    """Index of each key in sorted_keys, -1 where absent."""
+    if len(sorted_keys) == 0:
+        return np.full(len(keys), -1)
+    j = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[j] == keys, j, -1)
+
+
+def pri_structure(toa, labels, tol_us=PRI_TOL_US, min_share=MIN_SHARE):
+    """
+    Measured PRI structure of every cluster in `labels` (> 0; noise and
+    unclustered pulses are ignored), one row per cluster (see COLUMNS).
+    """
+    ids, pulses, seg, d = cluster_differences(toa, labels)
+    C = len(ids)
+    if C == 0:
+        return pd.DataFrame(columns=COLUMNS)
+    n_diffs = np.bincount(seg, minlength=C)
+
+    # ----- difference histograms: one (cluster, bin) key per difference -----
+    q = np.rint(d / tol_us).astype(np.int64)
+    B = int(q.max()) + 2 if len(q) else 2  # bin B-1 is never used: no cross-cluster neighbours
+    key = seg * B + q
+    hk, hc = np.unique(key, return_counts=True)
+    jl, jr = _lookup(hk, hk - 1), _lookup(hk, hk + 1)
+    left = np.where(jl >= 0, hc[jl], 0)
+    right = np.where(jr >= 0, hc[jr], 0)
+    hseg = hk // B
+    floor = np.maximum(2, min_share * n_diffs[hseg])
+    # Local maxima (plateaus resolved to their upper bin), counting the
+    # neighbour bins a level straddles
+    peak_keys = hk[(hc >= left) & (hc > right) & (hc + left + right >= floor)]
+
+    # ----- level values: mean of the differences within one bin of a peak -----
+    pidx = np.full(len(d), -1)
+    for off in (0, -1, 1):
+        free = pidx < 0
+        pidx[free] = _lookup(peak_keys, key[free] + off)
+    hit = pidx >= 0
+    n_peaks = len(peak_keys)
+    p_count = np.bincount(pidx[hit], minlength=n_peaks).astype(np.float64)
+    p_sum = np.bincount(pidx[hit], weights=d[hit], minlength=n_peaks)
+    p_sq = np.bincount(pidx[hit], weights=d[hit] ** 2, minlength=n_peaks)
+    p_level = p_sum / np.maximum(p_count, 1)
+    p_var = np.maximum(p_sq / np.maximum(p_count, 1) - p_level ** 2, 0.0)
+    p_seg = peak_keys // B
+
+    # ----- per-cluster level matrix (strongest MAX_LEVELS, ascending) -----
+    strongest = np.lexsort((-p_count, p_seg))
+    rank = np.arange(n_peaks) - np.searchsorted(p_seg[strongest], p_seg[strongest])
+    sel = strongest[rank < MAX_LEVELS]
+    sel = sel[np.lexsort((p_level[sel], p_seg[sel]))]
+    col = np.arange(len(sel)) - np.searchsorted(p_seg[sel], p_seg[sel])
+    K = int(col.max()) + 1 if len(sel) else 1
+    L = np.full((C, K), np.nan)
+    N = np.zeros((C, K))
+    V = np.zeros((C, K))
+    L[p_seg[sel], col] = p_level[sel]
+    N[p_seg[sel], col] = p_count[sel]
+    V[p_seg[sel], col] = p_var[sel]
+    valid = ~np.isnan(L)
+
+    # ----- missing-pulse levels: multiples / pair sums of smaller, commoner levels -----
+    Li, Lj = L[:, :, None], L[:, None, :]
+    below = np.tril(np.ones((K, K), dtype=bool), -1)[None]  # j < i
+    with np.errstate(invalid="ignore", divide="ignore"):
+        m = np.rint(Li / Lj)
+        multiple = below & (m >= 2) & (m <= MAX_MULTIPLE) & (np.abs(Li - m * Lj) <= tol_us * m) \
+            & (N[:, :, None] < N[:, None, :])
+        pair = Lj[:, :, :, None] + L[:, None, None, :]  # L_j + L_k
+        rarer = (N[:, :, None, None] < N[:, None, :, None]) & (N[:, :, None, None] < N[:, None, None, :])
+        summed = below[..., None] & below[:, :, None, :] & (np.abs(Li[..., None] - pair) <= 2 * tol_us) & rarer
+    is_multiple = multiple.any(axis=2)
+    is_sum = summed.any(axis=(2, 3))
+    base = valid & ~(is_multiple | is_sum)
+    n_base = base.sum(axis=1)
+    coverage = N.sum(axis=1) / np.maximum(n_diffs, 1)
+    base_L = np.where(base, L, 0.0)
+    frame = base_L.sum(axis=1)
+    base_n = np.where(base, N, 0.0)
+    jitter_in_levels = np.sqrt((V * base_n).sum(axis=1) / np.maximum(base_n.sum(axis=1), 1))
+
+    # ----- overall statistics (for jittered / sparse clusters) -----
+    median = _segment_median(seg, d, C)
+    d_mean = np.bincount(seg, weights=d, minlength=C) / np.maximum(n_diffs, 1)
+    d_var = np.bincount(seg, weights=d ** 2, minlength=C) / np.maximum(n_diffs, 1) - d_mean ** 2
+    d_std = np.sqrt(np.maximum(d_var, 0.0))
+
+    kind = np.select(
+        [n_diffs < MIN_DIFFS, (n_base == 0) | (coverage < MIN_COVERAGE), n_base == 1],
+        ["Insufficient", "Jitter", "Constant"],
+        "Stagger",
+    )
+    structured = (kind == "Constant") | (kind == "Stagger")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pri = np.where(structured, frame / np.maximum(n_base, 1), median)
+        jitter_pct = 100.0 * np.where(structured, jitter_in_levels, d_std) / pri
+
+    # Missing pulses: every gap longer than the longest level, outside the
+    # levels themselves, spans round(gap / PRI) intervals
+    peak_base = np.zeros(n_peaks, dtype=bool)
+    peak_base[sel] = base[p_seg[sel], col]
+    in_base = hit & peak_base[np.maximum(pidx, 0)]
+    longest = np.where(base, L, 0.0).max(axis=1)
+    gap = ~in_base & structured[seg] & (d > longest[seg] + 2 * tol_us)
+    missing = np.bincount(seg[gap], weights=np.maximum(np.rint(d[gap] / pri[seg[gap]]) - 1, 0), minlength=C)
+
+    stagger = kind == "Stagger"
+    pattern = np.full(C, "", dtype=object)
+    # Display strings only; the analysis above is loop-free
+    pattern[stagger] = ["/".join(f"{v:.1f}" for v in row[b]) for row, b in zip(L[stagger], base[stagger])]
+
+    return pd.DataFrame({
+        "Emitter_ID": ids,
+        "Pulses": pulses,
+        "PRI_Type": kind,
+        "PRI_Measured": pri,
+        "PRI_Jitter_Pct": jitter_pct,
+        "Stagger_Levels": np.where(structured, n_base, 0),
+        "Frame_PRI": np.where(stagger, frame, np.nan),
+        "PRI_Pattern": pattern,
+        "Missing_Pulses": np.rint(missing).astype(np.int64),
+    })
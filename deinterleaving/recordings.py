@@ -0,0 +1,193 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import pdw_format
+
+# -------------------------------------------------
+# RECORDED PDW FILES (columnar, memory-mapped)
+# -------------------------------------------------
+# A recording (CSV) is converted once, chunk by chunk, into one raw float64
+# file per numeric column under `<dir>/.cache/<name>/`. Later opens only
+# memory-map those files, so the de-interleaver touches just the pages of
+# the columns it actually uses instead of parsing the whole CSV into RAM.
+# The cache is rebuilt automatically if the source file changes.
+#
+# Fixed-point `.pdw` recordings are memory-mapped directly. Each column is
+# decoded to float64 the first time it is used, chunk by chunk, into the
+# same kind of per-column cache file, and memory-mapped from there; the
+# integer emitter column is a view of the records themselves. So a `.pdw`
+# frame is as lazy as a CSV one and never becomes a DataFrame in RAM.
+# Compacted `.pdwz` archives (storage.py) decompress one column at a time,
+# only when it is first used.
+
+CHUNK_ROWS = 200_000
+CACHE_VERSION = 1
+RECORDING_EXTENSIONS = (".csv", pdw_format.EXTENSION, pdw_format.ARCHIVE_EXTENSION)
+
+
+def cache_dir_for(csv_path):
+    folder, name = os.path.split(csv_path)
+    return os.path.join(folder, ".cache", name)
+
+
+def _source_sig(csv_path):
+    st = os.stat(csv_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _load_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_column_cache(csv_path, chunk_rows=CHUNK_ROWS):
+    """Convert a CSV recording into per-column binary files; returns metadata."""
+    cache_dir = cache_dir_for(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    columns, handles, rows = None, {}, 0
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+            if columns is None:
+                columns = [c for c in chunk.columns if pd.api.types.is_numeric_dtype(chunk[c])]
+                handles = {c: open(os.path.join(cache_dir, f"{c}.f64"), "wb") for c in columns}
+            for c in columns:
+                col = pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                handles[c].write(col.tobytes())
+            rows += len(chunk)
+    finally:
+        for fh in handles.values():
+            fh.close()
+
+    meta = {
+        "version": CACHE_VERSION,
+        "source": os.path.basename(csv_path),
+        "columns": columns or [],
+        "rows": rows,
+        **_source_sig(csv_path),
+    }
+    # meta.json is written last, so a crash mid-conversion leaves no valid cache
+    with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+class Recording:
+    """Read-only, memory-mapped view of a converted recording."""
+
+    def __init__(self, csv_path, meta):
+        self.path = csv_path
+        self.cache_dir = cache_dir_for(csv_path)
+        self.columns = meta["columns"]
+        self.rows = meta["rows"]
+        self._maps = {}
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        if name not in self._maps:
+            if self.rows == 0:
+                self._maps[name] = np.empty(0)
+            else:
+                self._maps[name] = np.memmap(
+                    os.path.join(self.cache_dir, f"{name}.f64"), dtype=np.float64, mode="r", shape=(self.rows,)
+                )
+        return self._maps[name]
+
+    def matrix(self, features):
+        """Feature matrix (n x d) copied from only the selected columns."""
+        return np.column_stack([self.column(f) for f in features])
+
+    def frame(self, columns=None):
+        """DataFrame whose columns are zero-copy views of the memory maps."""
+        cols = self.columns if columns is None else [c for c in columns if c in self.columns]
+        return pd.DataFrame({c: self.column(c) for c in cols}, copy=False)
+
+
+class PDWRecording(Recording):
+    """Read-only view of a fixed-point `.pdw` recording (columns decode on first use)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.cache_dir = cache_dir_for(path)
+        self._sig = {"version": CACHE_VERSION, **_source_sig(path)}
+        self._records = pdw_format.open_records(path)
+        self.emitter_name = pdw_format.read_header(path)
+        self.columns = list(pdw_format.FIELDS) + ([self.emitter_name] if self.emitter_name else [])
+        self.rows = len(self._records)
+        self._maps = {}
+
+    def column(self, name):
+        if name not in self._maps:
+            if name == self.emitter_name:
+                self._maps[name] = self._records["emitter"]
+            elif self.rows == 0:
+                self._maps[name] = np.empty(0)
+            else:
+                self._maps[name] = self._decoded(name)
+        return self._maps[name]
+
+    def _decoded(self, name):
+        path = os.path.join(self.cache_dir, f"{name}.f64")
+        meta = _load_meta(self.cache_dir)
+        if meta != self._sig:
+            # The file changed since the cache was written: start it afresh
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(os.path.join(self.cache_dir, "meta.json"), "w") as f:
+                json.dump(self._sig, f)
+        if not os.path.exists(path) or os.path.getsize(path) != self.rows * 8:
+            field, scale = pdw_format.FIELDS[name]
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as fh:
+                for start in range(0, self.rows, CHUNK_ROWS):
+                    fh.write((self._records[field][start:start + CHUNK_ROWS] / scale).tobytes())
+            os.replace(tmp, path)
+        return np.memmap(path, dtype=np.float64, mode="r", shape=(self.rows,))
+
+
+class ArchiveRecording(Recording):
+    """Read-only view of a compressed `.pdwz` archive (columns decompress on first use)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.cache_dir = None
+        self._npz, self._meta = pdw_format.open_archive(path)
+        self.columns = self._meta["columns"]
+        self.rows = self._meta["rows"]
+        self._maps = {}
+
+    def column(self, name):
+        if name not in self._maps:
+            self._maps[name] = pdw_format.archive_column(self._npz, self._meta, name)
+        return self._maps[name]
+
+
+def open_recording(csv_path):
+    """Open a recording, converting it on first use (or if it changed)."""
+    if csv_path.endswith(pdw_format.EXTENSION):
+        return PDWRecording(csv_path)
+    if csv_path.endswith(pdw_format.ARCHIVE_EXTENSION):
+        return ArchiveRecording(csv_path)
+    meta = _load_meta(cache_dir_for(csv_path))
+    if meta is None or meta.get("version") != CACHE_VERSION or \
+            {k: meta.get(k) for k in ("size", "mtime_ns")} != _source_sig(csv_path):
+        meta = build_column_cache(csv_path)
+    return Recording(csv_path, meta)
+
+
+def list_recordings(folder):
+    """CSV, `.pdw` and `.pdwz` recordings in a user's folder (newest first)."""
+    if not os.path.isdir(folder):
+        return []
+    files = [f for f in os.listdir(folder)
+             if f.endswith(RECORDING_EXTENSIONS) and not f.startswith(".")]
+    return sorted(files, key=lambda f: os.path.getmtime(os.path.join(folder, f)), reverse=True)
@@ -0,0 +1,108 @@
+"""
+Stand-in receiver: sends PDWs to the ingest server as binary packets.
+
+Source is a recording (.csv or .pdw) or the Auto Mode simulator. Packets go
+to the stream of the user given with --user (what their De-Interleaving page
+shows), or to a raw --stream ID. Run from the repo root:
+    python -m ingest.sender --user <username> --csv outputs/<user>/pdw_interleaved.csv
+    python -m ingest.sender --user <username> --simulate 10 --windows 5 --rate 200000
+    python -m ingest.sender --user <username> --simulate 10 --udp
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import pdw_format
+from ingest.server import INGEST_HOST, INGEST_PORT, UDP_MAX_RECORDS, encode_packet, stream_id
+
+
+def send(df, host=INGEST_HOST, port=INGEST_PORT, batch=4096, udp=False, rate=0.0, stream=0):
+    """
+    Send df (in row order) on `stream` as packets of `batch` PDWs; `rate`
+    caps pulses per second (0 = as fast as possible). Returns (pulses, seconds).
+    """
+    if udp:
+        batch = min(batch, UDP_MAX_RECORDS)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.connect((host, port))
+    else:
+        sock = socket.create_connection((host, port))
+
+    t0 = time.perf_counter()
+    sent = 0
+    try:
+        for start in range(0, len(df), batch):
+            packet = encode_packet(df.iloc[start:start + batch], stream)
+            if udp:
+                sock.send(packet)
+            else:
+                sock.sendall(packet)
+            sent = min(start + batch, len(df))
+            if rate > 0:
+                ahead = sent / rate - (time.perf_counter() - t0)
+                if ahead > 0:
+                    time.sleep(ahead)
+    finally:
+        sock.close()
+    return sent, time.perf_counter() - t0
+
+
+def simulated_frame(num_emitters, windows, pulses_per_emitter=200, seed=None):
+    """Auto Mode windows (default parameter ranges) in TOA order."""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    from simulation.auto_mode import simulate_window, WINDOW_US
+
+    if seed is not None:
+        np.random.seed(seed)
+    frames = [
+        simulate_window(
+            w * WINDOW_US, num_emitters, pulses_per_emitter,
+            60, 25, 15,
+            8000.0, 12000.0, 2000.0, 6000.0,
+            1.0, 50.0, -80.0, -30.0, 0.0, 360.0
+        )
+        for w in range(windows)
+    ]
+    return pd.concat(frames, ignore_index=True).sort_values("toa_us").reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--csv", help="recording to send (.csv or .pdw)")
+    src.add_argument("--simulate", type=int, metavar="EMITTERS", help="simulate Auto Mode windows")
+    parser.add_argument("--windows", type=int, default=1)
+    parser.add_argument("--pulses", type=int, default=200, help="pulses per emitter per window")
+    dest = parser.add_mutually_exclusive_group()
+    dest.add_argument("--user", help="send to this user's stream")
+    dest.add_argument("--stream", type=int, default=0, help="raw stream ID")
+    parser.add_argument("--host", default=INGEST_HOST)
+    parser.add_argument("--port", type=int, default=INGEST_PORT)
+    parser.add_argument("--udp", action="store_true")
+    parser.add_argument("--batch", type=int, default=4096, help="PDWs per packet")
+    parser.add_argument("--rate", type=float, default=0.0, help="max pulses/s (0 = unthrottled)")
+    args = parser.parse_args(argv)
+
+    if args.csv and args.csv.endswith(pdw_format.EXTENSION):
+        df = pdw_format.read_frame(args.csv)
+    elif args.csv:
+        df = pd.read_csv(args.csv)
+    else:
+        df = simulated_frame(args.simulate, args.windows, args.pulses)
+
+    stream = stream_id(args.user) if args.user else args.stream
+    sent, secs = send(df, args.host, args.port, args.batch, args.udp, args.rate, stream)
+    print(f"Sent {sent} PDWs in {secs:.3f}s ({sent / secs if secs else 0:.0f} pulses/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
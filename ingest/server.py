@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import pdw_format
+from simulation.pdw_buffer import PDWBuffer
+
+# -------------------------------------------------
+# LIVE PDW INGEST SERVER
+# -------------------------------------------------
+# Receivers (or a stand-in sender, see ingest/sender.py) push batched binary
+# PDW packets over TCP (a stream of packets) or UDP (one packet per
+# datagram). Each packet is a 12-byte header (magic, stream ID, record
+# count) followed by `count` fixed-point pdw_format.PDW_RECORD records (30
+# bytes each). Payloads are decoded with np.frombuffer (a view on the
+# received bytes, no parsing); every FLUSH_S the staged packets of each
+# stream are concatenated and scaled into contiguous float columns in one
+# pass and appended to that stream's PDWBuffer. Appends may spill to disk,
+# so flushing runs in an executor thread, never on the event loop.
+#
+# One asyncio loop runs in a daemon thread of the Streamlit server process
+# (like the job queue), but data is not shared: each user's receiver sends
+# on its own stream ID (stream_id(username)), and the de-interleaving page
+# reads and clears only the logged-in user's stream as its "Ingest (Live)"
+# source. Stopping the server or clearing every stream is for admins. The
+# stream ID routes packets; it is not a credential, so the listener binds
+# to loopback by default.
+
+INGEST_HOST = os.environ.get("PDW_INGEST_HOST", "127.0.0.1")
+INGEST_PORT = int(os.environ.get("PDW_INGEST_PORT", 9500))
+FLUSH_S = 0.25
+MAX_RECORDS = 65_536  # per packet
+MAX_STREAMS = int(os.environ.get("PDW_INGEST_MAX_STREAMS", 64))
+
+MAGIC = b"PDWS"
+HEADER = struct.Struct("<4sII")  # magic, stream ID, record count
+PDW_DTYPE = pdw_format.PDW_RECORD
+UDP_MAX_RECORDS = (65_507 - HEADER.size) // PDW_DTYPE.itemsize
+
+
+# -------------------------------------------------
+# PACKETS
+# -------------------------------------------------
+def stream_id(username):
+    """Stream ID a user's receiver sends on (stable, derived from the username)."""
+    return int.from_bytes(hashlib.sha256(username.encode()).digest()[:4], "little")
+
+
+def encode_packet(df, stream=0):
+    """PDW DataFrame -> one packet on `stream` (missing columns are sent as 0)."""
+    rec = pdw_format.encode(df)
+    return HEADER.pack(MAGIC, stream, len(rec)) + rec.tobytes()
+
+
+def decode_header(header):
+    """(stream ID, record count) from a packet header; raises ValueError if malformed."""
+    magic, stream, count = HEADER.unpack(header)
+    if magic != MAGIC or count > MAX_RECORDS:
+        raise ValueError("bad PDW packet header")
+    return stream, count
+
+
+def decode_records(payload):
+    """Zero-copy view of a packet payload as PDW_DTYPE records."""
+    return np.frombuffer(payload, dtype=PDW_DTYPE)
+
+
+# -------------------------------------------------
+# SERVER
+# -------------------------------------------------
+class _UDPProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        try:
+            stream, count = decode_header(data[:HEADER.size])
+            if len(data) != HEADER.size + count * PDW_DTYPE.itemsize:
+                raise ValueError("truncated datagram")
+        except (ValueError, struct.error):
+            self.server._count_error()
+            return
+        self.server._stage(stream, memoryview(data)[HEADER.size:], len(data))
+
+
+class IngestServer:
+
+    def __init__(self, out_dir="outputs", flush_s=FLUSH_S):
+        self.out_dir = out_dir
+        self.buffers = {}  # stream ID -> PDWBuffer
+        self.flush_s = flush_s
+        self._lock = threading.Lock()  # staging and stats (taken on the event loop)
+        self._buffer_lock = threading.Lock()  # buffers (appends may spill to disk)
+        self._staged = []  # (stream ID, records)
+        self._stream_pulses = {}
+        self._loop = None
+        self._thread = None
+        self._servers = []
+        self._flusher = None
+        self.ports = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {"packets": 0, "pulses": 0, "bytes": 0, "errors": 0,
+                       "connections": 0, "started": None}
+
+    # ----- lifecycle -----
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, host=INGEST_HOST, tcp_port=INGEST_PORT, udp_port=INGEST_PORT):
+        """Start listening (TCP, plus UDP unless udp_port is 0); returns bound ports."""
+        if self.running:
+            return self.ports
+        self._loop = asyncio.new_event_loop()
+        try:
+            ports = self._loop.run_until_complete(self._listen(host, tcp_port, udp_port))
+        except OSError:
+            self._loop.run_until_complete(self._shutdown())
+            self._loop.close()
+            self._loop = None
+            raise
+        self._thread = threading.Thread(target=self._loop.run_forever, name="pdw-ingest", daemon=True)
+        self._thread.start()
+        self._stats["started"] = time.time()
+        return ports
+
+    async def _listen(self, host, tcp_port, udp_port):
+        tcp = await asyncio.start_server(self._handle_tcp, host, tcp_port)
+        self._servers = [tcp]
+        self.ports = {"host": host, "tcp": tcp.sockets[0].getsockname()[1], "udp": None}
+        if udp_port:
+            transport, _ = await self._loop.create_datagram_endpoint(
+                lambda: _UDPProtocol(self), local_addr=(host, udp_port)
+            )
+            self._servers.append(transport)
+            self.ports["udp"] = transport.get_extra_info("sockname")[1]
+        self._flusher = self._loop.create_task(self._flush_loop())
+        return self.ports
+
+    def stop(self):
+        if not self.running:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+        self._thread = self._loop = None
+        self.flush()
+
+    async def _shutdown(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+        for srv in self._servers:
+            srv.close()
+        self._servers = []
+
+    # ----- receiving -----
+    async def _handle_tcp(self, reader, writer):
+        with self._lock:
+            self._stats["connections"] += 1
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                try:
+                    stream, count = decode_header(header)
+                except ValueError:
+                    # Lost framing: nothing after this point can be trusted
+                    self._count_error()
+                    break
+                payload = await reader.readexactly(count * PDW_DTYPE.itemsize)
+                self._stage(stream, payload, HEADER.size + len(payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _stage(self, stream, payload, nbytes):
+        records = decode_records(payload)
+        with self._lock:
+            if stream not in self._stream_pulses and len(self._stream_pulses) >= MAX_STREAMS:
+                self._stats["errors"] += 1
+                return
+            self._staged.append((stream, records))
+            self._stream_pulses[stream] = self._stream_pulses.get(stream, 0) + len(records)
+            self._stats["packets"] += 1
+            self._stats["pulses"] += len(records)
+            self._stats["bytes"] += nbytes
+
+    def _count_error(self):
+        with self._lock:
+            self._stats["errors"] += 1
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_s)
+            await self._loop.run_in_executor(None, self.flush)
+
+    def flush(self):
+        """Move staged packets into their streams' PDW buffers (one columnar copy each)."""
+        with self._lock:
+            staged, self._staged = self._staged, []
+        if not staged:
+            return
+        by_stream = {}
+        for stream, records in staged:
+            by_stream.setdefault(stream, []).append(records)
+        with self._buffer_lock:
+            for stream, parts in by_stream.items():
+                records = parts[0] if len(parts) == 1 else np.concatenate(parts)
+                if stream not in self.buffers:
+                    self.buffers[stream] = PDWBuffer(os.path.join(self.out_dir, ".ingest", f"{stream:08x}"))
+                self.buffers[stream].append(pdw_format.decode(records))
+
+    # ----- readers -----
+    def snapshot(self, stream):
+        """Everything received on `stream` so far as one DataFrame (arrival order)."""
+        self.flush()
+        with self._buffer_lock:
+            buf = self.buffers.get(stream)
+            df = pd.DataFrame(buf.column_arrays(), copy=False) if buf else pd.DataFrame()
+        if "true_emitter" in df.columns and not df["true_emitter"].any():
+            df = df.drop(columns="true_emitter")  # sender had no ground truth
+        return df
+
+    def clear(self, stream=None):
+        """Drop what `stream` received (every stream if None)."""
+        with self._lock:
+            if stream is None:
+                self._staged = []
+                self._stream_pulses = {}
+                started = self._stats["started"]
+                self._reset_stats()
+                self._stats["started"] = started if self.running else None
+            else:
+                self._staged = [s for s in self._staged if s[0] != stream]
+                self._stream_pulses.pop(stream, None)
+        with self._buffer_lock:
+            for sid in (list(self.buffers) if stream is None else [stream]):
+                buf = self.buffers.pop(sid, None)
+                if buf is not None:
+                    buf.clear()
+
+    def stats(self, stream=None):
+        """Server-wide counters, plus `stream`'s own if given."""
+        with self._lock:
+            s = dict(self._stats)
+            s["stream_pulses"] = dict(self._stream_pulses)
+        with self._buffer_lock:
+            s["stream_buffered"] = {sid: len(buf) for sid, buf in self.buffers.items()}
+        s["buffered"] = sum(s["stream_buffered"].values())
+        if stream is not None:
+            s["my_pulses"] = s["stream_pulses"].get(stream, 0)
+            s["my_buffered"] = s["stream_buffered"].get(stream, 0)
+        s["running"] = self.running
+        s["ports"] = self.ports if self.running else None
+        elapsed = time.time() - s["started"] if s["started"] else 0.0
+        s["pulses_per_s"] = s["pulses"] / elapsed if elapsed > 0 else 0.0
+        return s
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_server(out_dir="outputs"):
+    """The process-wide ingest server (created, not started, on first use)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = IngestServer(out_dir)
+        return _server
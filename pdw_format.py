@@ -0,0 +1,224 @@
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------
+# FIXED-POINT BINARY PDW FORMAT
+# -------------------------------------------------
+# One packed 30-byte record per pulse instead of float64 columns (56+ bytes)
+# or a CSV row (~70 bytes, rounded to 2 decimals). TOA is an int64 count of
+# nanoseconds, so it stays exact over any session length; the other fields
+# are scaled integers at a resolution well below receiver accuracy. Used by
+# the spill files of PDWBuffer, the ingest wire protocol, and `.pdw`
+# recordings/exports, which are read back with np.memmap (no parsing).
+#
+# DOA is stored signed and unwrapped: wrapping -0.5 deg to 359.5 deg would
+# split an emitter near 0 deg into two clusters in feature space. NaN or
+# values outside a field's range raise instead of being saturated.
+# Version 1 files (unsigned 16-bit DOA, 28 bytes) are still readable.
+#
+# File layout: 32-byte header (magic, version, emitter-field name) followed
+# by the records.
+
+PDW_RECORD = np.dtype([
+    ("toa_ns", "<i8"),      # TOA, ns
+    ("freq_khz", "<u4"),    # frequency, kHz
+    ("pri_ns", "<u4"),      # PRI, ns
+    ("pw_ns", "<u4"),       # pulse width, ns
+    ("doa_cdeg", "<i4"),    # DOA, 0.01 deg (not wrapped)
+    ("amp_cdb", "<i2"),     # amplitude, 0.01 dB
+    ("emitter", "<i4"),     # emitter ID (0 = unknown)
+])
+PDW_RECORD_V1 = np.dtype([
+    ("toa_ns", "<i8"), ("freq_khz", "<u4"), ("pri_ns", "<u4"), ("pw_ns", "<u4"),
+    ("doa_cdeg", "<u2"), ("amp_cdb", "<i2"), ("emitter", "<i4"),
+])
+
+# column -> (record field, scale from column units to field units)
+FIELDS = {
+    "toa_us": ("toa_ns", 1e3),
+    "freq_MHz": ("freq_khz", 1e3),
+    "pri_us": ("pri_ns", 1e3),
+    "pw_us": ("pw_ns", 1e3),
+    "doa_deg": ("doa_cdeg", 1e2),
+    "amp_dB": ("amp_cdb", 1e2),
+}
+EMITTER_COLUMNS = ("true_emitter", "Emitter_ID")
+
+MAGIC = b"PDWF"
+VERSION = 2
+RECORD_DTYPES = {1: PDW_RECORD_V1, 2: PDW_RECORD}
+FILE_HEADER = struct.Struct("<4sH26s")  # magic, version, emitter column name
+EXTENSION = ".pdw"
+
+
+def supports(columns):
+    """True if a frame with these columns round-trips through PDW_RECORD."""
+    columns = set(columns)
+    extra = columns - set(FIELDS) - set(EMITTER_COLUMNS)
+    return not extra and sum(c in columns for c in EMITTER_COLUMNS) <= 1
+
+
+def emitter_column(columns):
+    return next((c for c in EMITTER_COLUMNS if c in columns), None)
+
+
+# -------------------------------------------------
+# ENCODE / DECODE
+# -------------------------------------------------
+def to_fixed(col, values):
+    """Column values -> scaled integers of its record field; ValueError if NaN or out of range."""
+    field, scale = FIELDS[col]
+    fixed = np.rint(np.asarray(values, dtype=np.float64) * scale)
+    if not np.isfinite(fixed).all():
+        raise ValueError(f"{col}: {int((~np.isfinite(fixed)).sum())} NaN/inf values")
+    info = np.iinfo(PDW_RECORD[field])
+    outside = (fixed < info.min) | (fixed > info.max)
+    if outside.any():
+        raise ValueError(f"{col}: {int(outside.sum())} values outside "
+                         f"[{info.min / scale:g}, {info.max / scale:g}]")
+    return fixed.astype(PDW_RECORD[field])
+
+
+def encode(df):
+    """PDW DataFrame -> PDW_RECORD array (missing columns become 0)."""
+    rec = np.zeros(len(df), dtype=PDW_RECORD)
+    for col in FIELDS:
+        if col in df.columns:
+            rec[FIELDS[col][0]] = to_fixed(col, df[col].to_numpy(dtype=np.float64))
+    emitter = emitter_column(df.columns)
+    if emitter:
+        rec["emitter"] = df[emitter].to_numpy()
+    return rec
+
+
+def decode(rec, columns=None, emitter_name="true_emitter"):
+    """PDW_RECORD array -> DataFrame in the usual float column units."""
+    out = {}
+    for col in (list(FIELDS) if columns is None else columns):
+        if col in FIELDS:
+            field, scale = FIELDS[col]
+            out[col] = rec[field] / scale
+    if emitter_name and (columns is None or emitter_name in columns):
+        out[emitter_name] = np.array(rec["emitter"])
+    return pd.DataFrame(out, copy=False)
+
+
+# -------------------------------------------------
+# FILES
+# -------------------------------------------------
+def file_header(emitter_name="true_emitter"):
+    return FILE_HEADER.pack(MAGIC, VERSION, (emitter_name or "").encode())
+
+
+def to_bytes(df):
+    """Complete `.pdw` file contents for df."""
+    return file_header(emitter_column(df.columns)) + encode(df).tobytes()
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        magic, version, name = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != MAGIC or version not in RECORD_DTYPES:
+        raise ValueError(f"{path} is not a PDW file (versions {sorted(RECORD_DTYPES)})")
+    return version, name.rstrip(b"\0").decode() or None
+
+
+def read_header(path):
+    """Emitter column name stored in a `.pdw` file header."""
+    return _read_header(path)[1]
+
+
+def open_records(path):
+    """Memory-mapped record view of a `.pdw` file (nothing is read yet)."""
+    dtype = RECORD_DTYPES[_read_header(path)[0]]
+    rows = (os.path.getsize(path) - FILE_HEADER.size) // dtype.itemsize
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=FILE_HEADER.size, shape=(rows,))
+
+
+def read_frame(path, columns=None):
+    emitter_name = read_header(path)
+    return decode(open_records(path), columns, emitter_name)
+
+
+# -------------------------------------------------
+# COMPRESSED COLUMNAR ARCHIVES
+# -------------------------------------------------
+# Idle datasets are compacted (storage.py) into `.pdwz` archives: a NumPy
+# .npz container (zip, deflate) with one array per column. PDW fields are
+# stored fixed-point at PDW_RECORD resolution and TOA as int64 deltas, so a
+# sorted session compresses well below its `.pdw` size. Archives are
+# lossless: a PDW column that fixed point would not reproduce exactly
+# (finer resolution, NaN, out of range) is kept as floats. Other numeric
+# columns are stored as they are. Columns are written one at a time and
+# decompress independently on first access.
+
+ARCHIVE_EXTENSION = ".pdwz"
+ARCHIVE_VERSION = 1
+
+
+def _archive_array(col, values):
+    """(array, scale, delta) as stored for one column."""
+    values = np.asarray(values)
+    if col not in FIELDS:
+        return values, None, False
+    try:
+        fixed = to_fixed(col, values)
+    except ValueError:
+        return values, None, False  # NaN or out of range: kept as floats
+    scale = FIELDS[col][1]
+    if not np.array_equal(fixed / scale, values):
+        return values, None, False  # finer than the field's resolution: kept as floats
+    if col == "toa_us":
+        return np.diff(fixed, prepend=0), scale, True  # first delta = first TOA
+    return fixed, scale, False
+
+
+def write_archive(df, path):
+    """Write the numeric columns of df (or any name -> array mapping) as a `.pdwz` archive."""
+    columns = list(df.columns) if hasattr(df, "columns") else list(df)
+    meta = {"version": ARCHIVE_VERSION, "columns": columns, "rows": 0, "scale": {}, "delta": []}
+    # Hidden while written, so a listing never shows a partial archive
+    folder, name = os.path.split(path)
+    tmp = os.path.join(folder, f".{name}.{os.getpid()}.tmp")
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for i, col in enumerate(columns):
+            values = np.asarray(df[col])
+            if not (np.issubdtype(values.dtype, np.number) or values.dtype == bool):
+                raise ValueError(f"column {col!r} is not numeric")
+            arr, scale, delta = _archive_array(col, values)
+            meta["rows"] = len(arr)
+            if scale is not None:
+                meta["scale"][col] = scale
+            if delta:
+                meta["delta"].append(col)
+            with zf.open(f"c{i}.npy", "w", force_zip64=True) as fh:
+                np.lib.format.write_array(fh, arr)
+        with zf.open("meta.npy", "w") as fh:
+            np.lib.format.write_array(fh, np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8))
+    os.replace(tmp, path)
+
+
+def open_archive(path):
+    """(lazy NpzFile, metadata) of a `.pdwz` archive; nothing is decompressed yet."""
+    npz = np.load(path)
+    meta = json.loads(npz["meta"].tobytes())
+    if meta.get("version") != ARCHIVE_VERSION:
+        raise ValueError(f"{path} is not a version {ARCHIVE_VERSION} PDW archive")
+    return npz, meta
+
+
+def archive_column(npz, meta, col):
+    """One archived column in its usual units (decompressed now)."""
+    arr = npz[f"c{meta['columns'].index(col)}"]
+    if col in meta["delta"]:
+        arr = np.cumsum(arr)
+    if col in meta["scale"]:
+        arr = arr / meta["scale"][col]
+    return arr
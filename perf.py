@@ -0,0 +1,165 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# -------------------------------------------------
+# CONFIG
+# -------------------------------------------------
+# tracemalloc slows allocation-heavy code noticeably, so peak-Python-heap
+# tracking is opt-in. RSS sampling is always on (cheap /proc read).
+TRACE_MALLOC = os.environ.get("PDW_PERF_TRACEMALLOC", "0") == "1"
+
+logger = logging.getLogger("pdw.perf")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Each Streamlit session runs its script in its own thread, so the
+# per-run record list lives in thread-local storage.
+# tracemalloc has one peak counter, which every stage resets on entry. The
+# `peaks` stack keeps each open stage's peak so far, so a nested stage
+# neither hides its parent's earlier peak nor loses its own on exit.
+_local = threading.local()
+
+
+# -------------------------------------------------
+# MEMORY SAMPLING
+# -------------------------------------------------
+def rss_mb():
+    """Current resident set size of this process in MB (0.0 if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            # ru_maxrss is KB on Linux, bytes on macOS; peak not current.
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+        except ImportError:
+            return 0.0
+
+
+# -------------------------------------------------
+# RUN / STAGE TIMERS
+# -------------------------------------------------
+def begin_run(page):
+    """Start a fresh record list for one rerun of a page."""
+    _local.page = page
+    _local.records = []
+    _local.depth = 0
+    _local.peaks = []
+
+
+def records():
+    return list(getattr(_local, "records", []))
+
+
+@contextmanager
+def stage(name, **extra):
+    """
+    Time a block and sample memory around it.
+    Usage: with perf.stage("clustering", algo="DBSCAN"): ...
+    """
+    if not hasattr(_local, "records"):
+        begin_run("unknown")
+
+    started_trace = False
+    if TRACE_MALLOC:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_trace = True
+        peaks = _local.peaks
+        if peaks:
+            peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+        peaks.append(0)
+        tracemalloc.reset_peak()
+
+    # Reserve the slot up front so nested stages list after their parent
+    depth = _local.depth
+    rec = {"page": _local.page, "stage": name, "depth": depth}
+    _local.records.append(rec)
+
+    rss_before = rss_mb()
+    _local.depth += 1
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - t0) * 1e3
+        _local.depth -= 1
+        rss_after = rss_mb()
+
+        rec.update({
+            "ms": round(elapsed_ms, 3),
+            "rss_mb": round(rss_after, 1),
+            "rss_delta_mb": round(rss_after - rss_before, 1),
+        })
+        if TRACE_MALLOC:
+            peaks = _local.peaks
+            peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            rec["py_peak_mb"] = round(peak / 1e6, 2)
+            if started_trace:
+                tracemalloc.stop()
+        rec.update(extra)
+
+        logger.info(json.dumps({"event": "perf_stage", "ts": time.time(), **rec}, default=str))
+
+
+def record(name, ms, **extra):
+    """Add a stage measured elsewhere (e.g. a background job's wall time)."""
+    if not hasattr(_local, "records"):
+        begin_run("unknown")
+    rec = {"page": _local.page, "stage": name, "depth": _local.depth,
+           "ms": round(ms, 3), "rss_mb": round(rss_mb(), 1), "rss_delta_mb": 0.0, **extra}
+    _local.records.append(rec)
+    logger.info(json.dumps({"event": "perf_stage", "ts": time.time(), **rec}, default=str))
+
+
+# -------------------------------------------------
+# UI PANEL
+# -------------------------------------------------
+def perf_panel(title="⏱️ Performance"):
+    """Collapsible 'Performance' panel listing the stages of this rerun."""
+    import streamlit as st
+    import pandas as pd
+
+    recs = records()
+    with st.expander(title, expanded=False):
+        if not recs:
+            st.caption("No instrumented stages ran on this rerun.")
+            return
+        df = pd.DataFrame(recs)
+        df["stage"] = ["  " * d + s for d, s in zip(df["depth"], df["stage"])]
+        total = df.loc[df["depth"] == 0, "ms"].sum()
+        st.caption(f"Instrumented time: {total:.1f} ms · RSS: {recs[-1]['rss_mb']:.0f} MB")
+        st.dataframe(df.drop(columns=["page", "depth"]), hide_index=True)
+
+
+def fragment_panel(page, title):
+    """
+    Decorator for a st.fragment body: starts its own record list and ends
+    with its own panel, so a fragment-only rerun refreshes the stages it
+    ran instead of leaving a page-level panel stale.
+    """
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            begin_run(page)
+            result = fn(*args, **kwargs)
+            if records():
+                perf_panel(title)
+            return result
+        return inner
+    return wrap
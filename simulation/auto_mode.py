@@ -3,27 +3,39 @@ import numpy as np
 import pandas as pd
 import os
 
+import catalog
+import perf
+from simulation.pdw_buffer import PDWBuffer
+
 OUTPUT_DIR = "outputs"
+WINDOW_US = 2e6  # 2 seconds in µs
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 np.random.seed(42)
 
 # =================================================
-# SESSION STATE FOR CONTINUOUS TIME
+# AUTO MODE UI
 # =================================================
-if "global_time_us" not in st.session_state:
-    st.session_state.global_time_us = 0.0
+def auto_mode_ui():
 
-if "pdw_buffer" not in st.session_state:
-    st.session_state.pdw_buffer = []
+    perf.begin_run("auto_mode")
 
-if "auto_running" not in st.session_state:
-    st.session_state.auto_running = False
+    # =================================================
+    # SESSION STATE FOR CONTINUOUS TIME (Must be inside function:
+    # the module is imported once per process, lazily, on first visit)
+    # =================================================
+    if "global_time_us" not in st.session_state:
+        st.session_state.global_time_us = 0.0
 
-# =================================================
-# AUTO MODE UI
-# =================================================
-def auto_mode_ui():
+    # Ground-truth IDs run on across windows, whatever each window's count
+    if "next_emitter_id" not in st.session_state:
+        st.session_state.next_emitter_id = 1
+
+    if "pdw_buffer" not in st.session_state:
+        st.session_state.pdw_buffer = PDWBuffer(st.session_state.get("user_output_dir", OUTPUT_DIR))
+
+    if "auto_running" not in st.session_state:
+        st.session_state.auto_running = False
 
     st.header("Auto Mode – PDW Simulation (Continuous Time)")
     st.info("PDWs are generated in 2-second continuous time blocks")
@@ -116,7 +128,8 @@ def auto_mode_ui():
         if st.button("⏹ Reset"):
             st.session_state.auto_running = False
             st.session_state.global_time_us = 0.0
-            st.session_state.pdw_buffer = []
+            st.session_state.next_emitter_id = 1
+            st.session_state.pdw_buffer.clear()
             st.success("Auto mode reset")
 
     # =================================================
@@ -124,39 +137,59 @@ def auto_mode_ui():
     # =================================================
     if st.session_state.auto_running:
 
-        df_new = generate_pdws_2s(
-            num_emitters,
-            pulses_per_emitter,
-            fixed_pct,
-            agile_pct,
-            stagger_pct,
-            f_min, f_max,
-            pri_min, pri_max,
-            pw_min, pw_max,
-            amp_min, amp_max,
-            doa_min, doa_max
-        )
+        with perf.stage("generate"):
+            df_new = generate_pdws_2s(
+                num_emitters,
+                pulses_per_emitter,
+                fixed_pct,
+                agile_pct,
+                stagger_pct,
+                f_min, f_max,
+                pri_min, pri_max,
+                pw_min, pw_max,
+                amp_min, amp_max,
+                doa_min, doa_max
+            )
 
         # Use User Isolation (Default to 'outputs' if not set)
         out_dir = st.session_state.get("user_output_dir", "outputs")
         
         # Save to buffer
-        st.session_state.pdw_buffer.extend(df_new.to_dict("records"))
-        
-        # Save to CSV
-        df_all = pd.DataFrame(st.session_state.pdw_buffer)
-        df_all = df_all.sort_values("toa_us").reset_index(drop=True)
-        df_all = df_all.round(2)
-        
-        df_all.to_csv(f"{out_dir}/pdw_interleaved.csv", index=False)
+        buf = st.session_state.pdw_buffer
+        with perf.stage("buffer_append"):
+            buf.append(df_new)
+
+        # Windows do not overlap in TOA, so sorting the new window keeps the
+        # recording in TOA order: only it is written (appended), and the
+        # history is never read back. The first window of a run starts the files.
+        with perf.stage("sort"):
+            df_win = df_new.sort_values("toa_us").reset_index(drop=True)
+        with perf.stage("round"):
+            df_win = df_win.round(2)
+
+        first = len(buf) == len(df_win)
+        save_csv = catalog.save_csv if first else catalog.append_csv
+        save_pdw = catalog.save_pdw if first else catalog.append_pdw
+        with perf.stage("csv_write", rows=len(df_win)):
+            save_csv(df_win, f"{out_dir}/pdw_interleaved.csv", "auto", cfg)
+        with perf.stage("pdw_write", rows=len(df_win)):
+            save_pdw(df_win, f"{out_dir}/pdw_interleaved.pdw", "auto", cfg)
 
         st.session_state.auto_running = False  # IMPORTANT: step-wise control
         st.session_state.last_active_mode = "Auto" # Track for De-Interleaving
 
-        st.toast(f"✅ Generated 2s PDW Data! (Total: {len(df_all)})", icon="📡")
+        st.toast(f"✅ Generated 2s PDW Data! (Total: {len(buf)})", icon="📡")
         st.success("Generated next 2 seconds of PDWs")
-        st.write("Total PDWs so far:", len(df_all))
-        st.dataframe(df_all.tail(20))
+        st.write("Total PDWs so far:", len(buf))
+        st.dataframe(df_win.tail(20))
+
+        bs = buf.stats()
+        st.caption(
+            f"Buffer: {bs['resident_mb']:.1f} MB resident / {bs['budget_mb']:.0f} MB budget, "
+            f"{bs['spilled_segments']} of {bs['segments']} windows spilled to disk ({bs['spilled_mb']:.1f} MB)"
+        )
+
+    perf.perf_panel()
 
 
 # =================================================
@@ -169,11 +202,43 @@ def generate_pdws_2s(num_emitters, pulses_per_emitter,
                      amp_min, amp_max,
                      doa_min, doa_max):
 
+    window_start = st.session_state.global_time_us
+    st.session_state.global_time_us = window_start + WINDOW_US
+    first_id = st.session_state.get("next_emitter_id", 1)
+    st.session_state.next_emitter_id = first_id + num_emitters
+
+    return simulate_window(
+        window_start, num_emitters, pulses_per_emitter,
+        fixed_pct, agile_pct, stagger_pct,
+        f_min, f_max, pri_min, pri_max,
+        pw_min, pw_max,
+        amp_min, amp_max,
+        doa_min, doa_max,
+        first_id=first_id
+    )
+
+
+def simulate_window(window_start, num_emitters, pulses_per_emitter,
+                    fixed_pct, agile_pct, stagger_pct,
+                    f_min, f_max, pri_min, pri_max,
+                    pw_min, pw_max,
+                    amp_min, amp_max,
+                    doa_min, doa_max,
+                    first_id=None):
+    """
+    Pure generator for one window (no session state), also used by the
+    benchmark suite. Emitter parameters are redrawn every window, so each
+    window's emitters get their own ground-truth IDs in `true_emitter`:
+    first_id, first_id + 1, ... The caller keeps the running offset when
+    the emitter count may change between windows; without it, IDs assume
+    a constant count (window_idx * num_emitters + 1, ...).
+    """
+
     rows = []
 
-    window_start = st.session_state.global_time_us
-    window_end = window_start + 2e6  # 2 seconds in µs
-    st.session_state.global_time_us = window_end
+    window_end = window_start + WINDOW_US
+    if first_id is None:
+        first_id = int(window_start // WINDOW_US) * num_emitters + 1
 
     n_fixed = int(num_emitters * fixed_pct / 100)
     n_agile = int(num_emitters * agile_pct / 100)
@@ -186,7 +251,9 @@ def generate_pdws_2s(num_emitters, pulses_per_emitter,
     )
     np.random.shuffle(emitter_types)
 
-    for etype in emitter_types:
+    for e_idx, etype in enumerate(emitter_types):
+
+        true_id = first_id + e_idx
 
         freq = np.random.uniform(f_min, f_max)
         pri = np.random.uniform(pri_min, pri_max)
@@ -215,7 +282,8 @@ def generate_pdws_2s(num_emitters, pulses_per_emitter,
                 "pw_us": pw,
                 "doa_deg": doa + np.random.normal(0, 1),
                 "amp_dB": amp + np.random.normal(0, 1),
-                "toa_us": toa
+                "toa_us": toa,
+                "true_emitter": true_id
             })
 
             toa += pri_k
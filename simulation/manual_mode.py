@@ -3,7 +3,12 @@ import numpy as np
 import pandas as pd
 import os
 
+import catalog
+import perf
+from simulation.pdw_buffer import PDWBuffer
+
 OUTPUT_DIR = "outputs"
+WINDOW_US = 2e6  # 2 seconds (µs)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # =================================================
@@ -14,6 +19,8 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 # =================================================
 def manual_mode_ui():
 
+    perf.begin_run("manual_mode")
+
     # =================================================
     # SESSION STATE INITIALIZATION (Must be inside function)
     # =================================================
@@ -21,7 +28,7 @@ def manual_mode_ui():
         st.session_state.manual_global_time_us = 0.0
 
     if "manual_pdw_buffer" not in st.session_state:
-        st.session_state.manual_pdw_buffer = []
+        st.session_state.manual_pdw_buffer = PDWBuffer(st.session_state.get("user_output_dir", OUTPUT_DIR))
 
     if "manual_running" not in st.session_state:
         st.session_state.manual_running = False
@@ -203,7 +210,7 @@ def manual_mode_ui():
         if st.button("⏹ Reset"):
             st.session_state.manual_running = False
             st.session_state.manual_global_time_us = 0.0
-            st.session_state.manual_pdw_buffer = []
+            st.session_state.manual_pdw_buffer.clear()
             st.success("Manual mode reset")
 
     # =================================================
@@ -211,30 +218,51 @@ def manual_mode_ui():
     # =================================================
     if st.session_state.manual_running:
 
-        df_new = generate_manual_pdws_2s(
-            pulses_per_emitter,
-            emitters
-        )
+        with perf.stage("generate"):
+            df_new = generate_manual_pdws_2s(
+                pulses_per_emitter,
+                emitters
+            )
 
         # Use User Isolation
         out_dir = st.session_state.get("user_output_dir", "outputs")
 
-        st.session_state.manual_pdw_buffer.extend(df_new.to_dict("records"))
+        buf = st.session_state.manual_pdw_buffer
+        with perf.stage("buffer_append"):
+            buf.append(df_new)
 
-        df_all = pd.DataFrame(st.session_state.manual_pdw_buffer)
-        df_all = df_all.sort_values("toa_us").reset_index(drop=True)
+        # Windows do not overlap in TOA, so sorting the new window keeps the
+        # recording in TOA order: only it is written (appended), and the
+        # history is never read back. The first window of a run starts the files.
+        with perf.stage("sort"):
+            df_win = df_new.sort_values("toa_us").reset_index(drop=True)
         # ✅ Round PDW values to 2 decimal places
-        df_all = df_all.round(2)
+        with perf.stage("round"):
+            df_win = df_win.round(2)
 
-        df_all.to_csv(f"{out_dir}/manual_interleaved.csv", index=False)
+        first = len(buf) == len(df_win)
+        save_csv = catalog.save_csv if first else catalog.append_csv
+        save_pdw = catalog.save_pdw if first else catalog.append_pdw
+        with perf.stage("csv_write", rows=len(df_win)):
+            save_csv(df_win, f"{out_dir}/manual_interleaved.csv", "manual", cfg)
+        with perf.stage("pdw_write", rows=len(df_win)):
+            save_pdw(df_win, f"{out_dir}/manual_interleaved.pdw", "manual", cfg)
 
         st.session_state.manual_running = False  # step-wise control
         st.session_state.last_active_mode = "Manual" # Track for De-Interleaving
 
-        st.toast(f"✅ Generated 2s Manual Data! (Total: {len(df_all)})", icon="🎛️")
+        st.toast(f"✅ Generated 2s Manual Data! (Total: {len(buf)})", icon="🎛️")
         st.success("Generated next 2 seconds of PDWs (Manual Mode)")
-        st.write("Total PDWs so far:", len(df_all))
-        st.dataframe(df_all.tail(20))
+        st.write("Total PDWs so far:", len(buf))
+        st.dataframe(df_win.tail(20))
+
+        bs = buf.stats()
+        st.caption(
+            f"Buffer: {bs['resident_mb']:.1f} MB resident / {bs['budget_mb']:.0f} MB budget, "
+            f"{bs['spilled_segments']} of {bs['segments']} windows spilled to disk ({bs['spilled_mb']:.1f} MB)"
+        )
+
+    perf.perf_panel()
 
 
 # =================================================
@@ -242,14 +270,25 @@ def manual_mode_ui():
 # =================================================
 def generate_manual_pdws_2s(pulses_per_emitter, emitters):
 
-    rows = []
-
     window_start = st.session_state.manual_global_time_us
-    window_end = window_start + 2e6  # 2 seconds (µs)
+    st.session_state.manual_global_time_us = window_start + WINDOW_US
+
+    return simulate_manual_window(window_start, pulses_per_emitter, emitters)
+
+
+def simulate_manual_window(window_start, pulses_per_emitter, emitters):
+    """
+    Pure generator for one window (no session state). Manual emitters keep
+    their configuration across windows, so `true_emitter` is the 1-based
+    emitter slot. Changing the emitter count adds or drops slots at the
+    end, so an ID never moves to a different emitter.
+    """
+
+    rows = []
 
-    st.session_state.manual_global_time_us = window_end
+    window_end = window_start + WINDOW_US
 
-    for e in emitters:
+    for e_idx, e in enumerate(emitters):
 
         toa = np.random.uniform(window_start, window_end)
 
@@ -264,7 +303,8 @@ def generate_manual_pdws_2s(pulses_per_emitter, emitters):
                 "pw_us": e["pw"],
                 "doa_deg": e["doa"],
                 "amp_dB": e["amp"] + np.random.normal(0, 1),
-                "toa_us": toa
+                "toa_us": toa,
+                "true_emitter": e_idx + 1
             })
 
             toa += pri
@@ -0,0 +1,162 @@
+import os
+import shutil
+import uuid
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import pdw_format
+
+# -------------------------------------------------
+# MEMORY-BUDGETED PDW BUFFER
+# -------------------------------------------------
+# Replaces the per-session Python list of PDW dicts. Each generated window is
+# kept as a DataFrame segment; once the resident segments exceed the
+# session budget, the oldest ones are written to disk under the user's
+# output directory and read back memory-mapped, so only the most recent
+# windows stay in RAM. PDW segments are spilled as fixed-point `.pdw`
+# records (pdw_format, 30 bytes per pulse); anything else (other columns,
+# or values a record field cannot hold) falls back to a float .npy record
+# array. Spill files are removed on reset and when the
+# session's buffer is garbage-collected.
+
+DEFAULT_BUDGET_MB = float(os.environ.get("PDW_SESSION_BUDGET_MB", 64))
+
+# Spill directories of buffers alive in this process (the storage
+# compactor removes only the others)
+_live_spill_dirs = set()
+
+
+def live_spill_dirs():
+    return set(_live_spill_dirs)
+
+
+def _release(spill_dir):
+    _live_spill_dirs.discard(spill_dir)
+    shutil.rmtree(spill_dir, True)
+
+
+class PDWBuffer:
+
+    def __init__(self, out_dir, budget_mb=DEFAULT_BUDGET_MB):
+        self.spill_dir = os.path.join(out_dir, ".spill", uuid.uuid4().hex)
+        self.budget_bytes = int(budget_mb * 1e6)
+        self.version = 0  # bumped on every change; lets consumers cache
+        self._segments = []  # dicts: {"df": DataFrame} or {"path": str, "rows": int, "columns": list}
+        self._resident_bytes = 0
+        self._spilled_bytes = 0
+        self._rows = 0
+        _live_spill_dirs.add(self.spill_dir)
+        self._finalizer = weakref.finalize(self, _release, self.spill_dir)
+
+    # ----- list-like surface used by the pages -----
+    def __len__(self):
+        return self._rows
+
+    def __bool__(self):
+        return self._rows > 0
+
+    def append(self, df):
+        """Add one generated window (DataFrame of PDWs)."""
+        if df.empty:
+            return
+        df = df.reset_index(drop=True)
+        self._segments.append({"df": df})
+        self._resident_bytes += int(df.memory_usage(index=False).sum())
+        self._rows += len(df)
+        self.version += 1
+        self._spill()
+
+    @property
+    def columns(self):
+        if not self._segments:
+            return []
+        seg = self._segments[0]
+        return list(seg["df"].columns) if "df" in seg else list(seg["columns"])
+
+    def clear(self):
+        self._segments = []
+        self._resident_bytes = 0
+        self._spilled_bytes = 0
+        self._rows = 0
+        self.version += 1
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    # ----- readers -----
+    @staticmethod
+    def _read_spilled(seg, columns):
+        names = seg["columns"] if columns is None else columns
+        if seg["path"].endswith(pdw_format.EXTENSION):
+            return pdw_format.decode(pdw_format.open_records(seg["path"]), names,
+                                     pdw_format.emitter_column(seg["columns"]))[names]
+        arr = np.load(seg["path"], mmap_mode="r")
+        return pd.DataFrame({c: arr[c] for c in names})
+
+    def _segment_frames(self, columns=None):
+        for seg in self._segments:
+            if "df" in seg:
+                yield seg["df"] if columns is None else seg["df"][columns]
+            else:
+                yield self._read_spilled(seg, columns)
+
+    def to_frame(self, columns=None):
+        """All PDWs (oldest first) as one DataFrame, optionally only `columns`."""
+        frames = list(self._segment_frames(columns))
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def column_arrays(self, columns=None):
+        """
+        Selected (default: all) columns as contiguous arrays, one copy per
+        column: no per-segment DataFrames are concatenated.
+        """
+        columns = self.columns if columns is None else columns
+        out = {c: [] for c in columns}
+        for seg in self._segments:
+            src = seg["df"] if "df" in seg else self._read_spilled(seg, columns)
+            for c in columns:
+                out[c].append(np.asarray(src[c]))
+        return {c: (np.concatenate(v) if v else np.empty(0)) for c, v in out.items()}
+
+    def stats(self):
+        return {
+            "rows": self._rows,
+            "segments": len(self._segments),
+            "spilled_segments": sum(1 for s in self._segments if "path" in s),
+            "resident_mb": self._resident_bytes / 1e6,
+            "spilled_mb": self._spilled_bytes / 1e6,
+            "budget_mb": self.budget_bytes / 1e6,
+        }
+
+    # ----- spilling -----
+    def _spill(self):
+        # Always keep the newest segment resident
+        for i, seg in enumerate(self._segments[:-1]):
+            if self._resident_bytes <= self.budget_bytes:
+                break
+            if "df" not in seg:
+                continue
+            os.makedirs(self.spill_dir, exist_ok=True)
+            df = seg["df"]
+            path = os.path.join(self.spill_dir, f"seg_{self.version:06d}_{i:04d}")
+            records = None
+            if pdw_format.supports(df.columns):
+                try:
+                    records = pdw_format.encode(df)
+                except ValueError:
+                    pass
+            if records is not None:
+                path += pdw_format.EXTENSION
+                with open(path, "wb") as f:
+                    f.write(pdw_format.file_header(pdw_format.emitter_column(df.columns)))
+                    records.tofile(f)
+            else:
+                path += ".npy"
+                records = df.to_records(index=False)
+                np.save(path, records)
+            nbytes = int(df.memory_usage(index=False).sum())
+            self._resident_bytes -= nbytes
+            self._spilled_bytes += records.nbytes
+            self._segments[i] = {"path": path, "rows": len(records), "columns": list(df.columns)}
@@ -0,0 +1,334 @@
+import csv
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import catalog
+import pdw_format
+import perf
+from deinterleaving.recordings import cache_dir_for, open_recording
+from simulation.pdw_buffer import live_spill_dirs
+
+# -------------------------------------------------
+# PER-USER STORAGE COMPACTION AND RETENTION
+# -------------------------------------------------
+# The simulation pages rewrite a full-history CSV (and its `.pdw` twin)
+# every window, and the de-interleaver exports every run, so each
+# `outputs/<user>/` folder only ever grew. A background thread (one per
+# server process, like the job queue) runs compact_folder() on a user's
+# folder when they log in or press "Compact Now", and on every user folder
+# every INTERVAL_S. Each pass:
+# 1. Removes scratch left behind: sidecars and column caches whose dataset
+#    is gone, spill directories of buffers no longer alive, stale temp files.
+# 2. Compacts catalogued datasets idle for COMPACT_AFTER_S. A CSV and its
+#    `.pdw` twin become one compressed columnar `.pdwz` archive
+#    (pdw_format), roughly a quarter of the CSV. Source and config carry
+#    over to its catalog entry. The originals are removed only if every
+#    column of the archive reads back exactly as in the source, and if
+#    they did not change while the archive was written.
+# 3. Applies retention: datasets saved more than RETENTION_DAYS ago are
+#    deleted, then the oldest ones until the datasets fit in QUOTA_MB.
+#    The quota counts catalogued datasets only: live `.spill/`, rebuildable
+#    `.cache/` and unindexed files can never be evicted, so they never push
+#    datasets out.
+# Files the app did not write ("unindexed") are never compacted or
+# deleted, nor is anything modified within the last COMPACT_AFTER_S. Every
+# change goes through catalog, so listings stay consistent.
+
+OUTPUT_ROOT = "outputs"
+COMPACT_AFTER_S = float(os.environ.get("PDW_COMPACT_AFTER_S", 3600))
+RETENTION_DAYS = float(os.environ.get("PDW_RETENTION_DAYS", 90))  # 0 = keep forever
+QUOTA_MB = float(os.environ.get("PDW_QUOTA_MB", 2048))  # per user; 0 = no quota
+INTERVAL_S = float(os.environ.get("PDW_COMPACT_INTERVAL_S", 3600))
+COMPACTABLE = (".csv", pdw_format.EXTENSION)
+
+_compactor = None
+_compactor_lock = threading.Lock()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def _newest_mtime(path):
+    newest = os.path.getmtime(path)
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                newest = max(newest, os.path.getmtime(os.path.join(root, f)))
+            except OSError:
+                pass
+    return newest
+
+
+def folder_usage(folder):
+    """Bytes used by a user folder, hidden caches and spills included."""
+    return _dir_size(folder)
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:  # deleted by a session meanwhile
+        return 0
+
+
+def dataset_usage(folder):
+    """Bytes of the catalogued datasets in a user folder (what the quota counts)."""
+    return sum(_size(os.path.join(folder, name)) for name, meta in catalog.load_catalog(folder).items()
+               if meta.get("source") != "unindexed")
+
+
+def _delete(folder, name):
+    """Delete a dataset with its sidecar, catalog entry and column cache; returns bytes freed."""
+    path = os.path.join(folder, name)
+    cache = cache_dir_for(path)
+    try:
+        freed = os.path.getsize(path)
+    except OSError:
+        freed = 0
+    freed += _dir_size(cache)
+    catalog.delete_dataset(path)
+    shutil.rmtree(cache, ignore_errors=True)
+    return freed
+
+
+# -------------------------------------------------
+# PASS STEPS
+# -------------------------------------------------
+def _clean_orphans(folder, entries, now, idle_s, report):
+    live = {os.path.abspath(d) for d in live_spill_dirs()}
+    removed = []
+    with os.scandir(folder) as it:
+        hidden = [e for e in it if e.name.startswith(".")]
+    for e in hidden:
+        if e.is_file():
+            sidecar_of = e.name[1:-len(".meta.json")] if e.name.endswith(".meta.json") else None
+            if (sidecar_of is not None and sidecar_of not in entries) or \
+                    (e.name.endswith(".tmp") and now - e.stat().st_mtime > idle_s):
+                removed.append(e.path)
+        elif e.name == ".cache":
+            removed += [sub.path for sub in os.scandir(e.path) if sub.name not in entries]
+        elif e.name == ".spill":
+            removed += [sub.path for sub in os.scandir(e.path)
+                        if os.path.abspath(sub.path) not in live and now - _newest_mtime(sub.path) > idle_s]
+    for path in removed:
+        report["freed_bytes"] += _dir_size(path) if os.path.isdir(path) else os.path.getsize(path)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+    report["orphans"] = len(removed)
+
+
+def _archivable_csv(path, rec):
+    """True if every CSV column is numeric (and so survives in the archive)."""
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), [])
+    return header == list(rec.columns)
+
+
+def _round_trips(archive, rec):
+    """True if every column of the archive reads back exactly as in rec."""
+    arc = open_recording(archive)
+    if list(arc.columns) != list(rec.columns) or arc.rows != rec.rows:
+        return False
+    return all(np.array_equal(np.asarray(arc.column(c)), np.asarray(rec.column(c)), equal_nan=True)
+               for c in rec.columns)
+
+
+def _compact(folder, entries, now, idle_s, report):
+    groups = {}
+    for name, meta in entries.items():
+        stem, ext = os.path.splitext(name)
+        if ext in COMPACTABLE and meta.get("source") != "unindexed":
+            groups.setdefault(stem, []).append(name)
+
+    for stem, names in sorted(groups.items()):
+        try:
+            stats = {n: os.stat(os.path.join(folder, n)) for n in names}
+        except FileNotFoundError:
+            continue
+        if any(now - s.st_mtime < idle_s for s in stats.values()):
+            continue
+        # The CSV keeps every column; a `.pdw` with the same rows is its twin
+        names.sort(key=lambda n: not n.endswith(".csv"))
+        try:
+            rec = open_recording(os.path.join(folder, names[0]))
+            if names[0].endswith(".csv") and not _archivable_csv(os.path.join(folder, names[0]), rec):
+                names = names[1:]
+                if not names:
+                    continue
+                rec = open_recording(os.path.join(folder, names[0]))
+            src = entries[names[0]]
+            members = [n for n in names if entries[n].get("rows") == src.get("rows")]
+
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(stats[names[0]].st_mtime))
+            archive = os.path.join(folder, f"{stem}.{stamp}{pdw_format.ARCHIVE_EXTENSION}")
+            with perf.stage("compact", file=names[0], rows=rec.rows):
+                catalog.save_archive(
+                    rec.frame(), archive, src.get("source", "compacted"), src.get("config"),
+                    compacted_from=members, original_saved_at=src.get("saved_at"),
+                )
+            with perf.stage("verify", file=names[0], rows=rec.rows):
+                exact = _round_trips(archive, rec)
+        except (OSError, ValueError) as e:
+            report["errors"].append(f"{names[0]}: {e}")
+            continue
+        if not exact:
+            catalog.delete_dataset(archive)
+            report["errors"].append(f"{names[0]}: archive did not round-trip, originals kept")
+            continue
+
+        # A session rewrote a member meanwhile: keep it and drop the archive
+        changed = False
+        for n in members:
+            try:
+                s = os.stat(os.path.join(folder, n))
+                changed |= (s.st_size, s.st_mtime_ns) != (stats[n].st_size, stats[n].st_mtime_ns)
+            except FileNotFoundError:
+                changed = True
+        if changed:
+            catalog.delete_dataset(archive)
+            continue
+        for n in members:
+            report["freed_bytes"] += _delete(folder, n)
+        report["freed_bytes"] -= os.path.getsize(archive)
+        report["compacted"] += members
+        report["archives"].append(os.path.basename(archive))
+
+
+def _retain(folder, now, idle_s, retention_days, quota_mb, report):
+    entries = catalog.load_catalog(folder)
+    # Archives keep the age of the data they hold
+    managed = sorted(
+        (meta.get("original_saved_at") or meta.get("saved_at") or meta.get("mtime_ns", 0) / 1e9, name)
+        for name, meta in entries.items() if meta.get("source") != "unindexed"
+    )
+    # What the quota counts: every catalogued dataset, idle or not
+    usage = sum(_size(os.path.join(folder, n)) for _, n in managed)
+    idle = []
+    for t, name in managed:
+        try:
+            if now - os.path.getmtime(os.path.join(folder, name)) >= idle_s:
+                idle.append((t, name))
+        except FileNotFoundError:  # deleted by a session meanwhile
+            continue
+    managed = idle
+
+    if retention_days:
+        cutoff = now - retention_days * 86400
+        for t, name in managed:
+            if t < cutoff:
+                usage -= _size(os.path.join(folder, name))
+                report["freed_bytes"] += _delete(folder, name)
+                report["expired"].append(name)
+    if quota_mb:
+        for t, name in managed:
+            if usage <= quota_mb * 1e6:
+                break
+            if name in report["expired"]:
+                continue
+            usage -= _size(os.path.join(folder, name))
+            report["freed_bytes"] += _delete(folder, name)
+            report["evicted"].append(name)
+
+
+def compact_folder(folder, now=None, compact_after_s=COMPACT_AFTER_S,
+                   retention_days=RETENTION_DAYS, quota_mb=QUOTA_MB):
+    """One orphan-cleanup, compaction and retention pass over a user folder; returns a report."""
+    t0 = time.perf_counter()
+    now = time.time() if now is None else now
+    report = {"folder": folder, "finished_at": None, "orphans": 0, "compacted": [], "archives": [],
+              "expired": [], "evicted": [], "freed_bytes": 0, "usage_bytes": 0, "dataset_bytes": 0,
+              "errors": []}
+    if os.path.isdir(folder):
+        with perf.stage("storage_pass", folder=folder):
+            entries = catalog.load_catalog(folder)
+            _clean_orphans(folder, entries, now, compact_after_s, report)
+            _compact(folder, entries, now, compact_after_s, report)
+            _retain(folder, now, compact_after_s, retention_days, quota_mb, report)
+        report["usage_bytes"] = folder_usage(folder)
+        report["dataset_bytes"] = dataset_usage(folder)
+    report["finished_at"] = time.time()
+    report["elapsed_s"] = time.perf_counter() - t0
+    return report
+
+
+# -------------------------------------------------
+# BACKGROUND COMPACTOR
+# -------------------------------------------------
+class Compactor:
+    """Daemon thread running compact_folder() on requested folders and on a timer."""
+
+    def __init__(self, root=OUTPUT_ROOT, interval_s=INTERVAL_S):
+        self.root = root
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._requested = set()
+        self._busy = None
+        self._reports = {}
+        threading.Thread(target=self._loop, name="pdw-compactor", daemon=True).start()
+
+    def request(self, folder):
+        """Queue a pass over `folder`; returns immediately."""
+        with self._lock:
+            self._requested.add(os.path.normpath(folder))
+        self._wake.set()
+
+    def status(self, folder):
+        """{"pending": queued or running, "last": last report or None} for `folder`."""
+        folder = os.path.normpath(folder)
+        with self._lock:
+            return {"pending": folder in self._requested or self._busy == folder,
+                    "last": self._reports.get(folder)}
+
+    def _user_folders(self):
+        if not os.path.isdir(self.root):
+            return []
+        return [os.path.normpath(e.path) for e in os.scandir(self.root)
+                if e.is_dir() and not e.name.startswith(".")]
+
+    def _loop(self):
+        next_sweep = time.time() + self.interval_s
+        while True:
+            if time.time() >= next_sweep:
+                with self._lock:
+                    self._requested.update(self._user_folders())
+                next_sweep = time.time() + self.interval_s
+            with self._lock:
+                folder = self._requested.pop() if self._requested else None
+                self._busy = folder
+            if folder is None:
+                self._wake.wait(timeout=max(0.0, next_sweep - time.time()))
+                self._wake.clear()
+                continue
+
+            perf.begin_run("storage_compaction")
+            try:
+                report = compact_folder(folder)
+            except Exception as e:  # one bad folder must not stop the thread
+                report = {"folder": folder, "finished_at": time.time(), "errors": [f"{type(e).__name__}: {e}"]}
+            with self._lock:
+                self._reports[folder] = report
+                self._busy = None
+
+
+def get_compactor():
+    """The process-wide compactor (its thread starts on first use)."""
+    global _compactor
+    with _compactor_lock:
+        if _compactor is None:
+            _compactor = Compactor()
+        return _compactor
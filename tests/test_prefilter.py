@@ -0,0 +1,20 @@
+import numpy as np
+
+from deinterleaving.clustering import run_clustering, run_prefiltered
+
+
+def test_prefilter_keeps_cluster_of_exactly_min_samples():
+    # DBSCAN forms a cluster from exactly min_samples coincident pulses;
+    # the pre-filtered run must agree (the filter is exact for DBSCAN)
+    X = np.zeros((5, 2))
+    params = {"eps": 0.5, "min_samples": 5}
+    labels, report = run_prefiltered(X, "DBSCAN", params)
+    assert report["kept"] == 5
+    np.testing.assert_array_equal(labels, run_clustering(X, "DBSCAN", params))
+    assert (labels == 0).all()
+
+
+def test_prefilter_below_min_samples_is_noise():
+    X = np.zeros((4, 2))
+    labels, _ = run_prefiltered(X, "DBSCAN", {"eps": 0.5, "min_samples": 5})
+    assert (labels == -1).all()